@@ -1,32 +1,95 @@
 import os
-import openai
+import asyncio
 from dotenv import load_dotenv
 import json
+import textwrap
 from datetime import datetime
 
+from AI.cache import LLMResponseCache, get_llm_cache
+from AI.llm import LLMClient, get_llm_client
+from AI.prompt import PromptSection, estimate_tokens, fit_sections
+from AI.singleflight import SingleFlight, llm_single_flight
+
 # .env 파일이 있다면 환경 변수를 로드합니다.
 load_dotenv()
 
+# 피드백 요청 1건의 입력 토큰 예산(추정치). 넘으면 시간대별 분석을 집중률이 가장 높은/낮은 시간대만 남깁니다.
+FFBM_PROMPT_TOKEN_BUDGET = int(os.getenv("FFBM_PROMPT_TOKEN_BUDGET", "1500"))
+# 예산을 넘을 때 남길 시간대 수 (높은 쪽, 낮은 쪽 각각)
+FFBM_KEEP_SLOTS = 3
+
+# 바뀌지 않는 지시사항은 system 메시지에 두어 요청마다 같은 앞부분(프롬프트 캐시 대상)이 되게 합니다.
+FFBM_SYSTEM_PROMPT = textwrap.dedent("""
+당신은 학생의 학습 데이터를 분석하고 지시사항에 따라 격려해주는 따뜻한 스터디 코치입니다. 모든 응답은 한 줄의 완결된 문장으로 자연스럽게 이어지게 작성해주세요.
+반드시 다음 사항을 지켜주세요:
+1. 줄바꿈 문자(\\n)를 절대 사용하지 마세요. 문장은 마침표(.)로 끝내고 한 줄로 이어서 작성하세요.
+2. 이모티콘을 사용하지 마세요.
+3. "AI", "저", "제가"와 같이 자신을 지칭하는 말을 사용하지 마세요.
+4. 학생의 이름 대신 "학생" 또는 "여러분"과 같은 호칭을 사용하세요.
+5. 학생의 의지를 북돋우고, 자존감을 세워줄 수 있는 긍정적인 피드백을 주세요.
+6. 제공된 데이터를 자연스럽게 문장에 녹여서 설명해주세요.
+7. 제공된 시간 데이터는 '오후 3시 25분'과 같은 형식으로 자연스럽게 언급해주세요.
+8. 당신은 멘토입니다. 한번 피드백하고 더이상 볼 사이가 아니라는 사실에 유의해주세요.
+""").strip()
+
+# AI 코치 호출에 실패했을 때 학생에게 보여줄 안내 문구
+FFBM_UNAVAILABLE_MESSAGE = "AI 코치를 호출하는 중에 문제가 발생했어요. 잠시 후 다시 시도해주세요."
+
+
+class FeedbackUnavailableError(RuntimeError):
+    """
+    AI 코치 호출이 실패했을 때(시간 초과, API 오류 등) 발생합니다. 메시지는 FFBM_UNAVAILABLE_MESSAGE입니다.
+    실패한 결과는 캐시하지 않으므로 다시 시도하면 새로 호출합니다.
+    """
 
-class FFBM:
     def __init__(self):
-        # 환경 변수에서 API 키를 가져옵니다.
-        # self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.client = openai.OpenAI()
-
-    def get_ai_feedback(self, study_data_payload: dict, focus_data_payload: dict = None) -> str:
-        prompt_message = """
-        학생의 공부 상태 데이터를 바탕으로 학생을 격려하고 동기를 부여하는 따뜻한 메시지를 한국어로 작성해주세요.
-        반드시 다음 사항을 지켜주세요:
-        1. 줄바꿈 문자(\\n)를 절대 사용하지 마세요. 문장은 마침표(.)로 끝내고 한 줄로 이어서 작성하세요.
-        2. 이모티콘을 사용하지 마세요.
-        3. "AI", "저", "제가"와 같이 자신을 지칭하는 말을 사용하지 마세요.
-        4. 학생의 이름 대신 "학생" 또는 "여러분"과 같은 호칭을 사용하세요.
-        5. 학생의 의지를 북돋우고, 자존감을 세워줄 수 있는 긍정적인 피드백을 주세요.
-        6. 제공된 데이터를 자연스럽게 문장에 녹여서 설명해주세요.
-        7. 제공된 시간 데이터는 '오후 3시 25분'과 같은 형식으로 자연스럽게 언급해주세요.
-        8. 당신은 멘토입니다. 한번 피드백하고 더이상 볼 사이가 아니라는 사실에 유의해주세요.
+        super().__init__(FFBM_UNAVAILABLE_MESSAGE)
+
+
+class FFBM:
+    def __init__(self, llm: LLMClient = None, cache: LLMResponseCache = None, inflight: SingleFlight = None):
+        # SDM과 같은 비동기 클라이언트(동시 호출 제한 공유)를 사용합니다.
+        self.llm = llm or get_llm_client()
+        self.cache = cache or get_llm_cache()
+        self.inflight = inflight or llm_single_flight
+        self.model = "gpt-4o"
+        self.temperature = 0.7
+
+    def _feedback_cache_key(self, study_data_payload: dict, focus_data_payload: dict = None) -> str:
+        """
+        학습 정보와 집중도 데이터(날짜, 시간대별 측정/집중 시간)로 캐시 키를 만듭니다.
+        프롬프트에 날짜와 분 단위 수치를 그대로 넣으므로 키도 구간화하지 않습니다.
+        구간화하면 비슷한 하루를 보낸 다른 학생의 수치가 담긴 피드백이 재사용될 수 있습니다.
         """
+        inputs = {
+            key: " ".join(str(study_data_payload[key]).split())
+            for key in ("subject", "topic", "goal")
+            if key in study_data_payload
+        }
+
+        if focus_data_payload:
+            inputs["focus"] = {
+                "whenDay": focus_data_payload.get('whenDay'),
+                "slots": sorted(
+                    [time_str, data.get('measureTime', 0), data.get('focusTime', 0)]
+                    for time_str, data in focus_data_payload.get('timeSlots', {}).items()
+                ),
+            }
+
+        return LLMResponseCache.make_key("feedback", self.model, self.temperature, inputs)
+
+    @staticmethod
+    def _describe_time_slots(time_analyses: list, partial: bool = False) -> str:
+        descriptions = [
+            f"{analysis['time']}에는 {analysis['measure']:.0f}분 중 {analysis['focus']:.0f}분 집중({analysis['rate']:.0f}%)"
+            for analysis in time_analyses
+        ]
+        title = "집중도가 가장 높거나 낮았던 시간대 분석 결과:" if partial else "시간대별 분석 결과:"
+        return f"{title} {', '.join(descriptions)}."
+
+    async def get_ai_feedback(self, study_data_payload: dict, focus_data_payload: dict = None) -> str:
+        """학습/집중도 데이터로 격려 피드백을 만듭니다. AI 코치 호출이 실패하면 FeedbackUnavailableError를 발생시킵니다."""
+        sections = [PromptSection(None, "학생의 공부 상태 데이터를 바탕으로 학생을 격려하고 동기를 부여하는 따뜻한 메시지를 한국어로 작성해주세요.")]
 
         # 학습 관련 정보를 프롬프트에 추가
         study_info = []
@@ -38,7 +101,7 @@ class FFBM:
             study_info.append(f"목표: {study_data_payload['goal']}")
 
         if study_info:
-            prompt_message += f" 학생의 학습 정보: {', '.join(study_info)}."
+            sections.append(PromptSection(None, f"학생의 학습 정보: {', '.join(study_info)}."))
 
         # 집중도 데이터가 있는 경우, 분석하여 프롬프트에 추가
         if focus_data_payload:
@@ -74,54 +137,78 @@ class FFBM:
             focus_rate = (total_focus_min / total_measure_min * 100) if total_measure_min > 0 else 0
 
             # AI에게 전달할 데이터 요약 부분 (분 단위)
-            focus_data_summary = f"\n{focus_data_payload.get('whenDay')}의 집중도 데이터 분석 결과입니다."
+            focus_data_summary = f"{focus_data_payload.get('whenDay')}의 집중도 데이터 분석 결과입니다."
             # ✨ / 60 계산 없음
             focus_data_summary += f" 총 학습 시간은 {total_measure_min:.0f}분이었고, 이 중 {total_focus_min:.0f}분 동안 집중했습니다."
             focus_data_summary += f" 전체 집중도는 {focus_rate:.0f}% 입니다."
 
-            if time_analyses:
-                focus_data_summary += " 시간대별 분석 결과:"
-                time_descriptions = []
-                for analysis in time_analyses:
-                    # ✨ / 60 계산 없음
-                    time_descriptions.append(
-                        f" {analysis['time']}에는 {analysis['measure']:.0f}분 중 {analysis['focus']:.0f}분 집중({analysis['rate']:.0f}%)"
-                    )
-                focus_data_summary += ", ".join(time_descriptions) + "."
+            sections.append(PromptSection(None, focus_data_summary))
 
-            prompt_message += focus_data_summary
+            if time_analyses:
+                # 시간대가 많아 예산을 넘으면 집중률이 가장 높은/낮은 시간대만 남기고, 그래도 넘으면 뺍니다.
+                by_rate = sorted(range(len(time_analyses)), key=lambda i: time_analyses[i]['rate'])
+                keep = set(by_rate[:FFBM_KEEP_SLOTS]) | set(by_rate[-FFBM_KEEP_SLOTS:])
+                extremes = [analysis for i, analysis in enumerate(time_analyses) if i in keep]
+                sections.append(PromptSection(
+                    None,
+                    self._describe_time_slots(time_analyses),
+                    priority=1,
+                    shorter=[self._describe_time_slots(extremes, partial=True), None]
+                    if len(extremes) < len(time_analyses) else [None],
+                ))
 
             # 집중도 수치에 따라 AI에게 피드백 방향을 구체적으로 지시
             if focus_rate >= 70:
-                prompt_message += "\n지시사항: 전체 집중도가 매우 높습니다. 이 점을 특별히 강조하여 학생의 노력을 크게 칭찬하고, 앞으로의 가능성에 대해 긍정적으로 이야기해주세요."
+                directive = "지시사항: 전체 집중도가 매우 높습니다. 이 점을 특별히 강조하여 학생의 노력을 크게 칭찬하고, 앞으로의 가능성에 대해 긍정적으로 이야기해주세요."
             elif focus_rate >= 40:
-                prompt_message += "\n지시사항: 준수한 집중도를 보였습니다. 잘한 점을 언급하며, 조금만 더 노력하면 더 높은 성과를 낼 수 있다는 자신감을 심어주는 방향으로 격려해주세요."
+                directive = "지시사항: 준수한 집중도를 보였습니다. 잘한 점을 언급하며, 조금만 더 노력하면 더 높은 성과를 낼 수 있다는 자신감을 심어주는 방향으로 격려해주세요."
             else:
-                prompt_message += "\n지시사항: 이번에는 집중이 다소 어려웠던 것 같습니다. 결과에 대해 질책하지 말고, 잠시 쉬어가도 괜찮다는 점을 알려주며 다시 도전할 수 있도록 따뜻하게 위로하고 격려해주세요."
+                directive = "지시사항: 이번에는 집중이 다소 어려웠던 것 같습니다. 결과에 대해 질책하지 말고, 잠시 쉬어가도 괜찮다는 점을 알려주며 다시 도전할 수 있도록 따뜻하게 위로하고 격려해주세요."
+
+            sections.append(PromptSection(None, directive))
+
+        cache_key = self._feedback_cache_key(study_data_payload, focus_data_payload)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        prompt_message = fit_sections(
+            sections,
+            budget=FFBM_PROMPT_TOKEN_BUDGET,
+            reserved_tokens=estimate_tokens(FFBM_SYSTEM_PROMPT),
+            label="ffbm.feedback",
+        )
+        # 같은 입력의 요청이 동시에 들어오면 호출 한 번의 결과를 함께 씁니다.
+        return await self.inflight.do(cache_key, lambda: self._generate(cache_key, prompt_message))
 
+    async def _generate(self, cache_key: str, prompt_message: str) -> str:
         try:
 
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            response = await self.llm.chat(
+                model=self.model,
                 messages=[
                     {
                         "role": "system",
-                        "content": "당신은 학생의 학습 데이터를 분석하고 지시사항에 따라 격려해주는 따뜻한 스터디 코치입니다. 모든 응답은 한 줄의 완결된 문장으로 자연스럽게 이어지게 작성해주세요."
+                        "content": FFBM_SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
                         "content": prompt_message
                     }
                 ],
-                temperature=0.7,
+                temperature=self.temperature,
                 max_tokens=550
             )
             llm_message = response.choices[0].message.content
             llm_message = ' '.join(llm_message.split()).strip()
+            await self.cache.set(cache_key, llm_message, namespace="feedback")
             return llm_message
+        except asyncio.TimeoutError:
+            print(f"API 응답이 {self.llm.timeout}초 안에 오지 않았습니다.")
+            raise FeedbackUnavailableError()
         except Exception as e:
             print(f"API 요청 중 오류가 발생했습니다: {e}")
-            return "AI 코치를 호출하는 중에 문제가 발생했어요. 잠시 후 다시 시도해주세요."
+            raise FeedbackUnavailableError() from e
 
 if __name__ == "__main__":
     ffbm = FFBM()
@@ -172,5 +259,5 @@ if __name__ == "__main__":
       }
     }
 
-    feedback1 = ffbm.get_ai_feedback(test_study_data, high_focus_data)
+    feedback1 = asyncio.run(ffbm.get_ai_feedback(test_study_data, high_focus_data))
     print("생성된 AI 피드백:", feedback1)
\ No newline at end of file
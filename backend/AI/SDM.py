@@ -1,116 +1,550 @@
 import os
+import asyncio
 import openai
 from dotenv import load_dotenv
 import json
 import pathlib
 import time
 import re
+import textwrap
+from contextlib import aclosing
 from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from AI.cache import LLMResponseCache, get_llm_cache
+from AI.json_stream import WeekStreamParser
+from AI.llm import LLMClient, get_llm_client
+from AI.planner import build_local_schedule
+from AI.prompt import (
+    PROMPT_TOKEN_BUDGET,
+    SCHEDULE_TABLE_NOTE,
+    PromptSection,
+    compact_json,
+    estimate_tokens,
+    fit_sections,
+    schedule_table,
+)
+from AI.retrieval import retrieve_workbook_context, summarize_workbook_context
+from AI.schema import (
+    SCHEDULE_RESPONSE_FORMAT,
+    ScheduleShape,
+    chat_arguments,
+    repair_json,
+    request_shape,
+    schedule_output,
+    validate_weeks,
+    with_shape,
+)
+from AI.singleflight import SingleFlight, llm_single_flight
+from AI.scope import (
+    ModificationScope,
+    ScheduleMergeError,
+    merge_partial_schedule,
+    merge_week,
+    plan_modification_scope,
+    slice_schedule,
+)
+from catalog import WorkbookCatalog, workbook_catalog
 
 load_dotenv()
 
+# "false"이면 피드백의 수정 범위와 관계없이 항상 스케줄 전체를 다시 만듭니다.
+SDM_INCREMENTAL_MODIFY = os.getenv("SDM_INCREMENTAL_MODIFY", "true").lower() == "true"
+
+# 스케줄 생성 방식
+#   llm    - LLM이 스케줄을 만들고, 실패하면(시간 초과, API 오류 등) 로컬 엔진 결과로 대체합니다.
+#   local  - LLM 없이 로컬 엔진(AI/planner.py)으로 즉시 만듭니다.
+#   refine - 로컬 엔진의 초안을 LLM이 학생의 목표에 맞게 다듬습니다. 실패하면 초안을 그대로 사용합니다.
+SCHEDULE_ENGINES = ("llm", "local", "refine")
+SDM_SCHEDULE_ENGINE = os.getenv("SDM_SCHEDULE_ENGINE", "llm").lower()
+# llm, refine 방식이 실패해 로컬 엔진 스케줄로 대체했을 때 응답에 표시하는 생성 방식
+SCHEDULE_ENGINE_FALLBACK = "local-fallback"
+SDM_REFINE_FEEDBACK = "초안의 단원 순서와 학습량 배분을 유지하면서, 학생의 목표에 맞게 중요도와 일정을 다듬어주세요."
+
+# "false"이면 단원 검색(AI/retrieval.py) 없이 문제집의 work 전체를 프롬프트에 넣습니다.
+SDM_RETRIEVAL = os.getenv("SDM_RETRIEVAL", "true").lower() == "true"
+# 스케줄 요청 1건의 입력 토큰 예산(추정치). 넘으면 문제집 데이터를 단원 이름만 남긴 요약으로 줄입니다.
+SDM_PROMPT_TOKEN_BUDGET = int(os.getenv("SDM_PROMPT_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
+# 응답에서 빠졌거나 형식이 틀린 주차만 다시 요청하는 횟수 (0이면 다시 요청하지 않고 실패로 처리합니다)
+SDM_REASK_ATTEMPTS = int(os.getenv("SDM_REASK_ATTEMPTS", "1"))
+SDM_DEFAULT_WEEKS = 4
+
+# 프롬프트는 바뀌지 않는 지시사항과 출력 형식을 system 메시지에, 요청마다 바뀌는 데이터(학생, 문제집, 스케줄,
+# 피드백, 날짜)를 user 메시지에 둡니다. 앞부분이 요청마다 같아야 OpenAI의 자동 프롬프트 캐싱이 적용되므로
+# 아래 문자열에는 날짜나 학생 정보 같은 값을 넣지 마세요. 응답 형식(SCHEDULE_RESPONSE_FORMAT)도 같은 이유로
+# 요청마다 같은 스키마를 쓰며, 요청별 시작 날짜와 주차는 프롬프트와 with_shape로 전달합니다.
+_OUTPUT_FORMAT = textwrap.dedent("""
+[출력 JSON 형식]
+{
+  "start_date": "<시작 날짜 YYYY-MM-DD>",
+  "weeks": [
+    { "week": "<주차>", "plans": [ { "name": "<학생ID>", "weekplan": { "day1": [{...}], ... "day7": [{...}] } } ] },
+    ...
+  ]
+}
+""").strip()
+
+SDM_SCHEDULE_SYSTEM_PROMPT = textwrap.dedent("""
+당신은 학생 데이터와 제공된 참고 자료를 바탕으로 최적의 학습 스케줄을 JSON 형식으로 생성하는 AI입니다.
+당신은 전문 학습 컨설턴트입니다. 학생의 데이터와 제공된 참고 문제집 데이터를 바탕으로, 구체적이고 실천 가능한 제시된 주 만큼, 만일 제시되지 않았다면 4주간의 학습 계획표를 작성해주세요. 주의 수는 when으로 나타내집니다.
+
+[지시사항]
+1. [학생 데이터]와 [참고 문제집 데이터]를 정밀하게 분석하세요.
+2. [참고 문제집 데이터]에 있는 단원들을 균등하고 논리적으로 배분하여 학습 계획을 세워주세요. 'units'는 학생의 목표와 관련이 높은 단원과 그 구성, 'other_units'는 이번 학습 범위의 나머지 단원 이름입니다.
+3. 각 계획 항목에는 과목, 출판사, 문제집 이름, 공부할 단원명('scope'), 중요도(1~3), 완료 여부('isFinished': false)가 포함되어야 합니다.
+4. 학생이 지치지 않도록 주말(day 6, day 7)에는 학습량을 줄이거나 복습, 휴식을 배치해주세요.
+5. 최종 결과는 반드시 아래 [출력 JSON 형식]에 맞춰 다른 설명 없이 JSON 객체만 반환해주세요. 시작 날짜는 [현재 날짜]이고, 주차는 "1"부터 주의 수까지입니다.
+6. 현재 날짜를 반드시 반영해주세요.
+7. 문장을 생성할 땐 완성된 문장만 생성해주세요.
+""").strip() + "\n\n" + _OUTPUT_FORMAT
+
+SDM_MODIFY_SYSTEM_PROMPT = textwrap.dedent(f"""
+당신은 기존 스케줄을 사용자의 피드백에 맞게 유연하게 수정하고 완전한 JSON 결과물만 반환하는 AI 학습 컨설턴트입니다.
+학생의 기존 학습 스케줄을 사용자의 피드백에 맞게 수정하여 새로운 학습 계획표를 작성해주세요.
+
+[지시사항]
+1. [기존 스케줄]을 기반으로 [사용자 피드백]의 요청사항을 반영해주세요. {SCHEDULE_TABLE_NOTE}
+2. [관련 문제집 데이터]의 단원('units'는 피드백과 관련이 높은 단원과 그 구성, 'other_units'는 나머지 단원 이름)을 활용하여 학습 계획을 조정해주세요.
+3. 피드백이 구체적이지 않다면 학생에게 더 도움이 되는 방향으로 스케줄을 개선해주세요.
+4. 각 계획 항목에는 과목, 출판사, 문제집 이름, 공부할 단원명('scope'), 중요도(1~3), 완료 여부('isFinished': false)가 포함되어야 합니다.
+5. 학습량의 균형을 맞추고, 주말에는 적절한 휴식이나 복습을 배치해주세요.
+6. 최종 결과는 반드시 아래 [출력 JSON 형식]에 맞춰 다른 설명 없이 JSON 객체만 반환해주세요. 시작 날짜는 [오늘의 날짜]이고, 주차는 "1"부터 [기존 스케줄]의 주 수까지입니다.
+7. 현재 날짜를 반드시 반영해주세요.
+""").strip() + "\n\n" + _OUTPUT_FORMAT
+
+SDM_PARTIAL_MODIFY_SYSTEM_PROMPT = textwrap.dedent(f"""
+당신은 기존 스케줄을 사용자의 피드백에 맞게 유연하게 수정하고 완전한 JSON 결과물만 반환하는 AI 학습 컨설턴트입니다.
+학생의 기존 학습 스케줄 중 [수정 범위]에 해당하는 부분만 사용자의 피드백에 맞게 수정해주세요.
+
+[지시사항]
+1. [기존 스케줄 (수정 범위)]를 기반으로 [사용자 피드백]의 요청사항을 반영해주세요. {SCHEDULE_TABLE_NOTE}
+2. [수정 범위]의 주차만 반환하고, 다른 주차는 포함하지 마세요.
+3. [수정 범위]의 과목 항목만 반환하고, 다른 과목 항목은 포함하지 마세요. 다른 과목 항목은 기존 스케줄에 그대로 유지됩니다.
+4. [관련 문제집 데이터]의 단원('units'는 피드백과 관련이 높은 단원과 그 구성, 'other_units'는 나머지 단원 이름)을 활용하여 학습 계획을 조정해주세요.
+5. 각 계획 항목에는 과목, 출판사, 문제집 이름, 공부할 단원명('scope'), 중요도(1~3), 완료 여부('isFinished': false)가 포함되어야 합니다.
+6. 최종 결과는 반드시 아래 [출력 JSON 형식]에 맞춰 다른 설명 없이 JSON 객체만 반환해주세요. 시작 날짜는 [수정 범위]의 시작 날짜이고, 주차는 [수정 범위]의 주차만 사용합니다.
+""").strip() + "\n\n" + _OUTPUT_FORMAT
+
+
+class ScheduleRequestError(ValueError):
+    """스케줄 요청 입력이 올바르지 않을 때 발생합니다. 메시지는 그대로 사용자에게 전달됩니다."""
+
+
+class ScheduleOutputError(ValueError):
+    """모델 출력을 고치거나 빠진 주차를 다시 요청해도 스케줄 형식을 맞추지 못했을 때 발생합니다."""
+
 
 class SDM:
-    def __init__(self):
+    def __init__(
+        self,
+        catalog: WorkbookCatalog = workbook_catalog,
+        llm: LLMClient = None,
+        cache: LLMResponseCache = None,
+        inflight: SingleFlight = None,
+    ):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY 환경 변수가 설정되지 않았습니다.")
-        self.client = openai.OpenAI(api_key=api_key)
+        self.llm = llm or get_llm_client()
         self.model = "gpt-4.1"
+        self.catalog = catalog
+        self.cache = cache or get_llm_cache()
+        self.inflight = inflight or llm_single_flight
 
-    def _retrieve_relevant_workbooks(self, student_workbooks: list, all_workbooks_data: list) -> list:
+    def _retrieve_relevant_workbooks(self, student_workbooks: list) -> list:
         relevant_data = []
         for s_workbook in student_workbooks:
-            for db_entry in all_workbooks_data:
-                if (db_entry.get('publish') == s_workbook.get('publish') and
-                        db_entry.get('workbook') == s_workbook.get('workbook') and  # 'subjects' → 'workbook'으로 변경
-                    db_entry.get('grade') == s_workbook.get('grade')):
-                    relevant_data.append(db_entry)
-                    break
+            db_entry = self.catalog.get(
+                s_workbook.get('grade'),
+                s_workbook.get('publish'),
+                s_workbook.get('workbook'),  # 'subjects' → 'workbook'으로 변경
+            )
+            if db_entry is not None:
+                relevant_data.append(db_entry)
         return relevant_data
 
-    def get_ai_schedule(self, study_data_payload: dict) -> dict:
+    def _require_workbooks(self, study_data_payload: dict) -> list:
+        """요청한 문제집의 카탈로그 항목을 반환합니다. 없으면 ScheduleRequestError를 발생시킵니다."""
+        student_workbooks = study_data_payload.get("subjects", [])
+        if not student_workbooks:
+            raise ScheduleRequestError("학생의 문제집 정보(workbooks)가 제공되지 않았습니다.")
+
+        relevant_workbook_data = self._retrieve_relevant_workbooks(student_workbooks)
+
+        if not relevant_workbook_data:
+            raise ScheduleRequestError("데이터베이스에서 학생의 문제집 정보를 찾을 수 없습니다. 학년, 출판사, 문제집 이름을 확인해주세요.")
+        return relevant_workbook_data
+
+    def _local_schedule(self, study_data_payload: dict) -> dict:
+        """로컬 엔진으로 스케줄을 만듭니다. 입력이 잘못되면 ScheduleRequestError를 발생시킵니다."""
+        weeks = study_data_payload.get("when")
+        if weeks is not None and weeks < 1:
+            raise ScheduleRequestError("주의 수(when)는 1 이상이어야 합니다.")
+        return build_local_schedule(
+            self._require_workbooks(study_data_payload),
+            weeks=weeks,
+            user_id=study_data_payload.get("user_id") or "",
+            goal=study_data_payload.get("goal"),
+        )
+
+    def _build_refine_request(self, study_data_payload: dict, draft: dict) -> dict:
+        """로컬 엔진 초안을 기존 스케줄로, 학생의 목표를 피드백으로 삼아 스케줄 수정 요청을 만듭니다."""
+        goal = study_data_payload.get("goal")
+        feedback = f"{SDM_REFINE_FEEDBACK}\n학생의 목표: {goal}" if goal else SDM_REFINE_FEEDBACK
+        return self._build_modify_request(
+            study_data_payload, self._require_workbooks(study_data_payload), draft, feedback
+        )
+
+    @staticmethod
+    def _schedule_events(schedule: dict) -> list[dict]:
+        """완성된 스케줄을 스트리밍 이벤트(주차별 week, 마지막 done)로 바꿉니다."""
+        events = []
+        for date, weeks in schedule.items():
+            for week, plan in (weeks.items() if isinstance(weeks, dict) else []):
+                events.append({"event": "week", "data": {"date": date, "week": week, "plan": plan}})
+        events.append({"event": "done", "data": schedule})
+        return events
+
+    @staticmethod
+    def _schedule_cache_key(study_data_payload: dict, request: dict, engine: str = "llm") -> str:
+        """학생 ID를 제외한 생성 입력(학년, 문제집, 목표, 주 수, 날짜)을 정규화해 캐시 키를 만듭니다."""
+        subjects = sorted(
+            [s.get("grade"), s.get("publish"), s.get("workbook")]
+            for s in study_data_payload.get("subjects", [])
+        )
+        inputs = {
+            "grade": study_data_payload.get("grade"),
+            "subjects": subjects,
+            "goal": " ".join((study_data_payload.get("goal") or "").split()).lower(),
+            "when": study_data_payload.get("when"),
+            "date": datetime.now().strftime("%Y-%m-%d"),
+        }
+        if engine != "llm":
+            inputs["engine"] = engine
+        return LLMResponseCache.make_key("schedule", request["model"], request["temperature"], inputs)
+
+    @staticmethod
+    def _personalize(schedule: dict, user_id: str) -> dict:
+        """캐시에서 꺼낸 스케줄의 주차별 name을 요청한 학생 ID로 바꿉니다."""
+        if not user_id:
+            return schedule
+        for weeks in schedule.values():
+            if not isinstance(weeks, dict):
+                continue
+            for plans in weeks.values():
+                for plan in plans if isinstance(plans, list) else []:
+                    if isinstance(plan, dict) and "name" in plan:
+                        plan["name"] = user_id
+        return schedule
+
+    @staticmethod
+    def _workbook_context(relevant_workbooks: list, query: str) -> list:
+        """
+        프롬프트에 넣을 문제집 데이터입니다. query(목표, 피드백)와 관련된 단원만 구성까지 넣고
+        나머지 단원은 이름만 넣습니다. SDM_RETRIEVAL이 꺼져 있으면 문제집 데이터를 그대로 반환합니다.
+        """
+        if not SDM_RETRIEVAL:
+            return relevant_workbooks
+        return retrieve_workbook_context(relevant_workbooks, query)
+
+    @staticmethod
+    def _workbook_section(title: str, workbook_context: list) -> PromptSection:
+        """문제집 데이터 섹션입니다. 토큰 예산을 넘으면 단원 이름만 남긴 요약으로 줄입니다."""
+        return PromptSection(
+            title,
+            compact_json(workbook_context),
+            priority=1,
+            shorter=[compact_json(summarize_workbook_context(workbook_context))],
+        )
+
+    def _chat_request(
+        self, system_content: str, sections: list, shape: ScheduleShape, temperature: float, label: str
+    ) -> dict:
+        """
+        섹션을 토큰 예산에 맞춰 이어 붙인 chat 요청 인자를 만듭니다.
+        응답 형식은 요청마다 같은 스케줄 JSON Schema(structured output)이고, 응답을 검증할 shape(시작 날짜, 주차)는
+        요청 인자에 따로 붙입니다. OpenAI에 보낼 때는 chat_arguments로 뺍니다.
+        """
+        prompt_message = fit_sections(
+            sections,
+            budget=SDM_PROMPT_TOKEN_BUDGET,
+            reserved_tokens=estimate_tokens(system_content),
+            label=label,
+        )
+        return with_shape(dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": prompt_message}
+            ],
+            temperature=temperature,
+            response_format=SCHEDULE_RESPONSE_FORMAT
+        ), shape)
+
+    def _build_schedule_request(self, study_data_payload: dict) -> dict:
+        """스케줄 생성용 chat 요청 인자를 만듭니다. 입력이 잘못되면 ScheduleRequestError를 발생시킵니다."""
+        relevant_workbook_data = self._workbook_context(
+            self._require_workbooks(study_data_payload), study_data_payload.get("goal")
+        )
+        current_date = datetime.now().strftime("%Y-%m-%d")
+
+        sections = [
+            PromptSection("학생 데이터", compact_json(study_data_payload)),
+            self._workbook_section("참고 문제집 데이터", relevant_workbook_data),
+            PromptSection("현재 날짜", current_date),
+        ]
+        shape = ScheduleShape(current_date, [str(week) for week in range(1, (study_data_payload.get("when") or SDM_DEFAULT_WEEKS) + 1)])
+        return self._chat_request(SDM_SCHEDULE_SYSTEM_PROMPT, sections, shape, temperature=0.5, label="sdm.schedule")
+
+    def _build_modify_request(self, student_data: dict, relevant_workbooks: list, existing_schedule: dict, feedback: str) -> dict:
+        """스케줄 수정용 chat 요청 인자를 만듭니다. 입력이 잘못되면 ScheduleRequestError를 발생시킵니다."""
+        # 입력 데이터 검증
+        if not student_data:
+            raise ScheduleRequestError("학생 데이터가 제공되지 않았습니다.")
+
+        if not relevant_workbooks:
+            raise ScheduleRequestError("관련 문제집 데이터가 제공되지 않았습니다.")
+
+        if not existing_schedule:
+            raise ScheduleRequestError("기존 스케줄이 제공되지 않았습니다.")
+
+        current_date = datetime.now().strftime("%Y-%m-%d")
+
+        sections = [
+            PromptSection("학생 데이터", compact_json(student_data)),
+            self._workbook_section("관련 문제집 데이터", self._workbook_context(relevant_workbooks, feedback)),
+            PromptSection("기존 스케줄", schedule_table(existing_schedule)),
+            PromptSection("사용자 피드백", feedback),
+            PromptSection("오늘의 날짜", current_date),
+        ]
+        # 전체 수정은 오늘부터 기존 스케줄과 같은 주 수만큼 다시 만듭니다.
+        existing_weeks = next(iter(existing_schedule.values()), None)
+        week_count = len(existing_weeks) if isinstance(existing_weeks, dict) and existing_weeks else SDM_DEFAULT_WEEKS
+        shape = ScheduleShape(current_date, [str(week) for week in range(1, week_count + 1)])
+        return self._chat_request(SDM_MODIFY_SYSTEM_PROMPT, sections, shape, temperature=0.7, label="sdm.modify")
+
+    def _build_partial_modify_request(
+        self,
+        student_data: dict,
+        relevant_workbooks: list,
+        existing_schedule: dict,
+        feedback: str,
+        scope: ModificationScope,
+    ) -> dict:
+        """
+        수정 범위(scope)의 주차와 과목만 다시 만드는 chat 요청 인자를 만듭니다.
+        모델에는 기존 스케줄 중 범위에 해당하는 부분만 보내고, 그 부분만 돌려받습니다.
+        """
+        if scope.subjects:
+            relevant_workbooks = [
+                wb for wb in relevant_workbooks
+                if any(subject in (wb.get("workbook") or "") for subject in scope.subjects)
+            ] or relevant_workbooks
+
+        subjects_str = ", ".join(scope.subjects) if scope.subjects else "모든 과목"
+
+        sections = [
+            PromptSection("학생 데이터", compact_json(student_data)),
+            self._workbook_section("관련 문제집 데이터", self._workbook_context(relevant_workbooks, feedback)),
+            PromptSection(
+                "수정 범위",
+                f"시작 날짜: {scope.start_date}\n주차: {', '.join(scope.weeks)}\n과목: {subjects_str}",
+            ),
+            PromptSection("기존 스케줄 (수정 범위)", schedule_table(slice_schedule(existing_schedule, scope))),
+            PromptSection("사용자 피드백", feedback),
+        ]
+        return self._chat_request(
+            SDM_PARTIAL_MODIFY_SYSTEM_PROMPT,
+            sections,
+            ScheduleShape(scope.start_date, scope.weeks),
+            temperature=0.7,
+            label="sdm.partial_modify",
+        )
+
+    @staticmethod
+    def _modification_scope(existing_schedule: dict, feedback: str, relevant_workbooks: list):
+        if not SDM_INCREMENTAL_MODIFY:
+            return None
+        scope = plan_modification_scope(existing_schedule, feedback, relevant_workbooks)
+        if scope is not None:
+            print(f"[INFO] 스케줄 부분 수정 범위: {scope.describe()}")
+        return scope
+
+    @staticmethod
+    def _build_missing_weeks_request(request: dict, shape: ScheduleShape, valid: dict, missing: list[str]) -> dict:
+        """
+        빠진 주차만 다시 요청하는 chat 요청 인자입니다. 원래 대화에 받은 주차를 assistant 메시지로 붙이므로
+        앞부분(프롬프트 캐시 대상)은 원래 요청과 같습니다.
+        """
+        weeks_str = ", ".join(missing)
+        return with_shape(dict(
+            request,
+            messages=[
+                *request["messages"],
+                {"role": "assistant", "content": compact_json(schedule_output(shape.start_date, valid))},
+                {"role": "user", "content": f"응답에 {weeks_str}주차가 없거나 형식이 올바르지 않습니다. 같은 형식으로 {weeks_str}주차만 작성해주세요."},
+            ],
+        ), ScheduleShape(shape.start_date, missing))
+
+    @staticmethod
+    def _load_output(text: str):
+        """모델 출력을 파싱합니다. 잘렸거나 조금 어긋난 JSON은 고쳐서 파싱하고, 고칠 수 없으면 None입니다."""
         try:
-            # Get the directory where the current script is located
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            # Navigate to the backend directory and then to dict.json
-            dict_path = os.path.join(current_dir, '..', 'dict.json')
-            dict_path = os.path.normpath(dict_path)  # Normalize the path
-
-            with open(dict_path, 'r', encoding='utf-8') as f:
-                all_workbooks_data = json.load(f)
-
-            student_workbooks = study_data_payload.get("subjects", [])
-            if not student_workbooks:
-                return {"error": "학생의 문제집 정보(workbooks)가 제공되지 않았습니다."}
-
-            relevant_workbook_data = self._retrieve_relevant_workbooks(student_workbooks, all_workbooks_data)
-
-            if not relevant_workbook_data:
-                return {"error": "데이터베이스에서 학생의 문제집 정보를 찾을 수 없습니다. 학년, 출판사, 문제집 이름을 확인해주세요."}
-
-            relevant_data_str = json.dumps(relevant_workbook_data, ensure_ascii=False, indent=2)
-            student_data_str = json.dumps(study_data_payload, ensure_ascii=False, indent=2)
-            current_date = datetime.now().strftime("%Y-%m-%d")
-
-            prompt_message = f"""
-            당신은 전문 학습 컨설턴트입니다. 학생의 데이터와 제공된 참고 문제집 데이터를 바탕으로, 구체적이고 실천 가능한 제시된 주 만큼, 만일 제시되지 않았다면 4주간의 학습 계획표를 작성해주세요. 주의 수는 when으로 나타내집니다.
-
-            [지시사항]
-            1. 아래 [학생 데이터]와 [참고 문제집 데이터]를 정밀하게 분석하세요.
-            2. [참고 문제집 데이터]에 있는 단원('work' 리스트)들을 균등하고 논리적으로 배분하여 학습 계획을 세워주세요.
-            3. 각 계획 항목에는 과목, 출판사, 문제집 이름, 공부할 단원명('scope'), 중요도(1~3), 완료 여부('isFinished': false)가 포함되어야 합니다.
-            4. 학생이 지치지 않도록 주말(day 6, day 7)에는 학습량을 줄이거나 복습, 휴식을 배치해주세요.
-            5. 최종 결과는 반드시 아래 [출력 JSON 형식]에 맞춰 다른 설명 없이 JSON 객체만 반환해주세요.
-            6. 현재 날짜를 반드시 반영해주세요.
-            7. 문장을 생성할 땐 완성된 문장만 생성해주세요.
-
-            [학생 데이터]
-            {student_data_str}
-
-            [참고 문제집 데이터]
-            {relevant_data_str}
-            
-            [현재 날짜]
-            {current_date}
-
-            [출력 JSON 형식]
-            {{
-              "{current_date}": {{
-                "1": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "2": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "3": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "4": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ]
-              }}
-            }}
-            """
-
-            print("[INFO] OpenAI API에 RAG 기반 스케줄 생성을 요청합니다...")
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "당신은 학생 데이터와 제공된 참고 자료를 바탕으로 최적의 학습 스케줄을 JSON 형식으로 생성하는 AI입니다."},
-                    {"role": "user", "content": prompt_message}
-                ],
-                temperature=0.5,
-                response_format={"type": "json_object"}
+            return json.loads(text)
+        except (TypeError, json.JSONDecodeError):
+            repaired = repair_json(text)
+            if repaired is not None:
+                print("[WARN] AI 응답 JSON이 잘렸거나 형식이 어긋나 고쳐서 사용합니다.")
+            return repaired
+
+    async def _parse_schedule(self, request: dict, text: str) -> dict:
+        """
+        모델 출력을 스케줄 형식으로 검증합니다. 빠졌거나 형식이 틀린 주차만 SDM_REASK_ATTEMPTS번까지 다시 요청하고,
+        그래도 맞추지 못하면 ScheduleOutputError를 발생시킵니다.
+        """
+        data = self._load_output(text)
+        shape = request_shape(request)
+        if shape is None:
+            if data is None:
+                raise ScheduleOutputError(f"JSON이 아닌 응답: {text}")
+            return data
+
+        valid, missing = validate_weeks(data, shape)
+        for _ in range(SDM_REASK_ATTEMPTS):
+            if not missing:
+                break
+            print(f"[WARN] AI 응답에서 {', '.join(missing)}주차가 빠졌거나 형식이 틀려 해당 주차만 다시 요청합니다.")
+            retry_request = self._build_missing_weeks_request(request, shape, valid, missing)
+            response = await self.llm.chat(**chat_arguments(retry_request))
+            retry_valid, _ = validate_weeks(
+                self._load_output(response.choices[0].message.content), request_shape(retry_request)
             )
+            valid.update(retry_valid)
+            missing = [week for week in shape.weeks if week not in valid]
+
+        if missing:
+            raise ScheduleOutputError(f"{', '.join(missing)}주차를 받지 못했습니다: {text}")
+        return {shape.start_date: {week: valid[week] for week in shape.weeks}}
+
+    async def _complete_shared(self, request: dict, action: str) -> dict:
+        """
+        _complete_json과 같지만, 요청 인자가 같은 호출이 진행 중이면 그 결과를 함께 씁니다.
+        연속 클릭이나 재시도로 같은 요청이 동시에 들어와도 OpenAI 호출은 한 번만 나갑니다.
+        """
+        key = LLMResponseCache.make_key("request", request["model"], request["temperature"], request)
+        return await self.inflight.do(key, lambda: self._complete_json(request, action))
 
+    async def _complete_json(self, request: dict, action: str) -> dict:
+        """
+        요청을 보내 스케줄을 받습니다. 실패하면 {"error": ..., "retryable": True}를 반환합니다.
+        retryable은 입력 오류(ScheduleRequestError)가 아닌 실패, 즉 다시 시도하면 성공할 수 있는 실패라는 뜻입니다.
+        """
+        llm_message = None
+        try:
+            response = await self.llm.chat(**chat_arguments(request))
             llm_message = response.choices[0].message.content
-            return json.loads(llm_message)
+            return await self._parse_schedule(request, llm_message)
 
+        except asyncio.TimeoutError:
+            print(f"[ERROR] OpenAI API 응답이 {self.llm.timeout}초 안에 오지 않았습니다.")
+            return {"error": "AI 응답 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.", "retryable": True}
+        except openai.APIError as e:
+            print(f"[ERROR] OpenAI API 오류가 발생했습니다: {e}")
+            return {"error": f"API 오류: {e}", "retryable": True}
+        except ScheduleOutputError as e:
+            print(f"[ERROR] AI 응답을 스케줄 형식으로 처리하는 중 오류가 발생했습니다: {e}")
+            return {"error": "AI 응답을 처리하는 데 실패했습니다. 응답 형식이 올바르지 않습니다.", "retryable": True}
+        except Exception as e:
+            print(f"[ERROR] {action} 중 예기치 않은 오류가 발생했습니다: {e}")
+            return {"error": f"알 수 없는 오류가 발생했습니다: {e}", "retryable": True}
+
+    async def _stream_json(self, request: dict, action: str) -> AsyncIterator[dict]:
+        """
+        응답을 스트리밍으로 받아 주차 배열이 완성될 때마다 {"event": "week", ...}를 내보내고,
+        마지막에 전체 스케줄을 담은 {"event": "done", ...} 또는 {"event": "error", ...}를 내보냅니다.
+        """
+        parser = WeekStreamParser()
+        shape = request_shape(request)
+        streamed = {}
+        try:
+            async for text in self.llm.stream_chat(**chat_arguments(request)):
+                for date, week, plan in parser.feed(text):
+                    # 주차 이벤트의 날짜는 요청한 시작 날짜입니다. 완성된 스케줄(done)의 날짜 키와 같습니다.
+                    date = shape.start_date if shape is not None else date
+                    streamed[week] = plan
+                    yield {"event": "week", "data": {"date": date, "week": week, "plan": plan}}
+            schedule = await self._parse_schedule(request, parser.buffer)
+            # 다시 요청했거나 검증하며 바뀐 주차를 보냅니다.
+            for date, weeks in schedule.items():
+                for week, plan in weeks.items() if isinstance(weeks, dict) else ():
+                    if streamed.get(week) != plan:
+                        yield {"event": "week", "data": {"date": date, "week": week, "plan": plan}}
+            yield {"event": "done", "data": schedule}
+
+        except asyncio.TimeoutError:
+            print(f"[ERROR] OpenAI API 응답이 {self.llm.timeout}초 안에 오지 않았습니다.")
+            yield {"event": "error", "data": {"error": "AI 응답 시간이 초과되었습니다. 잠시 후 다시 시도해주세요."}}
         except openai.APIError as e:
             print(f"[ERROR] OpenAI API 오류가 발생했습니다: {e}")
-            return {"error": f"API 오류: {e}"}
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] AI 응답을 JSON으로 파싱하는 중 오류가 발생했습니다: {e}")
-            print(f"원본 응답: {llm_message}")
-            return {"error": "AI 응답을 처리하는 데 실패했습니다. 응답 형식이 올바르지 않습니다."}
+            yield {"event": "error", "data": {"error": f"API 오류: {e}"}}
+        except (json.JSONDecodeError, ScheduleOutputError) as e:
+            print(f"[ERROR] AI 응답을 스케줄 형식으로 처리하는 중 오류가 발생했습니다: {e}")
+            yield {"event": "error", "data": {"error": "AI 응답을 처리하는 데 실패했습니다. 응답 형식이 올바르지 않습니다."}}
         except Exception as e:
-            print(f"[ERROR] 스케줄 생성 중 예기치 않은 오류가 발생했습니다: {e}")
-            return {"error": f"알 수 없는 오류가 발생했습니다: {e}"}
+            print(f"[ERROR] {action} 중 예기치 않은 오류가 발생했습니다: {e}")
+            yield {"event": "error", "data": {"error": f"알 수 없는 오류가 발생했습니다: {e}"}}
+
+    def _prepare_schedule(self, study_data_payload: dict, engine: str):
+        """
+        engine에 맞는 (chat 요청 인자, 로컬 엔진 스케줄)을 만듭니다. local이면 요청 인자는 None입니다.
+        입력이 잘못되면 ScheduleRequestError를 발생시킵니다.
+        """
+        if engine not in SCHEDULE_ENGINES:
+            raise ScheduleRequestError(f"지원하지 않는 스케줄 생성 방식입니다: {engine}")
+
+        local = self._local_schedule(study_data_payload)
+        if engine == "local":
+            return None, local
+        if engine == "refine":
+            return self._build_refine_request(study_data_payload, local), local
+        return self._build_schedule_request(study_data_payload), local
 
-    def modify_ai_schedule(self, student_data: dict, relevant_workbooks: list, existing_schedule: dict, feedback: str) -> dict:
+    async def generate_schedule(self, study_data_payload: dict, engine: str = None) -> tuple[dict, str]:
+        """
+        스케줄을 생성하고 (스케줄, 실제로 사용한 생성 방식)을 반환합니다. engine(llm, local, refine)을 생략하면
+        SDM_SCHEDULE_ENGINE을 따릅니다. LLM 호출이 실패하면 로컬 엔진 스케줄과 SCHEDULE_ENGINE_FALLBACK을 반환합니다.
+        """
+        engine = (engine or SDM_SCHEDULE_ENGINE).lower()
+        try:
+            request, local = self._prepare_schedule(study_data_payload, engine)
+        except ScheduleRequestError as e:
+            return {"error": str(e)}, engine
+
+        if request is None:
+            print("[INFO] 로컬 엔진으로 스케줄을 생성했습니다.")
+            return local, engine
+
+        user_id = study_data_payload.get("user_id")
+        cache_key = self._schedule_cache_key(study_data_payload, request, engine)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            print("[INFO] 캐시된 스케줄을 사용합니다.")
+            return self._personalize(cached, user_id), engine
+
+        print("[INFO] OpenAI API에 RAG 기반 스케줄 생성을 요청합니다...")
+        schedule = await self._complete_shared(request, "스케줄 생성")
+        if "error" in schedule:
+            print(f"[WARN] LLM 스케줄 생성에 실패해 로컬 엔진 스케줄을 사용합니다: {schedule['error']}")
+            return local, SCHEDULE_ENGINE_FALLBACK
+        await self.cache.set(cache_key, schedule, namespace="schedule")
+        return schedule, engine
+
+    async def get_ai_schedule(self, study_data_payload: dict, engine: str = None) -> dict:
+        """generate_schedule과 같지만 스케줄만 반환합니다."""
+        schedule, _ = await self.generate_schedule(study_data_payload, engine)
+        return schedule
+
+    async def modify_ai_schedule(self, student_data: dict, relevant_workbooks: list, existing_schedule: dict, feedback: str) -> dict:
         """
         기존 스케줄과 사용자 피드백을 바탕으로 새로운 스케줄을 생성합니다.
 
@@ -124,87 +558,117 @@ class SDM:
             dict: 수정된 스케줄 또는 에러 메시지
         """
         try:
-            # 입력 데이터 검증
-            if not student_data:
-                return {"error": "학생 데이터가 제공되지 않았습니다."}
-
-            if not relevant_workbooks:
-                return {"error": "관련 문제집 데이터가 제공되지 않았습니다."}
-
-            if not existing_schedule:
-                return {"error": "기존 스케줄이 제공되지 않았습니다."}
-
-            # 데이터 문자열로 변환
-            student_data_str = json.dumps(student_data, ensure_ascii=False, indent=2)
-            workbooks_data_str = json.dumps(relevant_workbooks, ensure_ascii=False, indent=2)
-            existing_schedule_str = json.dumps(existing_schedule, ensure_ascii=False, indent=2)
-            current_date = datetime.now().strftime("%Y-%m-%d")
-
-            prompt_message = f"""
-            당신은 전문 학습 컨설턴트입니다. 학생의 기존 학습 스케줄을 사용자의 피드백에 맞게 수정하여 새로운 학습 계획표를 작성해주세요.
-
-            [지시사항]
-            1. [기존 스케줄]을 기반으로 [사용자 피드백]의 요청사항을 반영해주세요.
-            2. [관련 문제집 데이터]의 단원('work' 리스트)을 활용하여 학습 계획을 조정해주세요.
-            3. 피드백이 구체적이지 않다면 학생에게 더 도움이 되는 방향으로 스케줄을 개선해주세요.
-            4. 각 계획 항목에는 과목, 출판사, 문제집 이름, 공부할 단원명('scope'), 중요도(1~3), 완료 여부('isFinished': false)가 포함되어야 합니다.
-            5. 학습량의 균형을 맞추고, 주말에는 적절한 휴식이나 복습을 배치해주세요.
-            6. 최종 결과는 반드시 아래 [출력 JSON 형식]에 맞춰 다른 설명 없이 JSON 객체만 반환해주세요.
-            7. 현재 날짜를 반드시 반영해주세요.
-            
-
-            [학생 데이터]
-            {student_data_str}
-
-            [관련 문제집 데이터]
-            {workbooks_data_str}
-
-            [기존 스케줄]
-            {existing_schedule_str}
-
-            [사용자 피드백]
-            {feedback}
-            
-            [오늘의 날짜]
-            {current_date}
-
-            [출력 JSON 형식]
-            {{
-              "{current_date}": {{
-                "1": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "2": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "3": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ],
-                "4": [ {{ "name": "<학생ID>", "weekplan": {{ "day1": [{{...}}], ... "day7": [{{...}}] }} }} ]
-              }}
-            }}
-            """
-
-            print("[INFO] OpenAI API에 스케줄 수정을 요청합니다...")
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "당신은 기존 스케줄을 사용자의 피드백에 맞게 유연하게 수정하고 완전한 JSON 결과물만 반환하는 AI 학습 컨설턴트입니다."},
-                    {"role": "user", "content": prompt_message}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
+            request = self._build_modify_request(student_data, relevant_workbooks, existing_schedule, feedback)
+        except ScheduleRequestError as e:
+            return {"error": str(e)}
+
+        # 피드백이 일부 주차/과목만 가리키면 그 부분만 다시 만들어 기존 스케줄에 합칩니다.
+        scope = self._modification_scope(existing_schedule, feedback, relevant_workbooks)
+        if scope is not None:
+            partial_request = self._build_partial_modify_request(
+                student_data, relevant_workbooks, existing_schedule, feedback, scope
             )
-
-            modified_schedule_str = response.choices[0].message.content
-            return json.loads(modified_schedule_str)
-
-        except openai.APIError as e:
-            print(f"[ERROR] OpenAI API 오류가 발생했습니다: {e}")
-            return {"error": f"API 오류: {e}"}
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] AI 응답을 JSON으로 파싱하는 중 오류가 발생했습니다: {e}")
-            return {"error": "AI 응답을 처리하는 데 실패했습니다. 응답 형식이 올바르지 않습니다."}
-        except Exception as e:
-            print(f"[ERROR] 스케줄 수정 중 예기치 않은 오류가 발생했습니다: {e}")
-            return {"error": f"알 수 없는 오류가 발생했습니다: {e}"}
-
-
-if __name__ == "__main__":
+            print("[INFO] OpenAI API에 스케줄 부분 수정을 요청합니다...")
+            partial = await self._complete_shared(partial_request, "스케줄 부분 수정")
+            if "error" in partial:
+                return partial
+            try:
+                return merge_partial_schedule(existing_schedule, partial, scope)
+            except ScheduleMergeError as e:
+                print(f"[WARN] 부분 수정 결과를 합칠 수 없어 전체 수정으로 전환합니다: {e}")
+
+        print("[INFO] OpenAI API에 스케줄 수정을 요청합니다...")
+        return await self._complete_shared(request, "스케줄 수정")
+
+    async def stream_ai_schedule(self, study_data_payload: dict, engine: str = None) -> AsyncIterator[dict]:
+        """
+        get_ai_schedule의 스트리밍 버전입니다. 이벤트 형식은 _stream_json을 참고하세요.
+        LLM 스트림이 실패하면 error 대신 {"event": "reset", "data": {"engine": SCHEDULE_ENGINE_FALLBACK, ...}}을 보내고
+        로컬 엔진 스케줄을 week/done 이벤트로 보냅니다. reset을 받으면 그 전에 받은 week 이벤트는 버려야 합니다.
+        """
+        engine = (engine or SDM_SCHEDULE_ENGINE).lower()
+        try:
+            request, local = self._prepare_schedule(study_data_payload, engine)
+        except ScheduleRequestError as e:
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+
+        if request is None:
+            for event in self._schedule_events(local):
+                yield event
+            return
+
+        user_id = study_data_payload.get("user_id")
+        cache_key = self._schedule_cache_key(study_data_payload, request, engine)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            print("[INFO] 캐시된 스케줄을 스트리밍합니다.")
+            for event in self._schedule_events(self._personalize(cached, user_id)):
+                yield event
+            return
+
+        print("[INFO] OpenAI API에 RAG 기반 스케줄 생성을 스트리밍으로 요청합니다...")
+        async for event in self._stream_json(request, "스케줄 생성"):
+            if event["event"] == "error":
+                print(f"[WARN] LLM 스케줄 생성에 실패해 로컬 엔진 스케줄을 사용합니다: {event['data']['error']}")
+                # 이미 보낸 LLM 주차와 섞이지 않도록 클라이언트가 받은 주차를 버리게 합니다.
+                yield {"event": "reset", "data": {"engine": SCHEDULE_ENGINE_FALLBACK, "error": event["data"]["error"]}}
+                for fallback in self._schedule_events(local):
+                    yield fallback
+                return
+            if event["event"] == "done":
+                await self.cache.set(cache_key, event["data"], namespace="schedule")
+            yield event
+
+    async def stream_modified_schedule(self, student_data: dict, relevant_workbooks: list, existing_schedule: dict, feedback: str) -> AsyncIterator[dict]:
+        """
+        modify_ai_schedule의 스트리밍 버전입니다. 이벤트 형식은 _stream_json을 참고하세요.
+        부분 수정 결과를 합칠 수 없으면 아직 보낸 주차가 없을 때만 전체 수정으로 전환하고, 이미 보냈으면 error를 보냅니다.
+        """
+        try:
+            request = self._build_modify_request(student_data, relevant_workbooks, existing_schedule, feedback)
+        except ScheduleRequestError as e:
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+
+        scope = self._modification_scope(existing_schedule, feedback, relevant_workbooks)
+        if scope is not None:
+            partial_request = self._build_partial_modify_request(
+                student_data, relevant_workbooks, existing_schedule, feedback, scope
+            )
+            print("[INFO] OpenAI API에 스케줄 부분 수정을 스트리밍으로 요청합니다...")
+            emitted = False
+            async with aclosing(self._stream_json(partial_request, "스케줄 부분 수정")) as events:
+                async for event in events:
+                    try:
+                        if event["event"] == "week" and event["data"]["week"] in scope.weeks:
+                            # 주차가 완성될 때마다 기존 주차에 합친 계획을 보냅니다.
+                            week = event["data"]["week"]
+                            plan = merge_week(existing_schedule[scope.start_date][week], event["data"]["plan"], scope)
+                            emitted = True
+                            yield {"event": "week", "data": {"date": scope.start_date, "week": week, "plan": plan}}
+                        elif event["event"] == "done":
+                            merged = merge_partial_schedule(existing_schedule, event["data"], scope)
+                            yield {"event": "done", "data": merged}
+                            return
+                        elif event["event"] == "error":
+                            yield event
+                            return
+                    except ScheduleMergeError as e:
+                        if emitted:
+                            # 이미 보낸 주차와 전체 수정 결과가 섞이지 않도록 전환하지 않습니다.
+                            print(f"[ERROR] 이미 보낸 부분 수정 결과를 합칠 수 없습니다: {e}")
+                            yield {"event": "error", "data": {"error": "수정한 스케줄을 기존 스케줄에 합치지 못했습니다. 다시 시도해주세요."}}
+                            return
+                        print(f"[WARN] 부분 수정 결과를 합칠 수 없어 전체 수정으로 전환합니다: {e}")
+                        break
+
+        print("[INFO] OpenAI API에 스케줄 수정을 스트리밍으로 요청합니다...")
+        async for event in self._stream_json(request, "스케줄 수정"):
+            yield event
+
+
+async def _main():
     sdm_handler = SDM()
 
     # 샘플 데이터로 테스트
@@ -226,8 +690,13 @@ if __name__ == "__main__":
         "goal": "이번 달에는 수학 '방정식' 단원과 국어 '소나기' 작품을 완벽하게 이해하고 싶어요."
     }
 
+    # 로컬 엔진 기준 시간 (LLM 호출과 비교용)
+    started = time.perf_counter()
+    sdm_handler._local_schedule(sample_student_data)
+    print(f"[INFO] 로컬 엔진 스케줄 생성: {(time.perf_counter() - started) * 1000:.2f}ms")
+
     # 초기 스케줄 생성
-    initial_schedule = sdm_handler.get_ai_schedule(sample_student_data)
+    initial_schedule = await sdm_handler.get_ai_schedule(sample_student_data)
     print("\n--- 🤖 AI 코치가 생성한 초기 스케줄 ---")
     print(json.dumps(initial_schedule, indent=2, ensure_ascii=False))
 
@@ -265,7 +734,7 @@ if __name__ == "__main__":
         # 피드백을 통한 스케줄 수정
         user_feedback = "수학이 너무 어려워서 진도를 조금 늦추고 싶어요. 그리고 국어 '소나기' 부분을 더 집중적으로 공부하고 싶습니다."
 
-        modified_schedule = sdm_handler.modify_ai_schedule(
+        modified_schedule = await sdm_handler.modify_ai_schedule(
             student_data=sample_student_data,
             relevant_workbooks=sample_workbooks,
             existing_schedule=initial_schedule,
@@ -273,4 +742,8 @@ if __name__ == "__main__":
         )
 
         print("\n--- ✍️ 피드백을 반영한 수정된 스케줄 ---")
-        print(json.dumps(modified_schedule, indent=2, ensure_ascii=False))
\ No newline at end of file
+        print(json.dumps(modified_schedule, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,132 @@
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
+
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "21600"))
+# "true"이면 시작 시 MongoDB llm_cache 컬렉션을 워커 간 공유 캐시로 사용합니다.
+LLM_CACHE_SHARED = os.getenv("LLM_CACHE_SHARED", "false").lower() == "true"
+
+
+class LLMResponseCache:
+    """
+    LLM 응답을 입력 해시로 저장하는 2단 캐시입니다.
+    1단은 프로세스 안의 LRU(OrderedDict), 2단은 선택적으로 붙이는 MongoDB 컬렉션(TTL 인덱스)입니다.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection: Optional[AsyncCollection] = None
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(namespace: str, model: str, temperature: float, inputs: Any) -> str:
+        """정규화된 입력, 모델, temperature로 캐시 키(sha256)를 만듭니다."""
+        raw = json.dumps(
+            [namespace, model, temperature, inputs],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def attach_collection(self, collection: AsyncCollection) -> None:
+        """공유 캐시 컬렉션을 연결합니다. 만료용 TTL 인덱스는 DatabaseManager.ensure_indexes가 만듭니다."""
+        self.collection = collection
+        logger.info(f"LLM cache shared tier enabled: {collection.name}")
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            del self._entries[key]
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one(
+                    {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                    {"value": 1},
+                )
+            except PyMongoError as e:
+                logger.warning(f"LLM cache shared lookup failed: {e}")
+                doc = None
+            if doc is not None:
+                self._remember(key, doc["value"])
+                self.hits += 1
+                self.shared_hits += 1
+                return copy.deepcopy(doc["value"])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, namespace: str = "") -> None:
+        self._remember(key, copy.deepcopy(value))
+
+        if self.collection is not None:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "namespace": namespace,
+                        "value": value,
+                        "created_at": now,
+                        "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                    },
+                    upsert=True,
+                )
+            except PyMongoError as e:
+                logger.warning(f"LLM cache shared write failed: {e}")
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "shared": self.collection is not None,
+        }
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
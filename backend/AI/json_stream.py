@@ -0,0 +1,81 @@
+import json
+
+
+class WeekStreamParser:
+    """
+    모델이 조금씩 내보내는 스케줄 JSON({"start_date": "<날짜>", "weeks": [{"week": "<주차>", "plans": [...]}, ...]})을 받아
+    weeks 배열의 항목 하나가 완성될 때마다 (날짜, 주차, 계획 목록)을 돌려주는 증분 파서입니다.
+
+    전체 문서가 끝나기 전에 이미 닫힌 주차 항목만 json.loads로 파싱하므로,
+    모델 출력이 끝날 때까지 기다리지 않고 주차별로 클라이언트에 보낼 수 있습니다.
+    """
+
+    # 루트 객체 안(start_date, weeks 키)과 weeks 배열 안(주차 항목)의 깊이
+    _ROOT_DEPTH = 1
+    _WEEKS_DEPTH = 2
+
+    def __init__(self):
+        self.buffer = ""
+        self.start_date = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._expect_key = False
+        self._key = None
+        self._in_weeks = False
+        self._value_start = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str, object]]:
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        value = json.loads(buf[self._string_start:i + 1])
+                        if self._expect_key:
+                            self._key = value
+                        elif self._key == "start_date":
+                            self.start_date = value
+                        self._string_start = None
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == self._ROOT_DEPTH:
+                    self._string_start = i
+            elif ch in "{[":
+                if self._depth == self._ROOT_DEPTH and ch == "[" and self._key == "weeks":
+                    self._in_weeks = True
+                elif self._depth == self._WEEKS_DEPTH and self._in_weeks:
+                    self._value_start = i
+                self._depth += 1
+                self._expect_key = ch == "{"
+            elif ch in "}]":
+                self._depth -= 1
+                self._expect_key = False
+                if self._depth == self._WEEKS_DEPTH and self._value_start is not None:
+                    entry = json.loads(buf[self._value_start:i + 1])
+                    if isinstance(entry, dict) and isinstance(entry.get("week"), str):
+                        completed.append((self.start_date, entry["week"], entry.get("plans")))
+                    self._value_start = None
+                elif self._depth == self._ROOT_DEPTH:
+                    self._in_weeks = False
+            elif ch == ":":
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = self._depth == self._ROOT_DEPTH
+
+        self._pos = len(buf)
+        return completed
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import openai
+from dotenv import load_dotenv
+
+from AI.prompt import estimate_message_tokens, estimate_tokens
+from logger import create_logger
+
+load_dotenv()
+
+logger = create_logger(__name__)
+
+# 동시에 진행할 수 있는 OpenAI 호출 수와 호출 1건당 제한 시간(초)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+
+class LLMClient:
+    """
+    SDM, FFBM이 함께 쓰는 비동기 OpenAI 클라이언트입니다.
+    세마포어로 동시 호출 수를 제한하고, 호출마다 제한 시간을 적용해 이벤트 루프를 막지 않습니다.
+    호출마다 입력/출력 크기(추정 토큰과 응답의 usage)를 로그로 남기고, 모델별로 입력 중 프롬프트 캐시로
+    처리된 토큰(cached_tokens)을 합산합니다.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+    ):
+        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._usage: dict[str, dict[str, int]] = {}
+
+    def _log_call(self, kwargs: dict, started: float, completion: Optional[str], usage) -> None:
+        prompt_estimate = estimate_message_tokens(kwargs.get("messages") or [])
+        completion_estimate = estimate_tokens(completion or "")
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+
+        totals = self._usage.setdefault(
+            kwargs.get("model") or "unknown",
+            {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0},
+        )
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens or 0
+        totals["cached_tokens"] += cached_tokens or 0
+        totals["completion_tokens"] += completion_tokens or 0
+
+        logger.info(
+            f"LLM call {kwargs.get('model')}: "
+            f"prompt {prompt_tokens if prompt_tokens is not None else '?'} tokens (est. {prompt_estimate}, "
+            f"cached {cached_tokens if cached_tokens is not None else '?'}), "
+            f"completion {completion_tokens if completion_tokens is not None else '?'} tokens "
+            f"(est. {completion_estimate}, {len(completion or '')} chars), "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+    def usage_stats(self) -> dict:
+        """모델별 호출 수와 토큰 합계, 입력 토큰 중 프롬프트 캐시로 처리된 비율입니다."""
+        return {
+            model: {
+                **totals,
+                "cached_rate": round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0,
+            }
+            for model, totals in self._usage.items()
+        }
+
+    async def chat(self, **kwargs):
+        """chat.completions.create와 같은 인자를 받습니다. 제한 시간을 넘기면 asyncio.TimeoutError가 발생합니다."""
+        async with self._semaphore:
+            started = time.perf_counter()
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(**kwargs), timeout=self.timeout
+            )
+        completion = response.choices[0].message.content if response.choices else None
+        self._log_call(kwargs, started, completion, getattr(response, "usage", None))
+        return response
+
+    async def stream_chat(self, **kwargs) -> AsyncIterator[str]:
+        """
+        응답을 스트리밍으로 받아 텍스트 조각을 순서대로 내보냅니다.
+        스트림이 끝날 때까지 동시 호출 슬롯을 점유하며, 제한 시간은 연결과 조각 사이 대기 시간 각각에 적용됩니다.
+        """
+        async with self._semaphore:
+            started = time.perf_counter()
+            # 마지막 조각에 usage를 받아 호출 크기를 기록합니다.
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **kwargs
+                ),
+                timeout=self.timeout,
+            )
+            chunks = stream.__aiter__()
+            parts = []
+            usage = None
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    break
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            self._log_call(kwargs, started, "".join(parts), usage)
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient(api_key=os.getenv("OPENAI_API_KEY"))
+    return _llm_client
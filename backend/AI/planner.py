@@ -0,0 +1,201 @@
+import math
+import os
+from datetime import date
+from typing import Optional
+
+# 하루에 배치할 학습 항목 수 (평일, 주말)
+PLANNER_WEEKDAY_CAP = int(os.getenv("PLANNER_WEEKDAY_CAP", "3"))
+PLANNER_WEEKEND_CAP = int(os.getenv("PLANNER_WEEKEND_CAP", "1"))
+PLANNER_DEFAULT_WEEKS = 4
+
+WEEKDAYS = ("day1", "day2", "day3", "day4", "day5")
+WEEKEND = ("day6", "day7")
+
+
+class StudyUnit:
+    """문제집의 소단원 하나입니다. scope는 '대단원 > 소단원' 형식의 단원명, part는 work의 구간 키입니다."""
+
+    def __init__(self, scope: str, composition: list, part: Optional[str] = None):
+        self.scope = scope
+        self.composition = composition
+        self.part = part
+
+
+def current_parts(work: dict, today: date) -> list[str]:
+    """
+    학습할 work 구간 키를 순서대로 반환합니다.
+    semester_1/semester_2로 나뉜 문제집은 현재 학기(3~8월은 1학기)만, part_N으로 나뉜 문제집은 전체를 사용합니다.
+    """
+    parts = sorted(key for key in work if key != "appendix" and isinstance(work[key], list))
+    if "semester_1" in parts and "semester_2" in parts:
+        return ["semester_1" if 3 <= today.month <= 8 else "semester_2"]
+    return parts
+
+
+def workbook_units(entry: dict, today: date, all_parts: bool = False) -> list[StudyUnit]:
+    """카탈로그 항목의 work에서 학습할 소단원을 교재 순서대로 꺼냅니다. all_parts면 다른 학기 단원도 포함합니다."""
+    work = entry.get("work")
+    if not isinstance(work, dict):
+        return []
+
+    parts = sorted(key for key in work if key != "appendix" and isinstance(work[key], list))
+    units = []
+    for part in parts if all_parts else current_parts(work, today):
+        for chapter in work[part]:
+            if not isinstance(chapter, dict):
+                continue
+            chapter_title = chapter.get("main_chapter_title", "")
+            sub_chapters = chapter.get("sub_chapters") or []
+            if not sub_chapters:
+                units.append(StudyUnit(chapter_title, [], part))
+            for sub_chapter in sub_chapters:
+                title = " ".join(filter(None, [sub_chapter.get("number"), sub_chapter.get("title")]))
+                units.append(StudyUnit(f"{chapter_title} > {title}" if chapter_title else title,
+                                       sub_chapter.get("composition") or [], part))
+    return units
+
+
+def workbook_steps(units: list[StudyUnit]) -> list[tuple[StudyUnit, Optional[str]]]:
+    """소단원을 구성 항목(composition) 단위로 나눕니다. 단원이 적은 문제집도 여러 날에 나눠 배치할 수 있습니다."""
+    return [(unit, item) for unit in units for item in (unit.composition or [None])]
+
+
+def subject_importance(entry: dict, goal: Optional[str]) -> int:
+    """목표(goal)에 과목 이름이 들어 있으면 3, 아니면 2입니다. 1은 주말 복습 항목에 씁니다."""
+    return 3 if goal and entry.get("workbook") and entry["workbook"] in goal else 2
+
+
+def split_even(units: list, sessions: int) -> list[list]:
+    """units를 순서를 유지한 채 sessions개의 연속 구간으로 최대한 고르게 나눕니다."""
+    size, extra = divmod(len(units), sessions)
+    chunks, start = [], 0
+    for index in range(sessions):
+        end = start + size + (1 if index < extra else 0)
+        chunks.append(units[start:end])
+        start = end
+    return chunks
+
+
+def allocate_sessions(unit_counts: list[int], weights: list[int], budget: int) -> list[int]:
+    """
+    평일 칸 수(budget)를 과목별 학습 횟수로 나눕니다. 학습 분량 x 중요도에 비례하되
+    과목마다 최소 1회, 최대 unit_counts회만 배정합니다.
+    """
+    if sum(unit_counts) <= budget:
+        return list(unit_counts)
+
+    demand = [count * weight for count, weight in zip(unit_counts, weights)]
+    total = sum(demand) or 1
+    sessions = [min(count, max(1, math.floor(budget * d / total))) for count, d in zip(unit_counts, demand)]
+    # 반올림으로 남은 칸은 중요도와 단원 수가 큰 과목부터 채웁니다.
+    order = sorted(range(len(sessions)), key=lambda i: (-weights[i], -unit_counts[i], i))
+    while sum(sessions) < budget and any(sessions[i] < unit_counts[i] for i in order):
+        for i in order:
+            if sum(sessions) >= budget:
+                break
+            if sessions[i] < unit_counts[i]:
+                sessions[i] += 1
+    return sessions
+
+
+def _item(entry: dict, scope: str, importance: int) -> dict:
+    return {
+        "subject": entry.get("workbook"),
+        "publish": entry.get("publish"),
+        "workbook": entry.get("workbook"),
+        "scope": scope,
+        "importance": importance,
+        "isFinished": False,
+    }
+
+
+def _chunk_units(chunk: list[tuple[StudyUnit, Optional[str]]]) -> list[StudyUnit]:
+    units = []
+    for unit, _ in chunk:
+        if not units or units[-1] is not unit:
+            units.append(unit)
+    return units
+
+
+def _chunk_scope(chunk: list[tuple[StudyUnit, Optional[str]]]) -> str:
+    units = _chunk_units(chunk)
+    if len(units) > 1:
+        return f"{units[0].scope} ~ {units[-1].scope}"
+    items = [item for _, item in chunk if item]
+    return f"{units[0].scope} ({', '.join(items)})" if items else units[0].scope
+
+
+def build_local_schedule(
+    workbooks: list,
+    weeks: Optional[int] = None,
+    user_id: str = "",
+    goal: Optional[str] = None,
+    today: Optional[date] = None,
+    weekday_cap: int = PLANNER_WEEKDAY_CAP,
+    weekend_cap: int = PLANNER_WEEKEND_CAP,
+) -> dict:
+    """
+    카탈로그 항목(workbooks)의 단원을 weeks주에 고르게 나눈 스케줄을 LLM 없이 만듭니다.
+    결과는 SDM 스케줄과 같은 {날짜: {주차: [{name, weekplan: {day1..day7: [항목]}}]}} 형식입니다.
+
+    - 단원은 교재 순서대로 배치하고, 과목마다 학습 횟수를 학습 분량과 중요도에 비례해 나눕니다(과목당 최대 평일 수만큼).
+    - 평일은 하루 weekday_cap개, 주말은 weekend_cap개까지 배치하며 주말에는 그 주에 배운 단원을 복습합니다.
+    - 중요도가 높은 과목을 먼저 배치해 원하는 날짜를 우선 차지하게 합니다.
+    """
+    today = today or date.today()
+    weeks = weeks or PLANNER_DEFAULT_WEEKS
+    if weeks < 1:
+        raise ValueError(f"주의 수(weeks)는 1 이상이어야 합니다: {weeks}")
+    subjects = [(entry, workbook_steps(workbook_units(entry, today))) for entry in workbooks]
+    subjects = [(entry, steps) for entry, steps in subjects if steps]
+
+    days = [(week, day) for week in range(1, weeks + 1) for day in WEEKDAYS]
+    load = {slot: [] for slot in days}
+    weights = [subject_importance(entry, goal) for entry, _ in subjects]
+    sessions = allocate_sessions(
+        [min(len(steps), len(days)) for _, steps in subjects], weights, len(days) * weekday_cap
+    )
+
+    # 주마다 과목별로 배운 단원 (주말 복습용)
+    studied: dict[int, dict[int, list[StudyUnit]]] = {week: {} for week in range(1, weeks + 1)}
+
+    order = sorted(range(len(subjects)), key=lambda i: (-weights[i], i))
+    for i in order:
+        entry, steps = subjects[i]
+        chunks = split_even(steps, sessions[i])
+        position = 0
+        for k, chunk in enumerate(chunks):
+            # k번째 학습은 전체 평일 중 (k + 0.5) / n 지점을 목표로 하되, 앞 학습보다 앞서지 않게 배치합니다.
+            target = max(position, int((k + 0.5) * len(days) / len(chunks)))
+            slot_index = next(
+                (j for j in range(target, len(days)) if len(load[days[j]]) < weekday_cap),
+                next((j for j in range(position, len(days)) if len(load[days[j]]) < weekday_cap), len(days) - 1),
+            )
+            position = slot_index
+            load[days[slot_index]].append(_item(entry, _chunk_scope(chunk), weights[i]))
+            week_units = studied[days[slot_index][0]].setdefault(i, [])
+            week_units.extend(unit for unit in _chunk_units(chunk) if unit not in week_units)
+
+    start_date = today.strftime("%Y-%m-%d")
+    schedule = {}
+    for week in range(1, weeks + 1):
+        weekplan = {day: load[(week, day)] for day in WEEKDAYS}
+        review_subjects = [i for i in order if i in studied[week]]
+        for offset, day in enumerate(WEEKEND):
+            items = []
+            for n in range(weekend_cap):
+                r = offset * weekend_cap + n
+                if r < len(review_subjects):
+                    entry, _ = subjects[review_subjects[r]]
+                    units = studied[week][review_subjects[r]]
+                    scope = units[0].scope if len(units) == 1 else f"{units[0].scope} ~ {units[-1].scope}"
+                    items.append(_item(entry, f"복습: {scope}", 1))
+                elif week == weeks and r - len(review_subjects) < len(subjects):
+                    # 마지막 주말에 복습할 과목이 남지 않으면 부록의 시험 대비 문제를 풉니다.
+                    entry, _ = subjects[order[r - len(review_subjects)]]
+                    exam_prep = (entry.get("work") or {}).get("appendix", {}).get("exam_prep")
+                    if exam_prep:
+                        items.append(_item(entry, exam_prep, 2))
+            weekplan[day] = items
+        schedule[str(week)] = [{"name": user_id, "weekplan": weekplan}]
+    return {start_date: schedule}
@@ -0,0 +1,150 @@
+import json
+import math
+import os
+import re
+from typing import Optional, Sequence
+
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+# 호출 1건의 입력 토큰 예산(추정치). 넘으면 우선순위가 낮은 섹션부터 줄이거나 뺍니다.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# 메시지 하나마다 붙는 역할/구분자 토큰
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_WIDE_CHARS = re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7a3\u2e80-\u9fff\uf900-\ufaff]")
+
+
+def compact_json(value) -> str:
+    """공백 없는 JSON 문자열입니다. 프롬프트에서 indent=2 대신 사용합니다."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 토큰 수를 추정합니다.
+    한글, 한자는 글자당 1토큰, 나머지(영문, 숫자, 기호, 공백)는 4글자당 1토큰으로 셉니다. 실제보다 조금 크게 나옵니다.
+    """
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def estimate_message_tokens(messages: list) -> int:
+    return sum(
+        estimate_tokens(message.get("content") if isinstance(message.get("content"), str) else compact_json(message.get("content")))
+        + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
+
+def schedule_table(schedule: dict) -> str:
+    """
+    {날짜: {주차: [{name, weekplan: {day1..day7: [항목]}}]}} 스케줄을 표 형식으로 바꿉니다.
+    항목마다 같은 키를 반복하는 JSON보다 훨씬 짧습니다.
+
+        start: 2025-09-01
+        columns: ["day","subject",...]
+        week 1 (name: user)
+        ["day1","수학",...]
+    """
+    if not isinstance(schedule, dict) or not schedule:
+        return compact_json(schedule)
+
+    start_date = next(iter(schedule))
+    weeks = schedule[start_date]
+    if not isinstance(weeks, dict):
+        return compact_json(schedule)
+
+    columns = []
+    for plans in weeks.values():
+        for plan in plans if isinstance(plans, list) else []:
+            weekplan = plan.get("weekplan") if isinstance(plan, dict) else None
+            for items in (weekplan or {}).values():
+                for item in items if isinstance(items, list) else []:
+                    if isinstance(item, dict):
+                        columns.extend(key for key in item if key not in columns)
+
+    lines = [f"start: {start_date}", f"columns: {compact_json(['day', *columns])}"]
+    for week, plans in weeks.items():
+        for plan in plans if isinstance(plans, list) else []:
+            if not isinstance(plan, dict):
+                continue
+            lines.append(f"week {week} (name: {plan.get('name', '')})")
+            for day, items in (plan.get("weekplan") or {}).items():
+                for item in items if isinstance(items, list) else []:
+                    if isinstance(item, dict):
+                        lines.append(compact_json([day, *(item.get(key) for key in columns)]))
+                    else:
+                        lines.append(compact_json([day, item]))
+    return "\n".join(lines)
+
+
+# schedule_table 형식을 모델에게 설명하는 문장입니다.
+SCHEDULE_TABLE_NOTE = (
+    "스케줄은 표 형식입니다. 'start'는 시작 날짜, 'columns'는 열 이름이고, "
+    "'week N (name: X)' 아래의 각 줄이 그 주차 계획의 항목 하나입니다. 항목이 없는 요일은 생략되어 있습니다."
+)
+
+
+class PromptSection:
+    """
+    프롬프트의 '[제목]\\n본문' 섹션입니다.
+    priority가 None이면 예산을 넘어도 줄이지 않고, 숫자가 작을수록 먼저 줄입니다.
+    shorter는 본문을 대신할 더 짧은 본문들이며 None은 섹션을 뺀다는 뜻입니다.
+    """
+
+    def __init__(
+        self,
+        title: Optional[str],
+        body: str,
+        priority: Optional[int] = None,
+        shorter: Sequence[Optional[str]] = (),
+    ):
+        self.title = title
+        self.body = body
+        self.priority = priority
+        self.shorter = list(shorter)
+
+    def render(self) -> str:
+        if self.body is None:
+            return ""
+        return f"[{self.title}]\n{self.body}" if self.title else self.body
+
+    def shrink(self) -> bool:
+        """다음으로 짧은 본문으로 바꿉니다. 더 줄일 수 없으면 False입니다."""
+        if self.priority is None or not self.shorter:
+            return False
+        self.body = self.shorter.pop(0)
+        return True
+
+
+def render_sections(sections: list[PromptSection]) -> str:
+    return "\n\n".join(text for text in (section.render() for section in sections) if text)
+
+
+def fit_sections(
+    sections: list[PromptSection],
+    budget: int = PROMPT_TOKEN_BUDGET,
+    reserved_tokens: int = 0,
+    label: str = "prompt",
+) -> str:
+    """
+    섹션들을 이어 붙인 프롬프트를 반환합니다. 추정 토큰 수(reserved_tokens 포함)가 budget을 넘으면
+    우선순위가 낮은 섹션부터 짧은 본문으로 바꾸거나 빼서 예산에 맞춥니다.
+    """
+    text = render_sections(sections)
+    tokens = estimate_tokens(text) + reserved_tokens
+    while tokens > budget:
+        candidates = [section for section in sections if section.priority is not None and section.shorter]
+        if not candidates:
+            logger.warning(f"{label}: {tokens} estimated tokens exceed budget {budget} after trimming")
+            break
+        section = min(candidates, key=lambda s: s.priority)
+        section.shrink()
+        logger.info(f"{label}: trimmed section '{section.title or 'untitled'}' to fit budget {budget} (was {tokens} tokens)")
+        text = render_sections(sections)
+        tokens = estimate_tokens(text) + reserved_tokens
+    return text
@@ -0,0 +1,153 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import date
+from typing import Optional
+
+from AI.planner import StudyUnit, current_parts, workbook_units
+
+# 문제집마다 구성(composition)까지 자세히 보낼 단원 수. 나머지 단원은 이름만 보냅니다.
+RAG_DETAIL_UNITS = int(os.getenv("RAG_DETAIL_UNITS", "6"))
+RAG_NGRAM_SIZES = (2, 3)
+
+_NON_WORD = re.compile(r"[^0-9a-z가-힣ㄱ-ㅎ]+")
+
+
+def char_ngrams(text: str, sizes: tuple = RAG_NGRAM_SIZES) -> list[str]:
+    """
+    공백과 문장 부호를 지운 뒤 글자 n-gram을 만듭니다.
+    한국어 단원명은 띄어쓰기가 일정하지 않고 조사가 붙으므로('일차방정식', '방정식을') 형태소 대신 글자 단위로 비교합니다.
+    """
+    normalized = _NON_WORD.sub("", (text or "").lower())
+    grams = []
+    for size in sizes:
+        grams.extend(normalized[i:i + size] for i in range(len(normalized) - size + 1))
+    return grams
+
+
+class UnitIndex:
+    """한 문제집의 단원 목록에 대한 글자 n-gram BM25 인덱스입니다."""
+
+    def __init__(self, units: list[StudyUnit], k1: float = 1.2, b: float = 0.75):
+        self.units = units
+        self.k1 = k1
+        self.b = b
+        self._terms = [Counter(char_ngrams(" ".join([unit.scope, *unit.composition]))) for unit in units]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency = Counter(term for terms in self._terms for term in terms)
+        count = len(units)
+        self._idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list[float]:
+        query_terms = Counter(char_ngrams(query))
+        scores = []
+        for terms, length in zip(self._terms, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+            score = 0.0
+            for term, query_count in query_terms.items():
+                tf = terms.get(term)
+                if tf:
+                    score += query_count * self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def rank(self, query: str, limit: int) -> list[int]:
+        """query와 관련 있는 단원의 위치를 점수 순으로 최대 limit개 반환합니다. 관련 없는 단원은 빼고 반환합니다."""
+        if not query:
+            return []
+        scores = self.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: (-scores[i], i))
+        return ranked[:limit]
+
+
+_indexes: dict[int, tuple[dict, UnitIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def unit_index(entry: dict) -> UnitIndex:
+    """카탈로그 항목의 전체 단원 인덱스를 반환합니다. 카탈로그 항목은 바뀌지 않으므로 한 번만 만듭니다."""
+    cached = _indexes.get(id(entry))
+    if cached is not None and cached[0] is entry:
+        return cached[1]
+
+    index = UnitIndex(workbook_units(entry, date.today(), all_parts=True))
+    with _indexes_lock:
+        # 카탈로그가 다시 로드되면 이전 항목의 인덱스는 더 쓰이지 않으므로 크기가 커지면 비웁니다.
+        if len(_indexes) > 1024:
+            _indexes.clear()
+        _indexes[id(entry)] = (entry, index)
+    return index
+
+
+def retrieve_workbook_context(
+    workbooks: list,
+    query: Optional[str],
+    detail_units: int = RAG_DETAIL_UNITS,
+    today: Optional[date] = None,
+) -> list[dict]:
+    """
+    프롬프트에 넣을 문제집 데이터를 만듭니다. 문제집마다 query(목표, 피드백)와 관련이 높은 단원을
+    구성(composition)까지 'units'에 넣고, 현재 학습 범위(학기)의 나머지 단원은 이름만 'other_units'에 교재 순서대로 넣습니다.
+    관련 단원은 다른 학기에서도 찾으며, detail_units개보다 적으면 현재 범위의 앞쪽 단원으로 채웁니다.
+    """
+    today = today or date.today()
+    context = []
+    for entry in workbooks:
+        work = entry.get("work")
+        if not isinstance(work, dict):
+            # 단원 구조가 없는 항목은 나눌 수 없으므로 그대로 보냅니다.
+            context.append(entry)
+            continue
+
+        index = unit_index(entry)
+        current = set(current_parts(work, today))
+        in_range = [i for i, unit in enumerate(index.units) if unit.part in current]
+
+        selected = set(index.rank(query, detail_units))
+        for i in in_range:
+            if len(selected) >= detail_units:
+                break
+            selected.add(i)
+
+        units, other_units = [], []
+        for i, unit in enumerate(index.units):
+            if i in selected:
+                units.append({"scope": unit.scope, "composition": unit.composition})
+            elif i in in_range:
+                other_units.append(unit.scope)
+
+        context.append({
+            "grade": entry.get("grade"),
+            "publish": entry.get("publish"),
+            "workbook": entry.get("workbook"),
+            "units": units,
+            "other_units": other_units,
+        })
+    return context
+
+
+def summarize_workbook_context(context: list, today: Optional[date] = None) -> list[dict]:
+    """
+    retrieve_workbook_context 결과(또는 카탈로그 항목)를 단원 이름만 남긴 요약으로 줄입니다.
+    프롬프트가 토큰 예산을 넘을 때 문제집 데이터 대신 사용합니다.
+    """
+    today = today or date.today()
+    summary = []
+    for entry in context:
+        if "units" in entry:
+            names = [unit["scope"] for unit in entry["units"]] + list(entry.get("other_units") or [])
+        else:
+            names = [unit.scope for unit in workbook_units(entry, today)]
+        summary.append({
+            "grade": entry.get("grade"),
+            "publish": entry.get("publish"),
+            "workbook": entry.get("workbook"),
+            "units": names,
+        })
+    return summary
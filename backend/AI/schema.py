@@ -0,0 +1,209 @@
+import json
+import re
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
+
+DAYS = ("day1", "day2", "day3", "day4", "day5", "day6", "day7")
+
+
+class ScheduleItem(BaseModel):
+    """스케줄 항목 하나입니다. AI/planner.py가 만드는 항목과 같은 키를 씁니다."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    subject: str
+    publish: str
+    workbook: str
+    scope: str
+    importance: Literal[1, 2, 3]
+    isFinished: bool
+
+
+class WeekPlan(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    day1: list[ScheduleItem]
+    day2: list[ScheduleItem]
+    day3: list[ScheduleItem]
+    day4: list[ScheduleItem]
+    day5: list[ScheduleItem]
+    day6: list[ScheduleItem]
+    day7: list[ScheduleItem]
+
+
+class StudentPlan(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    name: str
+    weekplan: WeekPlan
+
+
+_week_plans = TypeAdapter(list[StudentPlan])
+
+
+class ScheduleWeek(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    week: str
+    plans: list[StudentPlan]
+
+
+class ScheduleOutput(BaseModel):
+    """모델이 돌려주는 스케줄입니다. start_date는 시작 날짜(YYYY-MM-DD), weeks는 주차별 계획입니다."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    start_date: str
+    weeks: list[ScheduleWeek]
+
+
+class ScheduleShape:
+    """모델이 돌려줘야 하는 스케줄의 시작 날짜와 주차 키 목록입니다."""
+
+    def __init__(self, start_date: str, weeks: list[str]):
+        self.start_date = start_date
+        self.weeks = weeks
+
+
+def schedule_json_schema() -> dict:
+    """
+    {"start_date": 날짜, "weeks": [{"week": 주차, "plans": [StudentPlan]}]} 형식의 JSON Schema입니다.
+    structured output의 strict 모드는 임의의 키를 허용하지 않으므로 날짜와 주차를 키가 아닌 값으로 둡니다.
+    요청마다 같은 스키마이므로 프롬프트 캐시의 앞부분을 바꾸지 않습니다. 기대하는 주차는 with_shape로 따로 붙입니다.
+    """
+    return ScheduleOutput.model_json_schema(ref_template="#/$defs/{model}")
+
+
+SCHEDULE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "schedule", "strict": True, "schema": schedule_json_schema()},
+}
+
+# 요청 인자에서 기대하는 스케줄 형식(시작 날짜, 주차)을 담는 키입니다. OpenAI에 보내기 전에 chat_arguments로 뺍니다.
+SCHEDULE_SHAPE_KEY = "schedule_shape"
+
+
+def with_shape(request: dict, shape: ScheduleShape) -> dict:
+    """요청 인자에 스키마 대신 검증할 시작 날짜와 주차 목록을 붙입니다."""
+    return dict(request, **{SCHEDULE_SHAPE_KEY: {"start_date": shape.start_date, "weeks": list(shape.weeks)}})
+
+
+def request_shape(request: dict) -> Optional[ScheduleShape]:
+    """요청 인자에 붙인 스케줄 형식을 꺼냅니다. 스케줄 요청이 아니면 None입니다."""
+    shape = request.get(SCHEDULE_SHAPE_KEY)
+    if not shape:
+        return None
+    return ScheduleShape(shape["start_date"], list(shape["weeks"]))
+
+
+def chat_arguments(request: dict) -> dict:
+    """OpenAI에 보낼 chat 요청 인자입니다."""
+    return {key: value for key, value in request.items() if key != SCHEDULE_SHAPE_KEY}
+
+
+def schedule_output(start_date: str, weeks: dict) -> dict:
+    """{주차: 계획 목록}을 모델 출력 형식으로 바꿉니다. 빠진 주차를 다시 요청할 때 받은 주차를 돌려줄 때 씁니다."""
+    return {"start_date": start_date, "weeks": [{"week": week, "plans": plans} for week, plans in weeks.items()]}
+
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```\s*$")
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """
+    잘렸거나 조금 어긋난 모델 출력을 고쳐 파싱합니다. 고칠 수 없으면 None을 반환합니다.
+
+    - 코드 블록 표시(```json)와 첫 '{' 앞의 설명을 지웁니다.
+    - '}' 또는 ']' 바로 앞의 쉼표를 지웁니다.
+    - 중간에 잘린 출력은 마지막으로 완성된 값까지만 남기고 열린 괄호를 닫습니다.
+    """
+    if not text:
+        return None
+    text = _CODE_FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    # 마지막으로 완성된 값 뒤의 위치(out 길이)와 그때 열려 있던 괄호
+    last_good = None
+
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                break
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            stack.pop()
+            out.append(ch)
+            last_good = (len(out), list(stack))
+            if not stack:
+                break
+            continue
+        elif ch == ",":
+            last_good = (len(out), list(stack))
+        out.append(ch)
+
+    candidates = ["".join(out)]
+    if last_good is not None:
+        length, open_brackets = last_good
+        candidates.append("".join(out[:length]).rstrip().rstrip(",") + "".join(reversed(open_brackets)))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def output_weeks(data: Any) -> dict:
+    """모델 출력의 weeks 배열을 {주차: 계획 목록}으로 바꿉니다. 형식이 틀린 항목은 건너뜁니다."""
+    weeks = data.get("weeks") if isinstance(data, dict) else None
+    if not isinstance(weeks, list):
+        return {}
+    return {
+        entry["week"]: entry.get("plans")
+        for entry in weeks
+        if isinstance(entry, dict) and isinstance(entry.get("week"), str)
+    }
+
+
+def validate_weeks(data: Any, shape: ScheduleShape) -> tuple[dict, list[str]]:
+    """
+    모델 출력에서 shape의 주차를 검증합니다.
+    ({주차: 검증된 계획 목록}, 빠졌거나 형식이 틀린 주차 목록)을 반환합니다. 출력의 start_date는 보지 않습니다.
+    """
+    weeks = output_weeks(data)
+
+    valid, missing = {}, []
+    for week in shape.weeks:
+        try:
+            plans = _week_plans.validate_python(weeks.get(week))
+        except ValidationError:
+            missing.append(week)
+            continue
+        if not plans:
+            missing.append(week)
+            continue
+        valid[week] = [plan.model_dump() for plan in plans]
+    return valid, missing
@@ -0,0 +1,236 @@
+import copy
+import json
+import re
+from datetime import date, datetime
+from typing import Optional
+
+# 스케줄 항목에서 과목/문제집 이름을 담는 키
+ITEM_SUBJECT_KEYS = ("subject", "workbook", "과목", "문제집")
+
+# 피드백이 스케줄 전체를 다시 짜달라는 뜻이면 부분 수정을 하지 않습니다.
+_WHOLE_SCHEDULE_WORDS = ("전체", "전부", "모든", "처음부터", "다시 짜")
+_RELATIVE_WEEKS = (
+    (re.compile(r"다다음\s*주"), 2),
+    (re.compile(r"(?<!다)(다음|담)\s*주"), 1),
+    # '1주차 주말'의 '차 주'를 다음 주로 읽지 않도록 단어로 쓰인 '차주'만 봅니다.
+    (re.compile(r"(?<![0-9가-힣])차주"), 1),
+    (re.compile(r"(이번|금)\s*주"), 0),
+)
+_ORDINAL_WEEKS = {"첫": 1, "둘": 2, "두": 2, "셋": 3, "세": 3, "넷": 4, "네": 4, "다섯": 5, "여섯": 6}
+_NUMBERED_WEEK = re.compile(r"(\d+)\s*(?:주\s*차|번째\s*주)|week\s*(\d+)", re.IGNORECASE)
+_ORDINAL_WEEK = re.compile(r"(첫|둘|두|셋|세|넷|네|다섯|여섯)\s*(째|번째)?\s*주")
+_LAST_WEEK = re.compile(r"마지막\s*주")
+_SUBJECT_SUFFIX = re.compile(r"\s*[ⅠⅡⅢ]+$")
+
+
+class ScheduleMergeError(ValueError):
+    """부분 수정 결과를 기존 스케줄에 합칠 수 없거나, 바뀌면 안 되는 부분이 바뀌었을 때 발생합니다."""
+
+
+class ModificationScope:
+    """
+    피드백이 가리키는 수정 범위입니다.
+    weeks는 다시 만들 주차 키 목록, subjects는 그 주차에서 다시 만들 과목 이름 목록(None이면 모든 과목)입니다.
+    """
+
+    def __init__(self, start_date: str, weeks: list[str], subjects: Optional[list[str]] = None):
+        self.start_date = start_date
+        self.weeks = weeks
+        self.subjects = subjects
+
+    def matches(self, item) -> bool:
+        """item이 다시 만들 과목의 항목인지 확인합니다. subjects가 없으면 모든 항목이 해당합니다."""
+        if self.subjects is None:
+            return True
+        if not isinstance(item, dict):
+            return False
+        return any(
+            _subject_base(item.get(key)) in self.subjects
+            for key in ITEM_SUBJECT_KEYS
+            if isinstance(item.get(key), str)
+        )
+
+    def describe(self) -> dict:
+        return {"weeks": self.weeks, "subjects": self.subjects}
+
+
+def _subject_base(name: str) -> str:
+    """'수학Ⅰ'처럼 뒤에 붙은 로마 숫자를 떼어 피드백의 과목 이름('수학')과 비교합니다."""
+    return _SUBJECT_SUFFIX.sub("", (name or "").strip())
+
+
+def _schedule_weeks(schedule: dict) -> tuple[Optional[str], dict]:
+    if not isinstance(schedule, dict) or not schedule:
+        return None, {}
+    start_date = next(iter(schedule))
+    weeks = schedule[start_date]
+    return start_date, weeks if isinstance(weeks, dict) else {}
+
+
+def _current_week(start_date: str, today: date) -> int:
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return 1
+    return max((today - start).days // 7 + 1, 1)
+
+
+def _referenced_weeks(feedback: str, week_keys: list[str], current_week: int) -> list[str]:
+    referenced = set()
+    for match in _NUMBERED_WEEK.finditer(feedback):
+        referenced.add(int(match.group(1) or match.group(2)))
+    for match in _ORDINAL_WEEK.finditer(feedback):
+        # '두 주 동안'처럼 기간을 뜻하는 표현은 제외하고 '둘째 주', '첫 주'만 주차로 봅니다.
+        if match.group(2) or match.group(1) == "첫":
+            referenced.add(_ORDINAL_WEEKS[match.group(1)])
+    if _LAST_WEEK.search(feedback) and week_keys:
+        referenced.add(max(int(key) for key in week_keys if key.isdigit()))
+
+    remaining = feedback
+    for pattern, offset in _RELATIVE_WEEKS:
+        if pattern.search(remaining):
+            referenced.add(current_week + offset)
+            # '다다음 주'가 '다음 주'로 한 번 더 잡히지 않게 지웁니다.
+            remaining = pattern.sub(" ", remaining)
+
+    return [key for key in week_keys if key.isdigit() and int(key) in referenced]
+
+
+def _referenced_subjects(feedback: str, schedule_weeks: dict, workbooks: list) -> list[str]:
+    names = {_subject_base(wb.get("workbook")) for wb in workbooks if isinstance(wb, dict)}
+    for plans in schedule_weeks.values():
+        for plan in plans if isinstance(plans, list) else []:
+            weekplan = plan.get("weekplan") if isinstance(plan, dict) else None
+            for items in (weekplan or {}).values():
+                for item in items if isinstance(items, list) else []:
+                    if isinstance(item, dict):
+                        names.update(
+                            _subject_base(item[key]) for key in ITEM_SUBJECT_KEYS if isinstance(item.get(key), str)
+                        )
+    return sorted(name for name in names if name and name in feedback)
+
+
+def plan_modification_scope(
+    existing_schedule: dict,
+    feedback: str,
+    workbooks: list,
+    today: Optional[date] = None,
+) -> Optional[ModificationScope]:
+    """
+    피드백에서 '다음 주', '3주차', '수학'처럼 주차와 과목을 가리키는 표현을 찾아 수정 범위를 정합니다.
+    범위를 좁힐 수 없으면(스케줄 전체가 대상이면) None을 반환하며, 이때는 스케줄 전체를 다시 만듭니다.
+    """
+    start_date, schedule_weeks = _schedule_weeks(existing_schedule)
+    if not start_date or not schedule_weeks or not feedback:
+        return None
+    if any(word in feedback for word in _WHOLE_SCHEDULE_WORDS):
+        return None
+
+    week_keys = list(schedule_weeks)
+    current_week = _current_week(start_date, today or date.today())
+    weeks = _referenced_weeks(feedback, week_keys, current_week)
+    subjects = _referenced_subjects(feedback, schedule_weeks, workbooks)
+
+    if not subjects and (not weeks or len(weeks) == len(week_keys)):
+        return None
+    return ModificationScope(start_date, weeks or week_keys, subjects or None)
+
+
+def slice_schedule(existing_schedule: dict, scope: ModificationScope) -> dict:
+    """수정 범위에 해당하는 주차와 과목 항목만 남긴 스케줄을 만듭니다. 모델에는 이 부분만 보냅니다."""
+    _, schedule_weeks = _schedule_weeks(existing_schedule)
+    sliced = {}
+    for week in scope.weeks:
+        plans = []
+        for plan in schedule_weeks.get(week) or []:
+            if not isinstance(plan, dict):
+                continue
+            weekplan = plan.get("weekplan") or {}
+            plans.append({
+                **plan,
+                "weekplan": {
+                    day: [item for item in items if scope.matches(item)]
+                    for day, items in weekplan.items()
+                },
+            })
+        sliced[week] = plans
+    return {scope.start_date: sliced}
+
+
+def merge_week(existing_plans: list, new_plans, scope: ModificationScope) -> list:
+    """
+    한 주차의 새 계획을 기존 계획에 합칩니다. 과목 범위가 있으면 다른 과목 항목은 그대로 두고
+    해당 과목 항목만 새 항목으로 바꿉니다.
+    """
+    if not isinstance(new_plans, list) or not new_plans:
+        raise ScheduleMergeError("주차 계획이 비어 있습니다.")
+    if not isinstance(existing_plans, list) or not existing_plans:
+        # 합칠 기존 계획이 없으면 새 계획이 그대로 버려지므로 합치지 않습니다.
+        raise ScheduleMergeError("기존 주차 계획이 비어 있습니다.")
+
+    merged = []
+    for plan_index, plan in enumerate(existing_plans):
+        new_plan = new_plans[min(plan_index, len(new_plans) - 1)]
+        new_weekplan = new_plan.get("weekplan") if isinstance(new_plan, dict) else None
+        if not isinstance(new_weekplan, dict):
+            raise ScheduleMergeError("weekplan이 없습니다.")
+
+        weekplan = plan.get("weekplan") or {}
+        days = list(weekplan) + [day for day in new_weekplan if day not in weekplan]
+        merged_weekplan = {}
+        for day in days:
+            new_items = new_weekplan.get(day) or []
+            if not isinstance(new_items, list):
+                raise ScheduleMergeError(f"{day} 항목이 리스트가 아닙니다.")
+            kept = [item for item in weekplan.get(day) or [] if not scope.matches(item)]
+            merged_weekplan[day] = kept + new_items
+        merged.append({**plan, "weekplan": merged_weekplan})
+    return merged
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def verify_untouched(existing_schedule: dict, merged_schedule: dict, scope: ModificationScope) -> None:
+    """
+    수정 범위 밖의 주차와 과목 항목이 바이트 단위로 같은지 확인합니다. 다르면 ScheduleMergeError를 발생시킵니다.
+    """
+    start_date, old_weeks = _schedule_weeks(existing_schedule)
+    merged_start, new_weeks = _schedule_weeks(merged_schedule)
+    if merged_start != start_date or list(new_weeks) != list(old_weeks):
+        raise ScheduleMergeError("스케줄의 날짜나 주차 구성이 바뀌었습니다.")
+
+    for week, plans in old_weeks.items():
+        if week not in scope.weeks:
+            if _canonical(new_weeks[week]) != _canonical(plans):
+                raise ScheduleMergeError(f"{week}주차가 바뀌었습니다.")
+            continue
+        if scope.subjects is None:
+            continue
+        for old_plan, new_plan in zip(plans, new_weeks[week]):
+            for day, items in (old_plan.get("weekplan") or {}).items():
+                untouched = [item for item in items if not scope.matches(item)]
+                after = [item for item in new_plan["weekplan"].get(day, []) if not scope.matches(item)]
+                if _canonical(after) != _canonical(untouched):
+                    raise ScheduleMergeError(f"{week}주차 {day}의 다른 과목 항목이 바뀌었습니다.")
+
+
+def partial_weeks(partial_schedule: dict) -> dict:
+    """모델이 돌려준 부분 스케줄에서 {주차: 계획} 부분을 꺼냅니다. 날짜 키는 기존 시작 날짜와 달라도 됩니다."""
+    _, weeks = _schedule_weeks(partial_schedule)
+    return weeks
+
+
+def merge_partial_schedule(existing_schedule: dict, partial_schedule: dict, scope: ModificationScope) -> dict:
+    """부분 스케줄을 기존 스케줄에 합치고, 범위 밖이 그대로인지 확인한 새 스케줄을 반환합니다."""
+    weeks = partial_weeks(partial_schedule)
+    missing = [week for week in scope.weeks if week not in weeks]
+    if missing:
+        raise ScheduleMergeError(f"응답에 {', '.join(missing)}주차가 없습니다.")
+
+    merged = copy.deepcopy(existing_schedule)
+    for week in scope.weeks:
+        merged[scope.start_date][week] = merge_week(merged[scope.start_date][week], weeks[week], scope)
+    verify_untouched(existing_schedule, merged, scope)
+    return merged
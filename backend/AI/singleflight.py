@@ -0,0 +1,35 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    같은 키의 호출이 진행 중이면 새로 시작하지 않고 진행 중인 결과를 함께 기다리게 합니다.
+    연속 클릭이나 클라이언트 재시도로 같은 입력의 LLM 호출이 동시에 여러 번 나가는 것을 막습니다.
+    같은 프로세스 안에서만 합쳐지며, 결과가 나오면 키를 지우므로 캐시 역할은 하지 않습니다.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        key로 진행 중인 호출이 있으면 그 결과를, 없으면 fn()을 실행한 결과를 반환합니다.
+        기다리던 요청 하나가 취소되어도 공유 호출은 취소되지 않습니다. 결과는 호출마다 복사본을 돌려줍니다.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "shared": self.shared}
+
+
+llm_single_flight = SingleFlight()
@@ -1,4 +1,8 @@
+import asyncio
+import copy
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 from typing import TypeVar, Optional
@@ -14,6 +18,15 @@ from logger import create_logger
 
 load_dotenv()
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+# 0이면 사용자 캐시를 쓰지 않습니다.
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "0"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "1024"))
+
+# bcrypt 해시/검증을 실행할 스레드 수. bcrypt는 GIL을 풀고 계산하므로 스레드로도 병렬 처리됩니다.
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# 인증된 요청에서 사용하는 사용자 문서에는 비밀번호 해시를 싣지 않습니다.
+USER_PROJECTION = {"_id": 0, "password": 0}
 
 logger = create_logger(__name__)
 
@@ -21,9 +34,57 @@ USER_ID = TypeVar("USER_ID", str, None)
 security = HTTPBearer()
 
 
+class UserCache:
+    """
+    워커 프로세스 안에서 사용자 문서를 짧게 보관하는 캐시입니다.
+    user_db에 쓰기가 일어나면 invalidate로 해당 사용자를 지워야 합니다.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, dict]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(user_id, None)
+            return None
+        return copy.deepcopy(user)
+
+    def set(self, user_id: str, user: dict) -> None:
+        if not self.enabled:
+            return
+        if len(self._entries) >= self.max_entries:
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(user))
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES)
+
+# CryptContext는 생성 비용이 있으므로 프로세스에서 하나만 만들어 재사용합니다.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_executor = ThreadPoolExecutor(
+    max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+
+
 class AuthService:
     def __init__(self):
-        self.hashed_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.hashed_context = pwd_context
 
     @staticmethod
     async def create_access_token(user_id: str) -> str:
@@ -51,27 +112,36 @@ class AuthService:
     @staticmethod
     async def verify_user_exists(user_id: str, db: Database) -> bool:
         users_collection = db["user_db"]
-        user = await users_collection.find_one({"userID": user_id})
+        user = await users_collection.find_one({"userID": user_id}, {"_id": 1})
         exists = user is not None
         return exists
 
     @staticmethod
     async def get_user_by_id(user_id: str, db: Database) -> dict | None:
+        """비밀번호를 제외한 사용자 문서를 한 번의 조회로 가져옵니다. 사용자 캐시가 켜져 있으면 먼저 확인합니다."""
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
         users_collection = db["user_db"]
-        user = await users_collection.find_one({"userID": user_id})
+        user = await users_collection.find_one({"userID": user_id}, USER_PROJECTION)
         if not user:
             logger.warning(f"User not found for userID: {user_id}")
+            return None
+        user_cache.set(user_id, user)
         return user
 
     @staticmethod
-    def hash_password(password: str) -> str:
-        crypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return crypt_context.hash(password)
+    async def hash_password(password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, pwd_context.hash, password)
 
     @staticmethod
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        crypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        is_valid = crypt_context.verify(plain_password, hashed_password)
+    async def verify_password(plain_password: str, hashed_password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        is_valid = await loop.run_in_executor(
+            password_executor, pwd_context.verify, plain_password, hashed_password
+        )
         return is_valid
 
 
@@ -79,11 +149,11 @@ def get_auth_service() -> AuthService:
     return AuthService()
 
 
-async def get_current_user_id(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Database = Depends(get_db),
     auth_service: AuthService = Depends(get_auth_service),
-) -> USER_ID:
+) -> dict:
     try:
         token = credentials.credentials
 
@@ -94,26 +164,47 @@ async def get_current_user_id(
             logger.warning("Token payload missing user ID")
             raise InvalidTokenException()
 
-        user_exists = await auth_service.verify_user_exists(user_id, db)
-        if not user_exists:
-            logger.warning(f"Token user not found in database: {user_id}")
-            raise UserNotFoundException(user_id)
-
-        logger.info(f"Authentication successful for userID: {user_id}")
-        return user_id
-
     except JWTError as e:
         logger.warning(f"JWT decode error: {e}")
         raise InvalidTokenException()
 
-
-async def get_current_user(
-    current_user_id: str = Depends(get_current_user_id),
-    db: Database = Depends(get_db),
-    auth_service: AuthService = Depends(get_auth_service),
-) -> dict:
-    user = await auth_service.get_user_by_id(current_user_id, db)
+    # 존재 확인과 사용자 조회를 한 번의 쿼리로 처리합니다.
+    user = await auth_service.get_user_by_id(user_id, db)
     if not user:
-        logger.warning(f"Session user not found: {current_user_id}")
-        raise UserNotFoundException(current_user_id)
+        logger.warning(f"Token user not found in database: {user_id}")
+        raise UserNotFoundException(user_id)
+
+    logger.info(f"Authentication successful for userID: {user_id}")
     return user
+
+
+async def get_current_user_id(
+    current_user: dict = Depends(get_current_user),
+) -> USER_ID:
+    return current_user.get("userID")
+
+
+async def _benchmark_login(requests_count: int = 32) -> None:
+    """이벤트 루프에서 직접 검증할 때와 스레드 풀로 넘길 때의 로그인(비밀번호 검증) 처리량을 비교합니다."""
+    hashed = pwd_context.hash("benchmark-password")
+
+    async def inline_verify():
+        return pwd_context.verify("benchmark-password", hashed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(inline_verify() for _ in range(requests_count)))
+    inline_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(AuthService.verify_password("benchmark-password", hashed) for _ in range(requests_count))
+    )
+    pooled_elapsed = time.perf_counter() - started
+
+    print(f"logins: {requests_count}, workers: {AUTH_HASH_WORKERS}")
+    print(f"before (on event loop): {requests_count / inline_elapsed:.1f} logins/s")
+    print(f"after  (thread pool):   {requests_count / pooled_elapsed:.1f} logins/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(_benchmark_login())
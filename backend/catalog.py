@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from typing import Optional
+
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+DICT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dict.json")
+
+CatalogKey = tuple[str, str, str]
+
+
+class _CatalogSnapshot:
+    """dict.json 한 번의 파싱 결과와 그 위에 만든 인덱스. 생성 후에는 변경하지 않습니다."""
+
+    def __init__(self, entries: list, mtime: float):
+        self.entries = entries
+        self.mtime = mtime
+        self.by_key: dict[CatalogKey, dict] = {}
+        self.by_grade: dict[str, list] = {}
+
+        for entry in entries:
+            key = (entry.get("grade"), entry.get("publish"), entry.get("workbook"))
+            # 기존 선형 탐색과 동일하게 처음 등장한 항목을 우선합니다.
+            self.by_key.setdefault(key, entry)
+            self.by_grade.setdefault(entry.get("grade"), []).append(entry)
+
+
+class WorkbookCatalog:
+    """
+    문제집 카탈로그(dict.json)를 메모리에 올려두고 (grade, publish, workbook) 해시 인덱스와
+    학년별 인덱스로 조회합니다. 파일의 mtime이 바뀌면 새 스냅샷을 만든 뒤 한 번에 교체합니다.
+    """
+
+    def __init__(self, path: str = DICT_PATH):
+        self.path = os.path.normpath(path)
+        self._snapshot: Optional[_CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """카탈로그를 (다시) 읽습니다. 시작 시 호출하면 첫 요청에서 파싱 비용을 내지 않습니다."""
+        self._refresh(force=True)
+
+    def _refresh(self, force: bool = False) -> _CatalogSnapshot:
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            snapshot = self._snapshot
+            # 다른 요청이 먼저 다시 읽었다면 그 결과를 그대로 사용합니다.
+            if not force and snapshot is not None and snapshot.mtime == mtime:
+                return snapshot
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            self._snapshot = _CatalogSnapshot(entries, mtime)
+        logger.info(f"Workbook catalog loaded: {len(entries)} entries from {self.path}")
+        return self._snapshot
+
+    def _current(self) -> _CatalogSnapshot:
+        snapshot = self._snapshot
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if snapshot is None:
+                raise
+            logger.warning(f"Workbook catalog file missing, serving cached copy: {self.path}")
+            return snapshot
+
+        if snapshot is not None and snapshot.mtime == mtime:
+            return snapshot
+
+        try:
+            return self._refresh()
+        except (OSError, json.JSONDecodeError) as e:
+            # 파일이 저장되는 도중이거나 깨졌다면 직전 스냅샷을 계속 사용합니다.
+            if snapshot is None:
+                raise
+            logger.error(f"Workbook catalog reload failed, keeping previous snapshot: {e}")
+            return snapshot
+
+    def all(self) -> list:
+        return self._current().entries
+
+    def get(self, grade: str, publish: str, workbook: str) -> Optional[dict]:
+        return self._current().by_key.get((grade, publish, workbook))
+
+    def by_grade(self, grade: str) -> list:
+        return list(self._current().by_grade.get(grade, []))
+
+    def find_many(self, keys) -> list:
+        """(grade, publish, workbook) 목록에 해당하는 항목을 중복 없이 순서대로 반환합니다."""
+        snapshot = self._current()
+        found = []
+        seen = set()
+        for key in keys:
+            entry = snapshot.by_key.get(tuple(key))
+            if entry is not None and id(entry) not in seen:
+                seen.add(id(entry))
+                found.append(entry)
+        return found
+
+
+workbook_catalog = WorkbookCatalog()
+
+
+def get_catalog() -> WorkbookCatalog:
+    return workbook_catalog
@@ -1,15 +1,53 @@
 from fastapi import FastAPI
-from pymongo import AsyncMongoClient
+from pymongo import AsyncMongoClient, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 from pymongo.asynchronous.database import AsyncDatabase
 from pymongo.server_api import ServerApi
 from contextlib import asynccontextmanager
 import os
 from typing import Optional
 
+from AI.cache import LLM_CACHE_SHARED, get_llm_cache
+from catalog import workbook_catalog
+from images import image_uploader
+from jobs import job_queue
 from logger import create_logger
 
 logger = create_logger(__name__)
 
+# 시작 시 보장할 인덱스: (컬렉션, 키, create_index 옵션)
+INDEX_SPECS = [
+    ("user_db", [("userID", ASCENDING)], {"name": "userID_unique", "unique": True}),
+    # 하루 문서(timeSlots)는 사용자/날짜마다 하나만 둡니다. /focus-feedback의 시간대별 문서는 제외됩니다.
+    ("focus", [("userID", ASCENDING), ("whenDay", ASCENDING)], {
+        "name": "userID_whenDay_day_unique",
+        "unique": True,
+        "partialFilterExpression": {"timeSlots": {"$exists": True}},
+    }),
+    # 사용자의 현재(가장 최근) 스케줄 조회
+    ("schedule", [("userID", ASCENDING), ("created_at", DESCENDING)], {"name": "userID_created_at"}),
+    # 스케줄 변경 이력: 리비전 조회와 가장 가까운 스냅샷 찾기
+    ("schedule_history", [("schedule_id", ASCENDING), ("revision", ASCENDING)], {
+        "name": "scheduleId_revision_unique",
+        "unique": True,
+    }),
+    # /neurofeedback_load의 (when, _id) 키셋 페이지네이션 정렬을 그대로 따릅니다.
+    ("neurofeedback", [("userID", ASCENDING), ("when", ASCENDING), ("_id", ASCENDING)], {"name": "userID_when_id"}),
+    # 작업 큐: 실행할 작업 가져오기와 끝난 작업 자동 삭제
+    ("jobs", [("status", ASCENDING), ("run_at", ASCENDING)], {"name": "status_run_at"}),
+    ("jobs", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    # LLM 응답 공유 캐시: expires_at이 지나면 MongoDB가 문서를 지웁니다.
+    ("llm_cache", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    # Idempotency-Key로 저장한 응답: 보관 시간이 지나면 지웁니다.
+    ("idempotency_keys", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+]
+
+# 더 이상 쓰지 않는 인덱스: (컬렉션, 이름). 시작할 때 남아 있으면 지웁니다.
+# userID_created_date - 스케줄을 created_date로 찾던 조회가 없어졌습니다(현재 스케줄은 userID_created_at 사용).
+DROPPED_INDEXES = [
+    ("schedule", "userID_created_date"),
+]
+
 
 class DatabaseManager:
     def __init__(self):
@@ -33,6 +71,43 @@ class DatabaseManager:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
 
+        await self.ensure_indexes()
+
+    async def ensure_indexes(self) -> dict[str, list[str]]:
+        """
+        INDEX_SPECS의 인덱스를 만들고 새로 만든 인덱스 이름을 컬렉션별로 반환합니다. DROPPED_INDEXES는 지웁니다.
+        이미 있는 인덱스는 건너뛰므로 매번 시작할 때 실행해도 됩니다.
+        """
+        created: dict[str, list[str]] = {}
+        for collection_name, keys, options in INDEX_SPECS:
+            collection = self.db[collection_name]
+            existing = await collection.index_information()
+            if options["name"] in existing:
+                continue
+            try:
+                await collection.create_index(keys, **options)
+            except OperationFailure as e:
+                # 중복 userID 같은 기존 데이터나 이름이 다른 같은 인덱스 때문에 실패해도 서버는 띄웁니다.
+                logger.error(f"Failed to create index {collection_name}.{options['name']}: {e}")
+                continue
+            created.setdefault(collection_name, []).append(options["name"])
+
+        if created:
+            logger.info(f"Created indexes: {created}")
+        else:
+            logger.info("All indexes already exist")
+
+        for collection_name, name in DROPPED_INDEXES:
+            collection = self.db[collection_name]
+            if name not in await collection.index_information():
+                continue
+            try:
+                await collection.drop_index(name)
+                logger.info(f"Dropped unused index {collection_name}.{name}")
+            except OperationFailure as e:
+                logger.error(f"Failed to drop index {collection_name}.{name}: {e}")
+        return created
+
     async def disconnect(self):
         if self.client:
             await self.client.close()
@@ -52,8 +127,14 @@ db_manager = DatabaseManager()
 async def lifespan(_app: FastAPI):
     logger.info("Starting application...")
     await db_manager.connect()
+    workbook_catalog.load()
+    if LLM_CACHE_SHARED:
+        get_llm_cache().attach_collection(db_manager.get_db()["llm_cache"])
+    job_queue.start(db_manager.get_db()["jobs"])
     yield
     logger.info("Shutting down application...")
+    await job_queue.stop()
+    await image_uploader.close()
     await db_manager.disconnect()
 
 
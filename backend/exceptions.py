@@ -68,6 +68,66 @@ class SubjectNotFoundException(BaseHTTPException):
         )
 
 
+class ScheduleNotFoundException(BaseHTTPException):
+    def __init__(self, user_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            code="SCHEDULE_NOT_FOUND",
+            message="Schedule not found.",
+            details={"user_id": user_id},
+        )
+
+
+class ScheduleVersionConflictException(BaseHTTPException):
+    def __init__(self, expected_version: int, current_version: int):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            code="SCHEDULE_VERSION_CONFLICT",
+            message="Schedule was modified by another request.",
+            details={"expected_version": expected_version, "current_version": current_version},
+        )
+
+
+class ScheduleRevisionNotFoundException(BaseHTTPException):
+    def __init__(self, schedule_id: str, revision: int):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            code="SCHEDULE_REVISION_NOT_FOUND",
+            message="Schedule revision not found.",
+            details={"schedule_id": schedule_id, "revision": revision},
+        )
+
+
+class JobNotFoundException(BaseHTTPException):
+    def __init__(self, job_id: str):
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            code="JOB_NOT_FOUND",
+            message="Job not found.",
+            details={"job_id": job_id},
+        )
+
+
+class IdempotencyKeyInProgressException(BaseHTTPException):
+    def __init__(self, key: str):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            code="IDEMPOTENCY_KEY_IN_PROGRESS",
+            message="A request with this Idempotency-Key is still being processed.",
+            details={"idempotency_key": key},
+        )
+
+
+class IdempotencyKeyMismatchException(BaseHTTPException):
+    def __init__(self, key: str):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            code="IDEMPOTENCY_KEY_MISMATCH",
+            message="Idempotency-Key was already used with a different request body.",
+            details={"idempotency_key": key},
+        )
+
+
 class MissingRequiredFieldException(BaseHTTPException):
     def __init__(self, fields: list[str]):
         super().__init__(
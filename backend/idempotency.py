@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
+
+from database import get_db
+from exceptions import (
+    IdempotencyKeyInProgressException,
+    IdempotencyKeyMismatchException,
+    InvalidDataException,
+)
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+# 처리한 요청의 응답을 보관하는 시간(초), 지나면 TTL 인덱스가 지우고 같은 키를 다시 쓸 수 있습니다.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+# 처리 중(pending) 기록을 만든 프로세스가 이 시간 안에 끝내지 못하면(프로세스 종료 등) 같은 키의 재시도가 이어받습니다.
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "300"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# 재생할 때 함께 돌려주는 응답 헤더
+REPLAYED_HEADERS = ("Location",)
+
+IDEMPOTENCY_PENDING = "pending"
+IDEMPOTENCY_DONE = "done"
+
+
+def request_hash(payload: Any) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Unsaved:
+    """
+    handler가 응답을 이 객체로 감싸 반환하면 저장하지 않고 응답만 돌려주며, 처리 중 기록은 지웁니다.
+    일시적인 실패를 대신하는 응답(AI 호출 실패 안내 등)을 같은 키의 재시도에 다시 돌려주지 않을 때 씁니다.
+    """
+
+    def __init__(self, response: Any):
+        self.response = response
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key 헤더가 붙은 POST 요청의 응답을 idempotency_keys 컬렉션에 저장하고,
+    같은 키로 다시 들어온 요청에는 다시 처리하지 않고 저장한 응답을 돌려줍니다.
+    키는 사용자와 엔드포인트별로 구분하며, 같은 키에 다른 요청 본문을 보내면 422입니다.
+    """
+
+    def __init__(self, db: AsyncDatabase):
+        self.collection = db["idempotency_keys"]
+
+    @staticmethod
+    def _record_id(user_id: str, endpoint: str, key: str) -> str:
+        return f"{user_id}:{endpoint}:{key}"
+
+    async def begin(self, user_id: str, endpoint: str, key: str, payload_hash: str) -> Optional[dict]:
+        """
+        처음 보는 키면 처리 중 기록을 만들고 None을 반환합니다. 이미 처리한 키면 저장한 기록을 반환합니다.
+        다른 요청이 같은 키로 처리 중이면 IdempotencyKeyInProgressException을 발생시킵니다.
+        """
+        record_id = self._record_id(user_id, endpoint, key)
+        now = datetime.now()
+        try:
+            await self.collection.insert_one({
+                "_id": record_id,
+                "userID": user_id,
+                "endpoint": endpoint,
+                "request_hash": payload_hash,
+                "status": IDEMPOTENCY_PENDING,
+                "lease_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await self.collection.find_one({"_id": record_id})
+        if existing is None:
+            # 그 사이 만료되어 지워졌으면 처음 보는 키로 처리합니다.
+            return await self.begin(user_id, endpoint, key, payload_hash)
+        if existing.get("request_hash") != payload_hash:
+            raise IdempotencyKeyMismatchException(key)
+        if existing.get("status") == IDEMPOTENCY_DONE:
+            return existing
+
+        taken = await self.collection.find_one_and_update(
+            {"_id": record_id, "status": IDEMPOTENCY_PENDING, "lease_until": {"$lt": now}},
+            {"$set": {"lease_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}},
+        )
+        if taken is not None:
+            logger.warning(f"Idempotency key lease expired, retrying: {record_id}")
+            return None
+        raise IdempotencyKeyInProgressException(key)
+
+    async def complete(self, user_id: str, endpoint: str, key: str, status_code: int, body: Any, headers: dict) -> None:
+        await self.collection.update_one(
+            {"_id": self._record_id(user_id, endpoint, key)},
+            {
+                "$set": {
+                    "status": IDEMPOTENCY_DONE,
+                    "status_code": status_code,
+                    "body": body,
+                    "headers": headers,
+                    "completed_at": datetime.now(),
+                },
+                "$unset": {"lease_until": ""},
+            },
+        )
+
+    async def abandon(self, user_id: str, endpoint: str, key: str) -> None:
+        """처리에 실패한 요청의 기록을 지워 같은 키로 다시 시도할 수 있게 합니다."""
+        await self.collection.delete_one(
+            {"_id": self._record_id(user_id, endpoint, key), "status": IDEMPOTENCY_PENDING}
+        )
+
+    async def run(
+        self,
+        key: Optional[str],
+        user_id: str,
+        endpoint: str,
+        payload: Any,
+        handler: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        key가 없으면 handler()를 그대로 실행합니다. key가 있으면 처음 한 번만 실행해 응답(상태 코드, 본문,
+        Location 헤더)을 저장하고, 같은 키의 재시도에는 저장한 응답을 Idempotent-Replayed 헤더와 함께 돌려줍니다.
+        handler가 예외를 던지거나 Unsaved로 감싼 응답을 반환하면 기록을 지우므로 같은 키로 다시 시도할 수 있습니다.
+        """
+        if not key:
+            result = await handler()
+            return result.response if isinstance(result, Unsaved) else result
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise InvalidDataException(
+                "Idempotency-Key is too long.", {"max_length": IDEMPOTENCY_KEY_MAX_LENGTH}
+            )
+
+        stored = await self.begin(user_id, endpoint, key, request_hash(payload))
+        if stored is not None:
+            logger.info(f"Idempotent replay: {endpoint} {key}")
+            return JSONResponse(
+                status_code=stored["status_code"],
+                content=stored["body"],
+                headers={**stored.get("headers", {}), "Idempotent-Replayed": "true"},
+            )
+
+        try:
+            result = await handler()
+        except BaseException:
+            await self.abandon(user_id, endpoint, key)
+            raise
+        if isinstance(result, Unsaved):
+            logger.info(f"Idempotency key released without saving the response: {endpoint} {key}")
+            await self.abandon(user_id, endpoint, key)
+            return result.response
+
+        if isinstance(result, JSONResponse):
+            status_code = result.status_code
+            body = json.loads(result.body)
+            headers = {name: result.headers[name] for name in REPLAYED_HEADERS if name in result.headers}
+        else:
+            status_code, body, headers = 200, jsonable_encoder(result), {}
+        await self.complete(user_id, endpoint, key, status_code, body, headers)
+        return result
+
+
+def get_idempotency_store(db: AsyncDatabase = Depends(get_db)) -> IdempotencyStore:
+    return IdempotencyStore(db)
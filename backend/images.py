@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Optional
+
+import httpx
+
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+# 한 요청에서 동시에 진행할 업로드 수와 업로드 1건당 제한 시간(초)
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "8"))
+IMAGE_UPLOAD_TIMEOUT_SECONDS = float(os.getenv("IMAGE_UPLOAD_TIMEOUT_SECONDS", "10"))
+# 메모리에 보관할 이미지 바이트의 최대 합계와 클라이언트 캐시 유지 시간(초)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+IMAGE_CACHE_MAX_AGE_SECONDS = int(os.getenv("IMAGE_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 60 * 60)))
+
+IMAGE_VARIANTS = ("original", "small")
+
+_SVG_NUMBER = re.compile(rb"-?\d+\.\d{2,}")
+_SVG_GAP = re.compile(rb">\s+<")
+
+
+class ImageDirectory:
+    """
+    이미지 디렉터리의 정렬된 파일 목록을 캐시합니다.
+    디렉터리 mtime은 파일이 추가/삭제될 때 바뀌므로, mtime이 같으면 listdir을 다시 하지 않습니다.
+    """
+
+    def __init__(self):
+        self._listings: dict[str, tuple[float, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def list(self, directory: str) -> list[str]:
+        """정렬된 파일 이름 목록을 반환합니다. 디렉터리가 없으면 FileNotFoundError가 발생합니다."""
+        if not directory or not os.path.isdir(directory):
+            raise FileNotFoundError(directory)
+
+        mtime = os.stat(directory).st_mtime
+        cached = self._listings.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            image_list = sorted(os.listdir(directory))
+            self._listings[directory] = (mtime, image_list)
+        logger.info(f"Image directory listed: {directory} ({len(image_list)} files)")
+        return image_list
+
+
+class CachedImage:
+    def __init__(self, content: bytes, mtime: float, media_type: str):
+        self.content = content
+        self.mtime = mtime
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+
+def _round_svg_number(match: re.Match) -> bytes:
+    value = f"{round(float(match.group()), 1):.1f}".rstrip("0").rstrip(".")
+    return (value if value != "-0" else "0").encode()
+
+
+def make_small_variant(content: bytes, media_type: str) -> bytes:
+    """
+    가벼운 변형을 만듭니다. 게임 이미지는 SVG라서 픽셀을 줄이는 대신
+    소수점 아래 두 자리 이상인 좌표를 첫째 자리로 반올림하고 태그 사이 공백을 지웁니다(화면에서는 구분되지 않고 크기는 절반 정도).
+    SVG가 아니면 원본을 그대로 사용합니다.
+    """
+    if media_type != "image/svg+xml":
+        return content
+    return _SVG_GAP.sub(b"><", _SVG_NUMBER.sub(_round_svg_number, content))
+
+
+class ImageCache:
+    """
+    이미지 파일 바이트를 메모리에 올려두는 크기 제한 LRU 캐시입니다.
+    파일 mtime이 바뀌면 다시 읽고, 변형(small)은 처음 요청될 때 한 번 만들어 함께 보관합니다.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, str], CachedImage] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, variant: str = "original") -> CachedImage:
+        """캐시된 이미지를 반환합니다. 파일이 없으면 FileNotFoundError가 발생합니다."""
+        mtime = os.stat(path).st_mtime
+        key = (path, variant)
+
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None and image.mtime == mtime:
+                self._entries.move_to_end(key)
+                return image
+
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as image_file:
+            content = image_file.read()
+        if variant == "small":
+            content = make_small_variant(content, media_type)
+        image = CachedImage(content, mtime, media_type)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.content)
+            if len(content) <= self.max_bytes:
+                self._entries[key] = image
+                self._size += len(content)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.content)
+        return image
+
+
+class ImageUploader:
+    """연결을 재사용하는 httpx.AsyncClient로 이미지를 업로드합니다. 동시 업로드 수와 건당 제한 시간을 둡니다."""
+
+    def __init__(
+        self,
+        concurrency: int = IMAGE_UPLOAD_CONCURRENCY,
+        timeout: float = IMAGE_UPLOAD_TIMEOUT_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+        return self._client
+
+    async def upload(self, url: str, filename: str, content: bytes, content_type: str = "image/jpeg") -> dict:
+        """
+        업로드 응답 JSON을 반환합니다. 실패하면 httpx.HTTPError 또는 asyncio.TimeoutError가,
+        응답이 JSON이 아니면 ValueError(json.JSONDecodeError)가 발생합니다.
+        """
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                self.client.post(url, files={"file": (filename, content, content_type)}),
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+image_directory = ImageDirectory()
+image_cache = ImageCache()
+image_uploader = ImageUploader()
@@ -0,0 +1,222 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
+
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+# 프로세스당 동시에 처리할 작업 수 (0이면 이 프로세스는 작업을 받기만 하고 처리하지 않습니다)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# 재시도 대기 시간은 JOB_RETRY_BASE_SECONDS * 2^(시도 횟수 - 1)입니다.
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# 작업을 가져간 워커가 이 시간 안에 끝내지 못하면(프로세스 종료 등) 다른 워커가 다시 가져갑니다.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+# 끝난 작업 문서를 보관하는 시간(초), 지나면 TTL 인덱스가 지웁니다.
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", str(24 * 60 * 60)))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+
+class PermanentJobError(Exception):
+    """다시 시도해도 결과가 같은 실패(잘못된 입력 등)입니다. 재시도하지 않고 바로 failed로 끝냅니다."""
+
+
+def retry_delay(attempts: int, base: float = JOB_RETRY_BASE_SECONDS) -> float:
+    return base * 2 ** max(attempts - 1, 0)
+
+
+def serialize_job(job: dict) -> dict:
+    return {
+        "job_id": str(job["_id"]),
+        "kind": job.get("kind"),
+        "status": job.get("status"),
+        "attempts": job.get("attempts", 0),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat() if job.get("created_at") else None,
+        "updated_at": job["updated_at"].isoformat() if job.get("updated_at") else None,
+    }
+
+
+class JobQueue:
+    """
+    MongoDB jobs 컬렉션에 상태를 저장하는 작업 큐입니다.
+    enqueue는 문서만 넣고, 워커는 find_one_and_update로 작업을 하나씩 원자적으로 가져가므로
+    여러 프로세스가 같은 컬렉션을 나눠 처리할 수 있습니다. 실패한 작업은 지수 백오프로 다시 시도합니다.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        lease_seconds: int = JOB_LEASE_SECONDS,
+        retry_base_seconds: float = JOB_RETRY_BASE_SECONDS,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.collection: Optional[AsyncCollection] = None
+        self._handlers: dict[str, JobHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def attach_collection(self, collection: AsyncCollection) -> None:
+        self.collection = collection
+
+    async def enqueue(self, kind: str, user_id: str, payload: dict) -> dict:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = datetime.now()
+        job = {
+            "kind": kind,
+            "userID": user_id,
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "run_at": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+        result = await self.collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._wakeup.set()
+        logger.info(f"Job queued: {kind} {result.inserted_id}")
+        return job
+
+    async def get(self, job_id: ObjectId, user_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id, "userID": user_id}, {"payload": 0})
+
+    async def claim(self) -> Optional[dict]:
+        """실행할 작업 하나를 running으로 바꿔 가져옵니다. 임대 시간이 지난 running 작업도 다시 가져옵니다."""
+        now = datetime.now()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": JOB_QUEUED, "run_at": {"$lte": now}},
+                {"status": JOB_RUNNING, "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, job: dict, status: str, **fields) -> None:
+        now = datetime.now()
+        await self.collection.update_one(
+            {"_id": job["_id"], "status": JOB_RUNNING, "attempts": job["attempts"]},
+            {
+                "$set": {
+                    "status": status,
+                    "updated_at": now,
+                    "finished_at": now,
+                    "expires_at": now + timedelta(seconds=JOB_RESULT_TTL_SECONDS),
+                    **fields,
+                },
+                "$unset": {"lease_until": "", "payload": ""},
+            },
+        )
+
+    async def _retry_later(self, job: dict, error: str) -> None:
+        delay = retry_delay(job["attempts"], self.retry_base_seconds)
+        now = datetime.now()
+        await self.collection.update_one(
+            {"_id": job["_id"], "status": JOB_RUNNING, "attempts": job["attempts"]},
+            {
+                "$set": {
+                    "status": JOB_QUEUED,
+                    "run_at": now + timedelta(seconds=delay),
+                    "error": error,
+                    "updated_at": now,
+                },
+                "$unset": {"lease_until": ""},
+            },
+        )
+        logger.warning(f"Job {job['_id']} failed (attempt {job['attempts']}), retrying in {delay:.1f}s: {error}")
+
+    async def run(self, job: dict) -> None:
+        """작업 하나를 실행하고 결과에 따라 succeeded, failed 또는 재시도 대기 상태로 바꿉니다."""
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            await self._finish(job, JOB_FAILED, error=f"Unknown job kind: {job['kind']}")
+            return
+        if job["attempts"] > job.get("max_attempts", self.max_attempts):
+            await self._finish(job, JOB_FAILED, error=job.get("error") or "Job lease expired too many times.")
+            return
+
+        try:
+            result = await handler(job["payload"])
+        except PermanentJobError as e:
+            logger.warning(f"Job {job['_id']} failed permanently: {e}")
+            await self._finish(job, JOB_FAILED, error=str(e))
+        except Exception as e:
+            if job["attempts"] >= job.get("max_attempts", self.max_attempts):
+                logger.error(f"Job {job['_id']} failed after {job['attempts']} attempts: {e}", exc_info=True)
+                await self._finish(job, JOB_FAILED, error=str(e))
+            else:
+                await self._retry_later(job, str(e))
+        else:
+            await self._finish(job, JOB_SUCCEEDED, result=result, error=None)
+            logger.info(f"Job succeeded: {job['kind']} {job['_id']}")
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job = await self.claim()
+            except PyMongoError as e:
+                logger.error(f"Failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self.run(job)
+            except PyMongoError as e:
+                # 상태를 저장하지 못한 작업은 임대 시간이 지나면 다른 워커가 다시 가져갑니다.
+                logger.error(f"Failed to update job {job['_id']}: {e}")
+
+    def start(self, collection: AsyncCollection) -> None:
+        self.attach_collection(collection)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Job workers started: {self.workers}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_queue = JobQueue()
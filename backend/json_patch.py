@@ -0,0 +1,84 @@
+import copy
+from typing import Any
+
+
+def _escape(token: str) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def pointer(*tokens) -> str:
+    """토큰들로 JSON Pointer(RFC 6901)를 만듭니다."""
+    return "".join(f"/{_escape(token)}" for token in tokens)
+
+
+def make_patch(source: Any, target: Any, path: str = "") -> list[dict]:
+    """
+    source를 target으로 바꾸는 JSON Patch(RFC 6902) 연산 목록을 만듭니다.
+    add, remove, replace만 사용합니다. 리스트는 같은 위치끼리 비교하고 길이 차이는 끝에서 더하거나 지웁니다.
+    """
+    if type(source) is not type(target):
+        return [{"op": "replace", "path": path, "value": copy.deepcopy(target)}]
+
+    if isinstance(source, dict):
+        ops = []
+        for key in source:
+            if key not in target:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in target.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in source:
+                ops.append({"op": "add", "path": child, "value": copy.deepcopy(value)})
+            else:
+                ops.extend(make_patch(source[key], value, child))
+        return ops
+
+    if isinstance(source, list):
+        ops = []
+        common = min(len(source), len(target))
+        for index in range(common):
+            ops.extend(make_patch(source[index], target[index], f"{path}/{index}"))
+        for index in range(common, len(target)):
+            ops.append({"op": "add", "path": f"{path}/{index}", "value": copy.deepcopy(target[index])})
+        for index in range(len(source) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{index}"})
+        return ops
+
+    if source != target:
+        return [{"op": "replace", "path": path, "value": copy.deepcopy(target)}]
+    return []
+
+
+def apply_patch(document: Any, ops: list[dict]) -> Any:
+    """JSON Patch 연산을 적용한 새 문서를 반환합니다. 원본은 바꾸지 않습니다."""
+    document = copy.deepcopy(document)
+    for op in ops:
+        if op["path"] == "":
+            if op["op"] == "remove":
+                document = None
+            else:
+                document = copy.deepcopy(op["value"])
+            continue
+
+        *parents, last = [_unescape(token) for token in op["path"].split("/")[1:]]
+        container = document
+        for token in parents:
+            container = container[int(token)] if isinstance(container, list) else container[token]
+
+        if isinstance(container, list):
+            if op["op"] == "add":
+                position = len(container) if last == "-" else int(last)
+                container.insert(position, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del container[int(last)]
+            else:
+                container[int(last)] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                del container[last]
+            else:
+                container[last] = copy.deepcopy(op["value"])
+    return document
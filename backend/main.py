@@ -1,14 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from AI.SDM import SDM
+import asyncio
 import logging
-import requests
+import httpx
 import os
 import uvicorn
 import json
-from datetime import datetime
+from datetime import date, datetime
+from email.utils import parsedate_to_datetime
+from typing import Optional
 
 # Configure logging
 logging.basicConfig(
@@ -20,9 +23,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 from pymongo.asynchronous.database import AsyncDatabase
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
 
 from database import lifespan, get_db
-from auth import AuthService, get_current_user, get_auth_service
+from catalog import WorkbookCatalog, get_catalog
+from schedules import (
+    SCHEDULE_META_PROJECTION,
+    ScheduleStore,
+    get_schedule_store,
+    schedule_etag,
+    serialize_revision,
+    serialize_schedule,
+)
+from images import (
+    IMAGE_CACHE_MAX_AGE_SECONDS,
+    IMAGE_VARIANTS,
+    image_cache,
+    image_directory,
+    image_uploader,
+)
+from jobs import PermanentJobError, job_queue, serialize_job
+from idempotency import IdempotencyStore, Unsaved, get_idempotency_store
+from auth import AuthService, get_current_user, get_auth_service, user_cache
 from exceptions import (
     BaseHTTPException,
     UserAlreadyExistsException,
@@ -31,6 +56,11 @@ from exceptions import (
     SubjectNotFoundException,
     MissingRequiredFieldException,
     FileNotFoundException,
+    InvalidDataException,
+    ScheduleNotFoundException,
+    ScheduleRevisionNotFoundException,
+    ScheduleVersionConflictException,
+    JobNotFoundException,
 )
 from logger import create_logger
 from models import (
@@ -41,10 +71,14 @@ from models import (
     FocusFeedbackDTO,
     NeurofeedbackSendDTO,
     FindDogImageLoadDTO,
-    ScheduleDTO
+    ScheduleDTO,
+    ScheduleItemPatchDTO,
 )
 from AI.SDM import SDM
-from AI.FFBM import FFBM
+from AI.FFBM import FFBM, FeedbackUnavailableError
+from AI.cache import get_llm_cache
+from AI.llm import get_llm_client
+from AI.singleflight import llm_single_flight
 
 load_dotenv()
 
@@ -59,6 +93,10 @@ app.add_middleware(
 )
 logger = create_logger("app")
 
+# /neurofeedback_load 페이지 크기 (기본값, 최대값)
+NEUROFEEDBACK_PAGE_SIZE = int(os.getenv("NEUROFEEDBACK_PAGE_SIZE", "50"))
+NEUROFEEDBACK_MAX_PAGE_SIZE = int(os.getenv("NEUROFEEDBACK_MAX_PAGE_SIZE", "500"))
+
 # SDM, FFBM 인스턴스 생성
 sdm = SDM()
 ffbm = FFBM()
@@ -92,6 +130,23 @@ async def general_exception_handler(_request: Request, exc: Exception):
     )
 
 
+def _is_not_modified(request: Request, etag: str, modified_at: Optional[float] = None) -> bool:
+    """If-None-Match(우선) 또는 If-Modified-Since가 현재 리소스와 일치하는지 확인합니다."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified_at is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at) <= since
+    return False
+
+
 @app.get("/")
 def main() -> dict:
     return {"message": "hello world!"}
@@ -111,7 +166,7 @@ async def register(
         )
         raise MissingRequiredFieldException(["userID", "password"])
 
-    hashed_password = auth_service.hash_password(data.password)
+    hashed_password = await auth_service.hash_password(data.password)
 
     data = {
         "userID": data.userID,
@@ -137,6 +192,7 @@ async def register(
         raise UserAlreadyExistsException(data.userID)
 
     await users_collection.insert_one(data)
+    user_cache.invalidate(data.get("userID"))
     return {"message": f"User {data.get('userID')} signed up successfully!"}
 
 
@@ -158,7 +214,7 @@ async def login(
         logger.warning(f"Login failed: User not found - userID: {data.userID}")
         raise UserNotFoundException(data.userID)
 
-    if not auth_service.verify_password(data.password, user.get("password")):
+    if not await auth_service.verify_password(data.password, user.get("password")):
         logger.warning(f"Login failed: Invalid password for userID: {data.userID}")
         raise InvalidPasswordException()
 
@@ -184,26 +240,7 @@ async def get_user_info(
     return {"userInfo": user_data}
 
 
-@app.post("/schedule-create")
-async def create_schedule(
-        data: ScheduleDTO,
-        current_user: dict = Depends(get_current_user),
-        db: AsyncDatabase = Depends(get_db)
-):
-    user_id = current_user.get("userID")
-    schedule_collection = db["schedule"]
-
-    # --- 데이터베이스 저장 로직 (기존과 동일) ---
-    # Convert Pydantic model to dict
-    schedule_data_to_db = {
-        "userID": user_id,
-        "when": data.when,
-        "subjects": data.subjects,
-        "goal": data.goal,
-    }
-    await schedule_collection.insert_one(schedule_data_to_db)
-    # ---------------------------------------------
-
+def _build_schedule_payload(data: ScheduleDTO, current_user: dict) -> dict:
     # [수정 1] AI 모듈에 전달할 payload를 올바른 형식으로 재구성합니다.
     # 로그인된 사용자 정보에서 'grade'를 가져옵니다.
     grade = current_user.get("grade")
@@ -212,106 +249,131 @@ async def create_schedule(
         raise HTTPException(status_code=400, detail="User grade information is missing.")
 
     # [수정 2] sdm.get_ai_schedule가 요구하는 형식에 맞게 payload를 생성합니다.
-    payload_for_ai = {
-        "user_id": user_id,
+    return {
+        "user_id": current_user.get("userID"),
         "grade": grade,
         "subjects": data.subjects,  # API로 받은 subjects를 workbooks 키에 할당
         "goal": data.goal,
         "when": data.when
     }
 
-    print(f"Sending to get_ai_schedule: {payload_for_ai}")  # Debug log
 
-    # 수정된 payload로 AI 함수를 호출합니다.
-    ai_schedule = sdm.get_ai_schedule(payload_for_ai)
+def _schedule_workbooks(subjects: list, grade: str) -> list:
+    """스케줄에 사용된 문제집 목록을 카탈로그 키 형식으로 정리해 스케줄과 함께 저장합니다."""
+    return [
+        {
+            "grade": subject.get("grade") or grade,
+            "publish": subject.get("publish"),
+            "workbook": subject.get("workbook"),
+        }
+        for subject in subjects
+    ]
 
-    return {"message": "Schedule created successfully!", "ai_schedule": ai_schedule}
 
+async def _load_stored_schedule(data: dict, user_id: str, schedule_store: ScheduleStore) -> Optional[dict]:
+    """
+    existing_schedule 없이 schedule_id/version만 보낸 /schedule-modify 요청이면 저장된 현재 스케줄을 읽어 반환합니다.
+    existing_schedule을 보낸 요청(이전 방식)이면 None을 반환합니다.
+    """
+    if data.get("existing_schedule"):
+        return None
+
+    stored = await schedule_store.get_current(user_id)
+    if stored is None:
+        raise ScheduleNotFoundException(user_id)
+
+    schedule_id = data.get("schedule_id")
+    if schedule_id and schedule_id != str(stored["_id"]):
+        raise InvalidDataException(
+            "schedule_id가 현재 스케줄과 다릅니다.",
+            {"schedule_id": schedule_id, "current_schedule_id": str(stored["_id"])},
+        )
 
-@app.post("/schedule-modify")
-async def modify_schedule(
+    version = data.get("version")
+    if version is not None and version != stored.get("version"):
+        raise ScheduleVersionConflictException(version, stored.get("version"))
+    return stored
+
+
+def _prepare_schedule_modification(
         data: dict,
-        current_user: dict = Depends(get_current_user),
-        db: AsyncDatabase = Depends(get_db),
-):
+        current_user: dict,
+        catalog: WorkbookCatalog,
+        stored: Optional[dict] = None,
+) -> dict:
     """
-    기존 스케줄과 사용자 피드백을 받아 새로운 스케줄을 생성합니다.
-    
-    요청 데이터 형식:
-    {
-        "existing_schedule": {...},  # 기존 스케줄 데이터
-        "feedback": "사용자 피드백 텍스트"  # 수정 요청사항
-    }
+    /schedule-modify 요청을 검증하고 SDM.modify_ai_schedule에 넘길 인자를 만듭니다.
+    stored(저장된 스케줄)가 주어지면 그 스케줄과 함께 저장된 문제집 목록을 사용합니다.
     """
+    user_id = current_user.get("userID")
+    grade = current_user.get("grade")
+
+    # 1. 필수 데이터 검증
+    existing_schedule = stored["schedule"] if stored else data.get("existing_schedule")
+    feedback = data.get("feedback", "")
+
+    if not existing_schedule:
+        raise HTTPException(
+            status_code=400,
+            detail="기존 스케줄 데이터(existing_schedule) 또는 schedule_id가 필요합니다."
+        )
+
+    if not feedback.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="수정 요청사항(feedback)이 필요합니다."
+        )
+
+    # 2. 학생 데이터 구성
+    student_data = {
+        "user_id": user_id,
+        "grade": grade,
+        "name": current_user.get("name", ""),
+        "school": current_user.get("school", "")
+    }
+
+    # 3. 메모리에 올려둔 문제집 카탈로그 사용
     try:
-        user_id = current_user.get("userID")
-        grade = current_user.get("grade")
-        
-        # 1. 필수 데이터 검증
-        existing_schedule = data.get("existing_schedule")
-        feedback = data.get("feedback", "")
-        
-        if not existing_schedule:
-            raise HTTPException(
-                status_code=400,
-                detail="기존 스케줄 데이터(existing_schedule)가 필요합니다."
-            )
-        
-        if not feedback.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="수정 요청사항(feedback)이 필요합니다."
-            )
-        
-        # 2. 학생 데이터 구성
-        student_data = {
-            "user_id": user_id,
-            "grade": grade,
-            "name": current_user.get("name", ""),
-            "school": current_user.get("school", "")
-        }
-        
-        # 3. dict.json에서 문제집 데이터 로드
-        try:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            dict_path = os.path.join(current_dir, 'dict.json')
-            dict_path = os.path.normpath(dict_path)
-            logger.info(f"dict.json 경로: {dict_path}")  # 디버깅용 로그 추가
-            
-            with open(dict_path, 'r', encoding='utf-8') as f:
-                all_workbooks_data = json.load(f)
-                
-            logger.info(f"문제집 데이터 로드 완료: {len(all_workbooks_data)}개 항목")
-                
-        except FileNotFoundError:
-            logger.error(f"dict.json 파일을 찾을 수 없습니다: {dict_path}")
-            raise HTTPException(
-                status_code=500,
-                detail="문제집 데이터를 로드할 수 없습니다."
-            )
-        except json.JSONDecodeError as e:
-            logger.error(f"dict.json 파싱 오류: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail="문제집 데이터 형식이 올바르지 않습니다."
-            )
-        
-        # 4. 기존 스케줄에서 사용된 문제집 정보 추출
-        relevant_workbooks = []
+        grade_workbooks = catalog.by_grade(grade)
+    except FileNotFoundError:
+        logger.error(f"dict.json 파일을 찾을 수 없습니다: {catalog.path}")
+        raise HTTPException(
+            status_code=500,
+            detail="문제집 데이터를 로드할 수 없습니다."
+        )
+    except json.JSONDecodeError as e:
+        logger.error(f"dict.json 파싱 오류: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="문제집 데이터 형식이 올바르지 않습니다."
+        )
+
+    # 4. 저장된 스케줄이면 함께 저장된 문제집 목록으로 카탈로그 항목을 찾습니다.
+    relevant_workbooks = []
+    if stored and stored.get("workbooks"):
+        relevant_workbooks = catalog.find_many(
+            (wb.get("grade") or grade, wb.get("publish"), wb.get("workbook")) for wb in stored["workbooks"]
+        )
+        logger.info(f"저장된 문제집 목록에서 {len(relevant_workbooks)}개를 찾았습니다.")
+        if not relevant_workbooks:
+            logger.warning(f"관련 문제집을 찾을 수 없어 해당 학년({grade})의 모든 문제집을 사용합니다.")
+            relevant_workbooks = grade_workbooks
+
+    else:
+        # existing_schedule을 직접 보낸 요청은 스케줄에서 사용된 문제집 정보를 추출합니다.
         try:
             # 기존 스케줄 구조 로깅 (디버깅용)
             logger.info(f"기존 스케줄 구조: {json.dumps(existing_schedule, ensure_ascii=False, indent=2)[:500]}...")
-            
+
             # 사용 가능한 문제집 목록 로깅 (디버깅용)
             logger.info(f"사용 가능한 학년: {grade}의 문제집 목록:")
-            available_workbooks = [f"{wb.get('publish')} - {wb.get('workbook')}" 
-                                for wb in all_workbooks_data 
-                                if wb.get('grade') == grade]
+            available_workbooks = [f"{wb.get('publish')} - {wb.get('workbook')}"
+                                for wb in grade_workbooks]
             logger.info("\n".join(available_workbooks))
-            
+
             # 기존 스케줄에서 사용된 문제집들을 찾아서 관련 데이터 추출
             found_workbooks = set()  # 중복 제거를 위해 set 사용
-            
+
             # existing_schedule을 순회하며 문제집 정보 수집
             def collect_workbooks(data):
                 if isinstance(data, dict):
@@ -327,91 +389,426 @@ async def modify_schedule(
                 elif isinstance(data, list):
                     for item in data:
                         collect_workbooks(item)
-            
+
             # 문제집 정보 수집 실행
             collect_workbooks(existing_schedule)
-            
+
             # 찾은 문제집 정보 로깅
             logger.info(f"스케줄에서 찾은 문제집 정보: {found_workbooks}")
-            
-            # dict.json에서 해당하는 문제집 데이터 찾기
+
+            # 카탈로그 인덱스에서 해당하는 문제집 데이터 찾기
             for publish, workbook in found_workbooks:
-                logger.info(f"\n찾고 있는 문제집 - 출판사: '{publish}', 문제집: '{workbook}', 학년: '{grade}'")
-                
-                # 정확히 일치하는 문제집 찾기
-                found = False
-                for db_entry in all_workbooks_data:
-                    db_publish = db_entry.get('publish', '')
-                    db_workbook = db_entry.get('workbook', '')
-                    db_grade = db_entry.get('grade', '')
-                    
-                    if (db_grade == grade and 
-                        db_publish == publish and 
-                        db_workbook == workbook):
-                        
-                        logger.info(f"일치하는 문제집 찾음: {db_publish} - {db_workbook}")
-                        if db_entry not in relevant_workbooks:
-                            relevant_workbooks.append(db_entry)
-                        found = True
-                
-                if not found:
+                db_entry = catalog.get(grade, publish, workbook)
+                if db_entry is None:
                     logger.warning(f"일치하는 문제집을 찾지 못했습니다: {publish} - {workbook}")
-            
+                    continue
+                logger.info(f"일치하는 문제집 찾음: {publish} - {workbook}")
+                if db_entry not in relevant_workbooks:
+                    relevant_workbooks.append(db_entry)
+
             # 여전히 문제집을 찾지 못한 경우, 해당 학년의 모든 문제집을 사용
             if not relevant_workbooks:
                 logger.warning(f"관련 문제집을 찾을 수 없어 해당 학년({grade})의 모든 문제집을 사용합니다.")
-                relevant_workbooks = [wb for wb in all_workbooks_data if wb.get('grade') == grade]
+                relevant_workbooks = grade_workbooks
         except Exception as e:
             logger.warning(f"기존 스케줄에서 문제집 정보 추출 중 오류: {e}")
             # 오류가 있어도 계속 진행하되, 모든 문제집 데이터를 사용
-            relevant_workbooks = [wb for wb in all_workbooks_data if wb.get('grade') == grade]
-        
-        if not relevant_workbooks:
-            logger.warning(f"관련 문제집을 찾을 수 없음. 해당 학년의 모든 문제집 사용: {grade}")
-            # 해당 학년의 모든 문제집 데이터를 사용
-            relevant_workbooks = [wb for wb in all_workbooks_data if wb.get('grade') == grade]
-            
-        if not relevant_workbooks:
-            raise HTTPException(
-                status_code=400,
-                detail=f"해당 학년({grade})에 대한 문제집 데이터를 찾을 수 없습니다."
+            relevant_workbooks = grade_workbooks
+
+    if not relevant_workbooks:
+        raise HTTPException(
+            status_code=400,
+            detail=f"해당 학년({grade})에 대한 문제집 데이터를 찾을 수 없습니다."
+        )
+
+    logger.info(f"관련 문제집 {len(relevant_workbooks)}개 발견")
+
+    return {
+        "student_data": student_data,
+        "relevant_workbooks": relevant_workbooks,
+        "existing_schedule": existing_schedule,
+        "feedback": feedback,
+    }
+
+
+async def _save_modified_schedule(
+        schedule_store: ScheduleStore,
+        user_id: str,
+        modified_schedule: dict,
+        modification: dict,
+        stored: Optional[dict] = None,
+) -> dict:
+    """
+    수정된 스케줄을 현재 스케줄의 새 리비전으로 저장합니다(이력에는 직전 리비전과의 차이만 기록).
+    저장된 스케줄이 없는 사용자는 수정 결과를 새 스케줄로 저장합니다.
+    stored(수정에 사용한 저장된 스케줄)가 주어지면, 수정하는 동안 현재 스케줄이 바뀌었을 때 409를 발생시킵니다.
+    """
+    current = await schedule_store.replace_current(
+        user_id, modified_schedule, feedback=modification["feedback"], expected=stored
+    )
+    if current is None:
+        workbooks = _schedule_workbooks(
+            modification["relevant_workbooks"], modification["student_data"]["grade"]
+        )
+        current = await schedule_store.insert_schedule(
+            user_id, modified_schedule, workbooks, "modify", feedback=modification["feedback"]
+        )
+    return current
+
+
+async def _sse(events, on_done=None):
+    """
+    SDM 스트리밍 이벤트를 Server-Sent Events 형식으로 바꿉니다.
+    on_done이 주어지면 완성된 스케줄로 호출한 뒤 done 이벤트를 보냅니다. on_done이 HTTPException(버전 충돌 등)을
+    발생시키면 done 대신 error 이벤트를 보냅니다.
+    """
+    async for event in events:
+        if event["event"] == "done" and on_done is not None:
+            try:
+                await on_done(event["data"])
+            except HTTPException as e:
+                # 저장하지 못한 스케줄(버전 충돌 등)은 done 대신 error로 알립니다.
+                event = {"event": "error", "data": {"error": e.detail, "status_code": e.status_code}}
+        payload = json.dumps(event["data"], ensure_ascii=False, default=str)
+        yield f"event: {event['event']}\ndata: {payload}\n\n"
+
+
+async def _enqueue_job(kind: str, current_user: dict, payload: dict) -> JSONResponse:
+    """작업을 큐에 넣고 202와 작업 상태 URL을 반환합니다."""
+    job = await job_queue.enqueue(kind, current_user.get("userID"), payload)
+    status_url = f"/jobs/{job['_id']}"
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"message": "Job accepted.", "job_id": str(job["_id"]), "status": job["status"], "status_url": status_url},
+        headers={"Location": status_url},
+    )
+
+
+def _job_handler(handler):
+    """엔드포인트 로직을 작업 핸들러로 감쌉니다. 4xx 오류는 다시 시도해도 같으므로 재시도하지 않습니다."""
+    async def run(payload: dict) -> dict:
+        try:
+            return await handler(payload)
+        except HTTPException as e:
+            if e.status_code < 500:
+                raise PermanentJobError(json.dumps(e.detail, ensure_ascii=False, default=str))
+            raise
+    return run
+
+
+@app.post("/schedule-create")
+async def create_schedule(
+        data: ScheduleDTO,
+        run_async: bool = Query(False, alias="async", description="true면 작업으로 처리하고 202와 작업 ID를 반환"),
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+        idempotency: IdempotencyStore = Depends(get_idempotency_store),
+):
+    async def handle():
+        if run_async:
+            # 요청 문서는 여기서 한 번만 만들고, 작업은 재시도해도 같은 문서에 저장합니다.
+            schedule_id = await schedule_store.create_request(
+                current_user.get("userID"), data.when, data.subjects, data.goal
             )
-        
-        logger.info(f"관련 문제집 {len(relevant_workbooks)}개 발견")
+            return await _enqueue_job(
+                "schedule-create",
+                current_user,
+                {"user": current_user, "data": data.model_dump(), "schedule_id": str(schedule_id)},
+            )
+        return await _create_schedule(data, current_user, schedule_store)
+
+    # Idempotency-Key를 보내면 같은 키의 재시도에는 새로 만들지 않고 처음 응답을 돌려줍니다.
+    return await idempotency.run(
+        idempotency_key, current_user.get("userID"), "schedule-create",
+        {"data": data.model_dump(), "async": run_async}, handle,
+    )
+
+
+async def _create_schedule(
+        data: ScheduleDTO,
+        current_user: dict,
+        schedule_store: ScheduleStore,
+        schedule_id: Optional[ObjectId] = None,
+) -> dict:
+    """
+    스케줄을 생성해 요청 문서에 저장합니다. schedule_id를 주면 새 요청 문서를 만들지 않고 그 문서를 사용하며,
+    이미 생성된 스케줄이 저장되어 있으면(작업 재시도) 다시 생성하지 않고 저장된 스케줄을 반환합니다.
+    """
+    user_id = current_user.get("userID")
+
+    if schedule_id is None:
+        # --- 데이터베이스 저장 로직 (기존과 동일) ---
+        schedule_id = await schedule_store.create_request(user_id, data.when, data.subjects, data.goal)
+        # ---------------------------------------------
+    else:
+        generated = await schedule_store.get_generated(schedule_id)
+        if generated is not None:
+            return {
+                "message": "Schedule created successfully!",
+                "ai_schedule": generated["schedule"],
+                "schedule_id": str(schedule_id),
+                "version": generated.get("version"),
+            }
+
+    payload_for_ai = _build_schedule_payload(data, current_user)
+
+    print(f"Sending to get_ai_schedule: {payload_for_ai}")  # Debug log
+
+    # 수정된 payload로 AI 함수를 호출합니다. engine은 실제로 사용한 생성 방식입니다(LLM 실패 시 local-fallback).
+    ai_schedule, engine = await sdm.generate_schedule(payload_for_ai, engine=data.engine)
+
+    if "error" in ai_schedule:
+        return {"message": "Schedule created successfully!", "ai_schedule": ai_schedule}
+
+    # 생성된 스케줄을 요청 문서에 버전 1로 저장합니다.
+    saved = await schedule_store.save_generated(
+        schedule_id, ai_schedule, _schedule_workbooks(data.subjects, payload_for_ai["grade"])
+    )
+    return {
+        "message": "Schedule created successfully!",
+        "ai_schedule": ai_schedule,
+        "engine": engine,
+        "schedule_id": str(schedule_id),
+        "version": saved["version"],
+    }
+
+
+@app.post("/schedule-create/stream")
+async def create_schedule_stream(
+        data: ScheduleDTO,
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """
+    /schedule-create의 스트리밍 버전입니다. 주차 계획이 완성될 때마다 SSE로 보냅니다.
+
+    이벤트:
+        week  - {"date": ..., "week": "1", "plan": [...]}
+        reset - {"engine": "local-fallback", "error": "..."}, LLM 생성이 실패해 로컬 엔진 스케줄로 대체합니다.
+                이전에 받은 week는 버리고 이어지는 week/done을 사용하세요.
+        done  - 전체 스케줄
+        error - {"error": "..."}
+    """
+    schedule_id = await schedule_store.create_request(
+        current_user.get("userID"), data.when, data.subjects, data.goal
+    )
+    payload_for_ai = _build_schedule_payload(data, current_user)
+
+    async def save(ai_schedule: dict):
+        await schedule_store.save_generated(
+            schedule_id, ai_schedule, _schedule_workbooks(data.subjects, payload_for_ai["grade"])
+        )
+
+    return StreamingResponse(
+        _sse(sdm.stream_ai_schedule(payload_for_ai, engine=data.engine), on_done=save),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Schedule-Id": str(schedule_id)},
+    )
+
+
+@app.get("/schedule")
+async def get_schedule(
+        request: Request,
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """
+    현재 스케줄을 반환합니다. 응답의 ETag를 If-None-Match로 보내면
+    내용이 바뀌지 않았을 때 본문 없이 304를 반환합니다.
+    """
+    user_id = current_user.get("userID")
+
+    if request.headers.get("if-none-match"):
+        # 해시만 먼저 확인해 바뀌지 않았으면 스케줄 본문을 읽지 않습니다.
+        meta = await schedule_store.get_current(user_id, SCHEDULE_META_PROJECTION)
+        if meta is None:
+            raise ScheduleNotFoundException(user_id)
+        if _is_not_modified(request, schedule_etag(meta)):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": schedule_etag(meta)})
+
+    doc = await schedule_store.get_current(user_id)
+    if doc is None:
+        raise ScheduleNotFoundException(user_id)
+
+    return JSONResponse(
+        content=serialize_schedule(doc),
+        headers={"ETag": schedule_etag(doc), "Cache-Control": "private, no-cache"},
+    )
+
+
+@app.get("/schedule/today")
+async def get_today_schedule(
+        day: Optional[str] = Query(None, alias="date", description="YYYY-MM-DD, 기본값은 서버의 오늘 날짜"),
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """현재 스케줄에서 오늘(또는 date)의 계획 항목만 반환합니다."""
+    user_id = current_user.get("userID")
+
+    try:
+        target_day = date.fromisoformat(day) if day else date.today()
+    except ValueError:
+        raise InvalidDataException("date는 YYYY-MM-DD 형식이어야 합니다.", {"date": day})
+
+    plan = await schedule_store.get_day_plan(user_id, target_day)
+    if plan is None:
+        raise ScheduleNotFoundException(user_id)
+
+    return {
+        "schedule_id": str(plan["_id"]),
+        "version": plan.get("version"),
+        "start_date": plan.get("start_date"),
+        "date": target_day.isoformat(),
+        "week": plan.get("week"),
+        "day": plan.get("day"),
+        "items": plan.get("items", []),
+    }
+
+
+@app.patch("/schedule/items")
+async def patch_schedule_item(
+        data: ScheduleItemPatchDTO,
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """
+    현재 스케줄의 항목 하나(week/day/index)의 isFinished, importance만 바꿉니다.
+    version이 현재 버전과 다르면 409를 반환하므로, 클라이언트는 스케줄을 다시 받아 재시도해야 합니다.
+    """
+    user_id = current_user.get("userID")
+
+    fields = data.model_dump(include={"isFinished", "importance"}, exclude_none=True)
+    if not fields:
+        raise MissingRequiredFieldException(["isFinished", "importance"])
+
+    updated = await schedule_store.update_item(
+        user_id, data.version, data.week, data.plan_index, data.day, data.index, fields
+    )
+    return JSONResponse(
+        content={
+            "message": "Schedule item updated successfully!",
+            "schedule_id": str(updated["_id"]),
+            "version": updated["version"],
+            "updated": fields,
+        },
+        headers={"ETag": schedule_etag(updated)},
+    )
+
+
+@app.get("/schedule/revisions")
+async def list_schedule_revisions(
+        limit: int = Query(50, ge=1, le=200),
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """현재 스케줄의 리비전 목록(최신순)을 반환합니다. 스케줄 본문은 포함하지 않습니다."""
+    user_id = current_user.get("userID")
+
+    current = await schedule_store.get_current(user_id, SCHEDULE_META_PROJECTION)
+    if current is None:
+        raise ScheduleNotFoundException(user_id)
+
+    revisions = await schedule_store.history.list_revisions(current["_id"], limit)
+    return {
+        "schedule_id": str(current["_id"]),
+        "version": current.get("version"),
+        "revisions": [serialize_revision(entry) for entry in revisions],
+    }
+
+
+@app.get("/schedule/revisions/{revision}")
+async def get_schedule_revision(
+        revision: int,
+        current_user: dict = Depends(get_current_user),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """현재 스케줄의 revision 시점 내용을 반환합니다. 지난 리비전은 바뀌지 않으므로 클라이언트가 캐시해도 됩니다."""
+    user_id = current_user.get("userID")
+
+    current = await schedule_store.get_current(user_id, SCHEDULE_META_PROJECTION)
+    if current is None:
+        raise ScheduleNotFoundException(user_id)
+
+    restored = None
+    if 1 <= revision <= current.get("version", 0):
+        restored = await schedule_store.history.get_revision(current["_id"], revision)
+    if restored is None:
+        raise ScheduleRevisionNotFoundException(str(current["_id"]), revision)
+
+    return JSONResponse(
+        content=restored,
+        headers={
+            "ETag": schedule_etag({"_id": current["_id"], "version": revision}),
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
+
+
+@app.post("/schedule-modify")
+async def modify_schedule(
+        data: dict,
+        run_async: bool = Query(False, alias="async", description="true면 작업으로 처리하고 202와 작업 ID를 반환"),
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+        current_user: dict = Depends(get_current_user),
+        catalog: WorkbookCatalog = Depends(get_catalog),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+        idempotency: IdempotencyStore = Depends(get_idempotency_store),
+):
+    """
+    기존 스케줄과 사용자 피드백을 받아 새로운 스케줄을 생성합니다.
+    
+    요청 데이터 형식:
+    {
+        "schedule_id": "...",  # (선택) 저장된 현재 스케줄 ID
+        "version": 3,  # (선택) 클라이언트가 가진 스케줄 버전, 다르면 409
+        "feedback": "사용자 피드백 텍스트"  # 수정 요청사항
+    }
+    existing_schedule(기존 스케줄 데이터)을 보내면 저장된 스케줄 대신 그 스케줄을 수정합니다(이전 방식).
+    Idempotency-Key 헤더를 보내면 같은 키의 재시도에는 다시 수정하지 않고 처음 응답을 돌려줍니다.
+    """
+    async def handle():
+        if run_async:
+            # 처음부터 잘못된 요청(feedback 누락, 다른 schedule_id/version 등)은 작업을 넣기 전에 4xx로 거절합니다.
+            stored = await _load_stored_schedule(data, current_user.get("userID"), schedule_store)
+            _prepare_schedule_modification(data, current_user, catalog, stored)
+            return await _enqueue_job("schedule-modify", current_user, {"user": current_user, "data": data})
+        return await _modify_schedule(data, current_user, catalog, schedule_store)
+
+    return await idempotency.run(
+        idempotency_key, current_user.get("userID"), "schedule-modify", {"data": data, "async": run_async}, handle
+    )
+
+
+async def _modify_schedule(
+        data: dict,
+        current_user: dict,
+        catalog: WorkbookCatalog,
+        schedule_store: ScheduleStore,
+) -> dict:
+    try:
+        user_id = current_user.get("userID")
+
+        # 1~4. 요청 검증, 학생 데이터 구성, 관련 문제집 조회
+        stored = await _load_stored_schedule(data, user_id, schedule_store)
+        modification = _prepare_schedule_modification(data, current_user, catalog, stored)
+        feedback = modification["feedback"]
         
         # 5. SDM을 사용하여 스케줄 수정
         logger.info(f"사용자 {user_id}의 스케줄 수정 시작")
-        modified_schedule = sdm.modify_ai_schedule(
-            student_data=student_data,
-            relevant_workbooks=relevant_workbooks,
-            existing_schedule=existing_schedule,
-            feedback=feedback
-        )
+        modified_schedule = await sdm.modify_ai_schedule(**modification)
         
         # 6. 에러 체크
         if "error" in modified_schedule:
             logger.error(f"SDM 스케줄 수정 실패: {modified_schedule['error']}")
+            # AI 호출 실패(시간 초과, API 오류 등)는 503으로 알려 작업이면 다시 시도하게 하고, 입력 오류만 400입니다.
             raise HTTPException(
-                status_code=400,
+                status_code=503 if modified_schedule.get("retryable") else 400,
                 detail=modified_schedule["error"]
             )
         
-        # 7. 수정된 스케줄을 데이터베이스에 저장
-        schedule_collection = db["schedule"]
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # 기존 스케줄을 업데이트하거나 새로 삽입
-        await schedule_collection.update_one(
-            {"userID": user_id, "created_date": current_date},
-            {"$set": {
-                "modified_at": datetime.now(),
-                "modified_schedule_data": modified_schedule,
-                "original_schedule_data": existing_schedule,
-                "feedback_applied": feedback,
-                "modification_count": 1  # 추후 수정 횟수 추적을 위해
-            }},
-            upsert=True
-        )
+        # 7. 수정된 스케줄을 현재 스케줄의 새 리비전으로 저장
+        current = await _save_modified_schedule(schedule_store, user_id, modified_schedule, modification, stored)
         
         logger.info(f"사용자 {user_id}의 스케줄 수정 완료")
         
@@ -420,7 +817,9 @@ async def modify_schedule(
             "message": "스케줄이 성공적으로 수정되었습니다.",
             "modified_schedule": modified_schedule,
             "applied_feedback": feedback,
-            "modified_at": datetime.now().isoformat()
+            "modified_at": datetime.now().isoformat(),
+            "schedule_id": str(current["_id"]),
+            "version": current["version"],
         }
         
     except HTTPException as he:
@@ -435,6 +834,29 @@ async def modify_schedule(
         )
 
 
+@app.post("/schedule-modify/stream")
+async def modify_schedule_stream(
+        data: dict,
+        current_user: dict = Depends(get_current_user),
+        catalog: WorkbookCatalog = Depends(get_catalog),
+        schedule_store: ScheduleStore = Depends(get_schedule_store),
+):
+    """/schedule-modify의 스트리밍 버전입니다. 이벤트 형식은 /schedule-create/stream과 같습니다."""
+    user_id = current_user.get("userID")
+    stored = await _load_stored_schedule(data, user_id, schedule_store)
+    modification = _prepare_schedule_modification(data, current_user, catalog, stored)
+
+    async def save(modified_schedule: dict):
+        await _save_modified_schedule(schedule_store, user_id, modified_schedule, modification, stored)
+        logger.info(f"사용자 {user_id}의 스케줄 수정 완료 (stream)")
+
+    return StreamingResponse(
+        _sse(sdm.stream_modified_schedule(**modification), on_done=save),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/focus-data")
 async def get_focus_data(
         when_day: str,
@@ -446,7 +868,7 @@ async def get_focus_data(
     
     # 해당 날짜의 문서 조회
     focus_data = await focus_collection.find_one(
-        {"userID": user_id, "whenDay": when_day},
+        {"userID": user_id, "whenDay": when_day, "timeSlot": {"$exists": False}},
         {"_id": 0}  # _id 필드 제외
     )
     
@@ -477,43 +899,37 @@ async def focus_start(
     user_id = current_user.get("userID")
     focus_collection = db["focus"]
     
-    # 기존 문서 조회
-    existing_doc = await focus_collection.find_one({"userID": user_id, "whenDay": data.whenDay})
-    
     # 시간대별 데이터 생성
     time_slot_data = {
         "measureTime": data.measureTime,
         "focusTime": data.focusTime
     }
-    
-    if existing_doc:
-        # 기존 문서가 있으면 시간대별 데이터 업데이트
-        update_data = {}
-        update_data[f"timeSlots.{data.timeSlot}"] = time_slot_data
-        
-        await focus_collection.update_one(
-            {"userID": user_id, "whenDay": data.whenDay},
-            {
-                "$set": update_data,
-                "$inc": {
-                    "totalMeasureTime": data.measureTime,
-                    "totalFocusTime": data.focusTime
-                }
-            },
-            upsert=True
-        )
-    else:
-        # 새 문서 생성
-        new_doc = {
-            "userID": user_id,
-            "whenDay": data.whenDay,
-            "timeSlots": {
-                data.timeSlot: time_slot_data
-            },
-            "totalMeasureTime": data.measureTime,
-            "totalFocusTime": data.focusTime
-        }
-        await focus_collection.insert_one(new_doc)
+    slot_path = f"timeSlots.{data.timeSlot}"
+
+    # 한 번의 원자적 upsert로 저장합니다. 같은 시간대가 다시 오면 이전 값을 빼고 새 값을 더해
+    # 합계가 두 번 더해지지 않도록 한 뒤(1단계) 시간대 데이터를 덮어씁니다(2단계).
+    previous_measure = {"$ifNull": [f"${slot_path}.measureTime", 0]}
+    previous_focus = {"$ifNull": [f"${slot_path}.focusTime", 0]}
+    update_pipeline = [
+        {"$set": {
+            "totalMeasureTime": {"$subtract": [
+                {"$add": [{"$ifNull": ["$totalMeasureTime", 0]}, data.measureTime]}, previous_measure
+            ]},
+            "totalFocusTime": {"$subtract": [
+                {"$add": [{"$ifNull": ["$totalFocusTime", 0]}, data.focusTime]}, previous_focus
+            ]},
+        }},
+        {"$set": {slot_path: time_slot_data}},
+    ]
+    # /focus-feedback이 저장하는 시간대별 문서(timeSlot 필드)와 구분해 하루 문서만 대상으로 합니다.
+    day_filter = {"userID": user_id, "whenDay": data.whenDay, "timeSlot": {"$exists": False}}
+
+    try:
+        await focus_collection.update_one(day_filter, update_pipeline, upsert=True)
+    except DuplicateKeyError:
+        # 같은 날의 첫 샘플 두 개가 동시에 upsert하면 하나는 고유 인덱스에 막힙니다.
+        # 그 사이 문서가 생겼으므로 다시 실행하면 갱신으로 처리됩니다.
+        await focus_collection.update_one(day_filter, update_pipeline, upsert=True)
     
     return {
         "message": "Focus data saved successfully!",
@@ -528,9 +944,21 @@ async def focus_start(
 @app.post("/focus-feedback")
 async def focus_feedback(
         data: FocusFeedbackDTO,
+        run_async: bool = Query(False, alias="async", description="true면 AI 피드백을 작업으로 처리하고 202와 작업 ID를 반환"),
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
         current_user: dict = Depends(get_current_user),
         db: AsyncDatabase = Depends(get_db),
+        idempotency: IdempotencyStore = Depends(get_idempotency_store),
 ):
+    # Idempotency-Key를 보내면 같은 키의 재시도에는 시간대 기록을 다시 저장하지 않고 처음 응답을 돌려줍니다.
+    return await idempotency.run(
+        idempotency_key, current_user.get("userID"), "focus-feedback",
+        {"data": data.model_dump(), "async": run_async},
+        lambda: _focus_feedback(data, run_async, current_user, db),
+    )
+
+
+async def _focus_feedback(data: FocusFeedbackDTO, run_async: bool, current_user: dict, db: AsyncDatabase):
     user_id = current_user.get("userID")
     focus_collection = db["focus"]
     
@@ -547,12 +975,13 @@ async def focus_feedback(
     }
 
     # Process each time slot
+    slot_documents = []
     for time_slot, slot_data in data.timeSlots.items():
         measure_time = slot_data.get("measureTime", 0)
         focus_time = slot_data.get("focusTime", 0)
         
-        # Save to database
-        await focus_collection.insert_one({
+        # Collect for a single bulk insert
+        slot_documents.append({
             "userID": user_id,
             "whenDay": data.whenDay,
             "timeSlot": time_slot,
@@ -568,11 +997,32 @@ async def focus_feedback(
         focus_data["totalMeasureTime"] += measure_time
         focus_data["totalFocusTime"] += focus_time
 
-    # Get AI feedback with both study and focus data
-    ai_feedback = ffbm.get_ai_feedback(
-        study_data_payload=data.studyData,  # 프론트엔드에서 전달받은 studyData 전달
-        focus_data_payload=focus_data
+    if run_async:
+        # 시간대 기록은 바로 저장하고 AI 피드백만 작업으로 넘깁니다.
+        await focus_collection.insert_many(slot_documents, ordered=False)
+        return await _enqueue_job(
+            "focus-feedback", current_user, {"study_data": data.studyData, "focus_data": focus_data}
+        )
+
+    # Save all slots in one round-trip while the AI feedback is being generated
+    inserted, ai_feedback = await asyncio.gather(
+        focus_collection.insert_many(slot_documents, ordered=False),
+        ffbm.get_ai_feedback(
+            study_data_payload=data.studyData,  # 프론트엔드에서 전달받은 studyData 전달
+            focus_data_payload=focus_data
+        ),
+        return_exceptions=True,
     )
+    if isinstance(inserted, BaseException):
+        raise inserted
+    if isinstance(ai_feedback, FeedbackUnavailableError):
+        # 안내 문구를 돌려주되 Idempotency-Key 기록에는 저장하지 않아, 같은 키로 재시도하면 피드백을 다시 만듭니다.
+        return Unsaved({
+            "message": "Focus feedback recorded successfully!",
+            "ai_feedback": str(ai_feedback)
+        })
+    if isinstance(ai_feedback, BaseException):
+        raise ai_feedback
     
     return {
         "message": "Focus feedback recorded successfully!", 
@@ -580,6 +1030,59 @@ async def focus_feedback(
     }
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(
+        job_id: str,
+        current_user: dict = Depends(get_current_user),
+):
+    """?async=true로 맡긴 작업의 상태를 반환합니다. status가 succeeded이면 result에 엔드포인트 응답이 들어 있습니다."""
+    try:
+        object_id = ObjectId(job_id)
+    except InvalidId:
+        raise JobNotFoundException(job_id)
+
+    job = await job_queue.get(object_id, current_user.get("userID"))
+    if job is None:
+        raise JobNotFoundException(job_id)
+    return serialize_job(job)
+
+
+async def _schedule_create_job(payload: dict) -> dict:
+    # 요청 문서는 작업을 넣을 때 만들었으므로 재시도하거나 다른 워커가 이어받아도 문서가 늘지 않습니다.
+    schedule_id = ObjectId(payload["schedule_id"]) if payload.get("schedule_id") else None
+    return await _create_schedule(
+        ScheduleDTO(**payload["data"]), payload["user"], ScheduleStore(get_db()), schedule_id
+    )
+
+
+async def _schedule_modify_job(payload: dict) -> dict:
+    return await _modify_schedule(payload["data"], payload["user"], get_catalog(), ScheduleStore(get_db()))
+
+
+async def _focus_feedback_job(payload: dict) -> dict:
+    # AI 코치 호출이 실패하면 FeedbackUnavailableError가 그대로 올라가 작업 큐가 다시 시도합니다.
+    ai_feedback = await ffbm.get_ai_feedback(
+        study_data_payload=payload["study_data"],
+        focus_data_payload=payload["focus_data"],
+    )
+    return {"message": "Focus feedback recorded successfully!", "ai_feedback": ai_feedback}
+
+
+job_queue.register("schedule-create", _job_handler(_schedule_create_job))
+job_queue.register("schedule-modify", _job_handler(_schedule_modify_job))
+job_queue.register("focus-feedback", _job_handler(_focus_feedback_job))
+
+
+@app.get("/llm-cache/stats")
+async def llm_cache_stats() -> dict:
+    return {"llm_cache": get_llm_cache().stats()}
+
+
+@app.get("/llm-usage/stats")
+async def llm_usage_stats() -> dict:
+    return {"llm_usage": get_llm_client().usage_stats(), "single_flight": llm_single_flight.stats()}
+
+
 @app.post("/neurofeedback_send")
 async def neurofeedback_send(
         data: NeurofeedbackSendDTO,
@@ -603,17 +1106,78 @@ async def neurofeedback_send(
     return {"message": "Neurofeedback data sent successfully!"}
 
 
+def _encode_neurofeedback_cursor(doc: dict) -> str:
+    return f"{doc['when']}:{doc['_id']}"
+
+
+def _decode_neurofeedback_cursor(cursor: str) -> tuple[int, ObjectId]:
+    try:
+        when, object_id = cursor.split(":", 1)
+        return int(when), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise InvalidDataException("Invalid cursor.", {"cursor": cursor})
+
+
 @app.get("/neurofeedback_load")
 async def neurofeedback_load(
+        limit: int = Query(NEUROFEEDBACK_PAGE_SIZE, ge=1, le=NEUROFEEDBACK_MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        when_from: Optional[int] = None,
+        when_to: Optional[int] = None,
+        stream: bool = False,
         current_user: dict = Depends(get_current_user), db: AsyncDatabase = Depends(get_db)
 ):
+    """
+    when 오름차순으로 뉴로피드백 기록을 페이지 단위로 반환합니다.
+
+    - cursor: 이전 응답의 next_cursor. 그 다음 기록부터 반환합니다.
+    - when_from, when_to: when 범위(양 끝 포함)
+    - stream=true: 조건에 맞는 기록 전체를 NDJSON(한 줄에 하나)으로 스트리밍합니다. limit은 무시됩니다.
+    """
     user_id = current_user.get("userID")
 
     neurofeedback_collection = db["neurofeedback"]
 
-    neurofeedback_data = neurofeedback_collection.find({"userID": user_id})
+    query = {"userID": user_id}
+    when_range = {}
+    if when_from is not None:
+        when_range["$gte"] = when_from
+    if when_to is not None:
+        when_range["$lte"] = when_to
+    if when_range:
+        query["when"] = when_range
+    if cursor:
+        last_when, last_id = _decode_neurofeedback_cursor(cursor)
+        query["$or"] = [
+            {"when": {"$gt": last_when}},
+            {"when": last_when, "_id": {"$gt": last_id}},
+        ]
+
+    projection = {"_id": 1, "when": 1, "find_dog": 1, "select_square": 1}
+    sort = [("when", ASCENDING), ("_id", ASCENDING)]
+
+    if stream:
+        async def ndjson():
+            documents = neurofeedback_collection.find(
+                query, projection, sort=sort, batch_size=NEUROFEEDBACK_PAGE_SIZE
+            )
+            async for data in documents:
+                data.pop("_id")
+                yield json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    documents = await neurofeedback_collection.find(
+        query, projection, sort=sort, limit=limit + 1
+    ).to_list()
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = _encode_neurofeedback_cursor(documents[-1])
+
     data_list = []
-    async for data in neurofeedback_data:
+    for data in documents:
         data_list.append(
             {
                 "when": data.get("when"),
@@ -621,49 +1185,60 @@ async def neurofeedback_load(
                 "select_square": data.get("select_square"),
             }
         )
-    return {"neurofeedback_data": data_list}
+    return {"neurofeedback_data": data_list, "next_cursor": next_cursor}
+
+
+async def _upload_find_dog_image(num: int, image_list: list, image_directory_path: str, upload_url: str) -> tuple:
+    """이미지 하나를 업로드하고 ("success", 응답) 또는 ("error", 에러 정보)를 반환합니다."""
+    if not 0 <= num < len(image_list):
+        error_msg = f"이미지 번호가 범위를 벗어났습니다. (사용 가능 범위: 0-{len(image_list) - 1})"
+        logger.warning(f"Image number out of range: {num}")
+        return "error", {"number": num, "error": error_msg}
+
+    filename = image_list[num]
+    image_path = os.path.join(image_directory_path, filename)
+
+    try:
+        image = await asyncio.to_thread(image_cache.get, image_path)
+        return "success", await image_uploader.upload(upload_url, filename, image.content)
+
+    except FileNotFoundError:
+        error_msg = f"파일을 찾을 수 없습니다: {image_path}"
+        logger.error(error_msg)
+        return "error", {"number": num, "error": error_msg}
+    except asyncio.TimeoutError:
+        error_msg = f"업로드 실패: {image_uploader.timeout}초 안에 응답이 없습니다."
+        logger.error(f"Upload timed out for {filename}")
+        return "error", {"number": num, "filename": filename, "error": error_msg}
+    except httpx.HTTPError as e:
+        error_msg = f"업로드 실패: {e}"
+        logger.error(f"Upload failed for {filename}: {e}")
+        return "error", {"number": num, "filename": filename, "error": error_msg}
+    except ValueError as e:
+        # 업로드 서버가 JSON이 아닌 응답을 보낸 경우(json.JSONDecodeError)
+        error_msg = f"업로드 실패: 응답을 해석할 수 없습니다. ({e})"
+        logger.error(f"Invalid upload response for {filename}: {e}")
+        return "error", {"number": num, "filename": filename, "error": error_msg}
 
 
 @app.post("/find_dog_image_load")
-def find_dog_image_load(data: FindDogImageLoadDTO):
+async def find_dog_image_load(data: FindDogImageLoadDTO):
     IMAGE_DIRECTORY = os.getenv("Find_Dog_Image_URL")
     UPLOAD_URL = os.getenv("UPLOAD_URL")
 
-    if not os.path.isdir(IMAGE_DIRECTORY):
+    try:
+        image_list = image_directory.list(IMAGE_DIRECTORY)
+    except FileNotFoundError:
         logger.error(f"Image directory not found: {IMAGE_DIRECTORY}")
         raise FileNotFoundException(IMAGE_DIRECTORY)
 
-    image_list = sorted(os.listdir(IMAGE_DIRECTORY))
-
-    upload_results = []
-    errors = []
+    # 요청한 이미지를 동시에 업로드합니다. 동시 업로드 수는 image_uploader가 제한합니다.
+    results = await asyncio.gather(
+        *(_upload_find_dog_image(num, image_list, IMAGE_DIRECTORY, UPLOAD_URL) for num in data.number)
+    )
 
-    for num in data.number:
-        if 0 <= num < len(image_list):
-            filename = image_list[num]
-            image_path = os.path.join(IMAGE_DIRECTORY, filename)
-
-            try:
-                with open(image_path, "rb") as image_file:
-                    files = {"file": (filename, image_file, "image/jpeg")}
-
-                    response = requests.post(UPLOAD_URL, files=files)
-                    response.raise_for_status()
-
-                    upload_results.append(response.json())
-
-            except FileNotFoundError:
-                error_msg = f"파일을 찾을 수 없습니다: {image_path}"
-                logger.error(error_msg)
-                errors.append({"number": num, "error": error_msg})
-            except requests.exceptions.RequestException as e:
-                error_msg = f"업로드 실패: {e}"
-                logger.error(f"Upload failed for {filename}: {e}")
-                errors.append({"number": num, "filename": filename, "error": error_msg})
-        else:
-            error_msg = f"이미지 번호가 범위를 벗어났습니다. (사용 가능 범위: 0-{len(image_list) - 1})"
-            logger.warning(f"Image number out of range: {num}")
-            errors.append({"number": num, "error": error_msg})
+    upload_results = [result for outcome, result in results if outcome == "success"]
+    errors = [result for outcome, result in results if outcome == "error"]
 
     logger.info(
         f"Find dog image load completed. Successes: {len(upload_results)}, Errors: {len(errors)}"
@@ -671,6 +1246,49 @@ def find_dog_image_load(data: FindDogImageLoadDTO):
     return {"successes": upload_results, "errors": errors}
 
 
+@app.get("/find_dog_image/{number}")
+async def find_dog_image(number: int, request: Request, variant: str = "original"):
+    """
+    찾기 게임 이미지를 메모리 캐시에서 바로 내려줍니다.
+    ETag/Last-Modified와 Cache-Control을 붙이므로 클라이언트와 CDN이 캐시할 수 있고,
+    조건부 요청이 일치하면 304를 반환합니다. variant=small이면 가벼운 변형을 반환합니다.
+    """
+    IMAGE_DIRECTORY = os.getenv("Find_Dog_Image_URL")
+
+    if variant not in IMAGE_VARIANTS:
+        raise InvalidDataException(
+            f"variant는 {', '.join(IMAGE_VARIANTS)} 중 하나여야 합니다.", {"variant": variant}
+        )
+
+    try:
+        image_list = image_directory.list(IMAGE_DIRECTORY)
+    except FileNotFoundError:
+        logger.error(f"Image directory not found: {IMAGE_DIRECTORY}")
+        raise FileNotFoundException(IMAGE_DIRECTORY)
+
+    if not 0 <= number < len(image_list):
+        raise InvalidDataException(
+            f"이미지 번호가 범위를 벗어났습니다. (사용 가능 범위: 0-{len(image_list) - 1})",
+            {"number": number},
+        )
+
+    image_path = os.path.join(IMAGE_DIRECTORY, image_list[number])
+    try:
+        image = await asyncio.to_thread(image_cache.get, image_path, variant)
+    except FileNotFoundError:
+        logger.error(f"Image file not found: {image_path}")
+        raise FileNotFoundException(image_path)
+
+    headers = {
+        "ETag": image.etag,
+        "Last-Modified": image.last_modified,
+        "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE_SECONDS}",
+    }
+    if _is_not_modified(request, image.etag, image.mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=image.content, media_type=image.media_type, headers=headers)
+
+
 # @app.get("/AI")
 # async def ai_response(
 #     data : AIResponseDTO,
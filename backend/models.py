@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 
 # RegisterDTO: Python의 snake_case 네이밍 컨벤션에 맞게 필드명을 수정했습니다.
 class RegisterDTO(BaseModel):
@@ -55,9 +55,21 @@ class FindDogImageLoadDTO(BaseModel):
 
 # ScheduleDTO: 학습 목표(goal)를 받을 수 있도록 Optional 필드를 추가했습니다.
 class ScheduleDTO(BaseModel):
-    when: int
+    when: int = Field(ge=1)  # 주의 수
     subjects: List[Dict[str, Any]]
     goal: Optional[str] = None  # [핵심 수정] AI에게 전달할 학습 목표(goal) 필드 추가
+    engine: Optional[Literal["llm", "local", "refine"]] = None  # 생성 방식, 생략하면 SDM_SCHEDULE_ENGINE
+
+
+# ScheduleItemPatchDTO: 스케줄 항목 하나의 완료 여부/중요도만 바꿉니다.
+class ScheduleItemPatchDTO(BaseModel):
+    version: int                     # 클라이언트가 알고 있는 스케줄 버전 (낙관적 동시성 제어)
+    week: int = Field(ge=1)          # 주차 ("1", "2", ...)
+    day: int = Field(ge=1, le=7)     # 요일 (day1 ~ day7)
+    index: int = Field(ge=0)         # 해당 요일 항목 목록에서의 위치
+    plan_index: int = Field(0, ge=0) # 주차 배열 안의 계획 위치 (보통 0)
+    isFinished: Optional[bool] = None
+    importance: Optional[int] = Field(None, ge=1, le=3)
 
 
 class AIResponseDTO(BaseModel):
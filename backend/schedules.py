@@ -0,0 +1,424 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import Depends
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.asynchronous.database import AsyncDatabase
+
+from database import get_db
+from exceptions import (
+    InvalidDataException,
+    ScheduleNotFoundException,
+    ScheduleVersionConflictException,
+)
+from json_patch import make_patch, apply_patch, pointer
+from logger import create_logger
+
+logger = create_logger(__name__)
+
+# 이 간격의 리비전(1, 1 + N, 1 + 2N, ...)마다 변경분 대신 스케줄 전체를 스냅샷으로 저장합니다.
+SCHEDULE_SNAPSHOT_INTERVAL = int(os.getenv("SCHEDULE_SNAPSHOT_INTERVAL", "10"))
+
+# 조건부 GET이나 부분 수정 전에 먼저 확인하는 가벼운 필드
+SCHEDULE_META_PROJECTION = {"_id": 1, "version": 1, "content_hash": 1, "start_date": 1, "updated_at": 1}
+SCHEDULE_PROJECTION = {
+    "_id": 1,
+    "version": 1,
+    "content_hash": 1,
+    "start_date": 1,
+    "schedule": 1,
+    "workbooks": 1,
+    "updated_at": 1,
+}
+
+
+def schedule_content_hash(schedule: dict) -> str:
+    """
+    키 순서와 공백에 영향받지 않는 스케줄 내용 해시(sha256)입니다.
+    스케줄을 쓸 때마다(생성, 수정, 항목 단위 수정) 다시 계산합니다.
+    """
+    raw = json.dumps(schedule, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def schedule_start_date(schedule: dict) -> Optional[str]:
+    """AI 스케줄의 최상위 키(생성 날짜, YYYY-MM-DD)를 시작 날짜로 사용합니다."""
+    return next(iter(schedule), None) if isinstance(schedule, dict) else None
+
+
+def schedule_etag(doc: dict) -> str:
+    """스케줄이 바뀔 때마다 버전이 오르므로 (스케줄 ID, 버전)을 ETag로 사용합니다."""
+    return f'"{doc["_id"]}-{doc["version"]}"'
+
+
+def schedule_item_path(start_date: str, week: int, plan_index: int, day: int, index: int) -> str:
+    """{날짜: {주차: [{weekplan: {dayN: [항목...]}}]}} 안의 항목 하나를 가리키는 점 표기 경로입니다."""
+    return f"schedule.{start_date}.{week}.{plan_index}.weekplan.day{day}.{index}"
+
+
+def is_snapshot_revision(revision: int) -> bool:
+    return (revision - 1) % SCHEDULE_SNAPSHOT_INTERVAL == 0
+
+
+def serialize_schedule(doc: dict) -> dict:
+    return {
+        "schedule_id": str(doc["_id"]),
+        "version": doc.get("version"),
+        "content_hash": doc.get("content_hash"),
+        "start_date": doc.get("start_date"),
+        "schedule": doc.get("schedule"),
+        "updated_at": doc["updated_at"].isoformat() if doc.get("updated_at") else None,
+    }
+
+
+def serialize_revision(entry: dict) -> dict:
+    return {
+        "revision": entry["revision"],
+        "kind": entry["kind"],
+        "source": entry.get("source"),
+        "feedback": entry.get("feedback"),
+        "created_at": entry["created_at"].isoformat() if entry.get("created_at") else None,
+    }
+
+
+class ScheduleHistory:
+    """
+    스케줄 리비전 이력을 schedule_history 컬렉션에 저장합니다.
+    리비전 번호는 스케줄 문서의 version과 같습니다. 각 리비전은 직전 리비전에 대한 JSON Patch(delta)로 저장하고,
+    SCHEDULE_SNAPSHOT_INTERVAL마다 전체 스케줄(snapshot)을 저장해 복원할 때 적용할 패치 수를 제한합니다.
+    """
+
+    def __init__(self, db: AsyncDatabase):
+        self.collection = db["schedule_history"]
+
+    async def record(
+        self,
+        schedule_id: ObjectId,
+        user_id: str,
+        revision: int,
+        source: str,
+        schedule: Optional[dict] = None,
+        patch: Optional[list] = None,
+        feedback: Optional[str] = None,
+    ) -> None:
+        """patch가 없으면 schedule을 스냅샷으로 저장합니다."""
+        entry = {
+            "schedule_id": schedule_id,
+            "userID": user_id,
+            "revision": revision,
+            "source": source,
+            "created_at": datetime.now(),
+        }
+        if patch is None:
+            entry.update(kind="snapshot", schedule=schedule)
+        else:
+            entry.update(kind="delta", patch=patch)
+        if feedback:
+            entry["feedback"] = feedback
+
+        try:
+            await self.collection.insert_one(entry)
+        except DuplicateKeyError:
+            # 같은 리비전이 이미 기록된 경우입니다. 이력은 리비전마다 하나만 유지합니다.
+            logger.warning(f"Schedule revision already recorded: {schedule_id}@{revision}")
+
+    async def list_revisions(self, schedule_id: ObjectId, limit: int) -> list[dict]:
+        cursor = self.collection.find(
+            {"schedule_id": schedule_id},
+            {"revision": 1, "kind": 1, "source": 1, "feedback": 1, "created_at": 1},
+            sort=[("revision", DESCENDING)],
+            limit=limit,
+        )
+        return await cursor.to_list()
+
+    async def get_revision(self, schedule_id: ObjectId, revision: int) -> Optional[dict]:
+        """
+        revision 시점의 스케줄을 복원합니다. revision 이하의 가장 가까운 스냅샷에 이후 패치를 순서대로 적용하며,
+        스냅샷이 없거나 중간 리비전이 빠져 있으면 None을 반환합니다.
+        """
+        snapshot = await self.collection.find_one(
+            {"schedule_id": schedule_id, "kind": "snapshot", "revision": {"$lte": revision}},
+            sort=[("revision", DESCENDING)],
+        )
+        if snapshot is None:
+            return None
+
+        cursor = self.collection.find(
+            {"schedule_id": schedule_id, "revision": {"$gt": snapshot["revision"], "$lte": revision}},
+            {"revision": 1, "kind": 1, "patch": 1, "created_at": 1},
+            sort=[("revision", ASCENDING)],
+        )
+        schedule = snapshot["schedule"]
+        latest = snapshot
+        for entry in await cursor.to_list():
+            if entry["revision"] != latest["revision"] + 1:
+                break
+            schedule = apply_patch(schedule, entry["patch"])
+            latest = entry
+        if latest["revision"] != revision:
+            logger.warning(f"Schedule history has a gap: {schedule_id}@{latest['revision'] + 1}")
+            return None
+
+        return {
+            "schedule_id": str(schedule_id),
+            "revision": revision,
+            "schedule": schedule,
+            "created_at": latest["created_at"].isoformat() if latest.get("created_at") else None,
+        }
+
+
+class ScheduleStore:
+    """
+    생성된 스케줄을 schedule 컬렉션에 저장하고 조회합니다.
+    /schedule-create가 넣는 요청 문서에 생성 결과(schedule), 버전, 내용 해시를 덧붙여 저장하며,
+    사용자의 현재 스케줄은 schedule이 있는 문서 중 가장 최근에 만들어진 것입니다.
+    """
+
+    def __init__(self, db: AsyncDatabase):
+        self.collection = db["schedule"]
+        self.history = ScheduleHistory(db)
+
+    async def create_request(self, user_id: str, when: int, subjects: list, goal: Optional[str]) -> ObjectId:
+        result = await self.collection.insert_one({
+            "userID": user_id,
+            "when": when,
+            "subjects": subjects,
+            "goal": goal,
+            "created_at": datetime.now(),
+        })
+        return result.inserted_id
+
+    async def get_generated(self, schedule_id: ObjectId) -> Optional[dict]:
+        """요청 문서에 이미 생성된 스케줄이 저장되어 있으면 반환합니다. 아직 없으면 None입니다."""
+        return await self.collection.find_one({"_id": schedule_id, "schedule": {"$exists": True}}, SCHEDULE_PROJECTION)
+
+    async def save_generated(self, schedule_id: ObjectId, schedule: dict, workbooks: list) -> dict:
+        """요청 문서에 생성된 스케줄을 버전 1로 저장합니다."""
+        now = datetime.now()
+        saved = await self.collection.find_one_and_update(
+            {"_id": schedule_id},
+            {"$set": {
+                "schedule": schedule,
+                "start_date": schedule_start_date(schedule),
+                "workbooks": workbooks,
+                "content_hash": schedule_content_hash(schedule),
+                "version": 1,
+                "updated_at": now,
+            }},
+            projection={**SCHEDULE_PROJECTION, "userID": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if saved is not None:
+            await self.history.record(schedule_id, saved.get("userID"), 1, "generate", schedule=schedule)
+        return saved
+
+    async def insert_schedule(
+        self, user_id: str, schedule: dict, workbooks: list, source: str, feedback: Optional[str] = None
+    ) -> dict:
+        """요청 문서 없이 스케줄을 새 현재 스케줄(버전 1)로 저장합니다."""
+        now = datetime.now()
+        doc = {
+            "userID": user_id,
+            "created_at": now,
+            "schedule": schedule,
+            "start_date": schedule_start_date(schedule),
+            "workbooks": workbooks,
+            "content_hash": schedule_content_hash(schedule),
+            "version": 1,
+            "updated_at": now,
+        }
+        result = await self.collection.insert_one(doc)
+        await self.history.record(result.inserted_id, user_id, 1, source, schedule=schedule, feedback=feedback)
+        return doc
+
+    async def replace_current(
+        self,
+        user_id: str,
+        schedule: dict,
+        source: str = "modify",
+        feedback: Optional[str] = None,
+        expected: Optional[dict] = None,
+    ) -> Optional[dict]:
+        """
+        현재 스케줄의 내용을 바꾸고 버전을 올린 뒤, 직전 내용과의 차이를 새 리비전으로 기록합니다.
+        저장된 스케줄이 없으면 None을 반환합니다.
+        expected(수정을 시작할 때 읽은 스케줄의 _id, version)가 주어지면 그 사이에 현재 스케줄이 바뀌었을 때
+        덮어쓰지 않고 ScheduleVersionConflictException을 발생시킵니다.
+        """
+        current = await self.get_current(user_id, SCHEDULE_META_PROJECTION)
+        if current is None:
+            return None
+
+        query = {"_id": current["_id"]}
+        if expected is not None:
+            if current["_id"] != expected["_id"] or current.get("version") != expected.get("version"):
+                raise ScheduleVersionConflictException(expected.get("version"), current.get("version"))
+            query["version"] = expected.get("version")
+
+        updates = {
+            "schedule": schedule,
+            "start_date": schedule_start_date(schedule),
+            "content_hash": schedule_content_hash(schedule),
+            "updated_at": datetime.now(),
+        }
+        previous = await self.collection.find_one_and_update(
+            query,
+            {"$set": updates, "$inc": {"version": 1}},
+            projection=SCHEDULE_PROJECTION,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous is None:
+            if expected is not None:
+                latest = await self.collection.find_one({"_id": current["_id"]}, {"version": 1})
+                raise ScheduleVersionConflictException(
+                    expected.get("version"), latest.get("version") if latest else None
+                )
+            return None
+
+        revision = previous.get("version", 0) + 1
+        patch = None if is_snapshot_revision(revision) else make_patch(previous.get("schedule"), schedule)
+        await self.history.record(
+            current["_id"], user_id, revision, source, schedule=schedule, patch=patch, feedback=feedback
+        )
+        return {**previous, **updates, "version": revision}
+
+    async def update_item(
+        self,
+        user_id: str,
+        expected_version: int,
+        week: int,
+        plan_index: int,
+        day: int,
+        index: int,
+        fields: dict,
+    ) -> dict:
+        """
+        항목 하나의 필드만 위치 지정 $set으로 바꾸고 버전을 올린 뒤, 바뀐 스케줄로 content_hash를 다시 계산합니다.
+        expected_version이 현재 버전과 다르면 ScheduleVersionConflictException을 발생시킵니다.
+        """
+        current = await self.get_current(user_id, SCHEDULE_META_PROJECTION)
+        if current is None:
+            raise ScheduleNotFoundException(user_id)
+        if current["version"] != expected_version:
+            raise ScheduleVersionConflictException(expected_version, current["version"])
+
+        revision = expected_version + 1
+        snapshot = is_snapshot_revision(revision)
+        path = schedule_item_path(current["start_date"], week, plan_index, day, index)
+        # 바뀐 스케줄 전체를 받아 content_hash를 다시 계산하고, 스냅샷 리비전이면 이력에도 저장합니다.
+        updated = await self.collection.find_one_and_update(
+            {"_id": current["_id"], "version": expected_version, path: {"$exists": True}},
+            {
+                "$set": {**{f"{path}.{key}": value for key, value in fields.items()}, "updated_at": datetime.now()},
+                "$inc": {"version": 1},
+            },
+            projection={"schedule": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None:
+            latest = await self.collection.find_one({"_id": current["_id"]}, {"version": 1})
+            if latest is not None and latest["version"] != expected_version:
+                raise ScheduleVersionConflictException(expected_version, latest["version"])
+            raise InvalidDataException("Schedule item not found.", {"path": path})
+
+        # 그 사이 다른 수정이 버전을 올렸다면 그 수정이 해시를 새로 쓰므로 건너뜁니다.
+        await self.collection.update_one(
+            {"_id": current["_id"], "version": revision},
+            {"$set": {"content_hash": schedule_content_hash(updated["schedule"])}},
+        )
+
+        patch = None if snapshot else [
+            {
+                "op": "add",
+                "path": pointer(current["start_date"], week, plan_index, "weekplan", f"day{day}", index, key),
+                "value": value,
+            }
+            for key, value in fields.items()
+        ]
+        await self.history.record(
+            current["_id"], user_id, revision, "item", schedule=updated["schedule"] if snapshot else None, patch=patch
+        )
+        return {"_id": current["_id"], "version": revision}
+
+    async def get_day_plan(self, user_id: str, day: date) -> Optional[dict]:
+        """day의 계획 항목만 한 번의 집계로 가져옵니다. 저장된 스케줄이 없으면 None을 반환합니다."""
+        cursor = await self.collection.aggregate(day_plan_pipeline(user_id, day))
+        documents = await cursor.to_list(length=1)
+        return documents[0] if documents else None
+
+    async def get_current(self, user_id: str, projection: dict = None) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"userID": user_id, "schedule": {"$exists": True}},
+            projection or SCHEDULE_PROJECTION,
+            sort=[("created_at", DESCENDING)],
+        )
+
+
+def _field_value(obj, key):
+    """obj(문서 식)에서 이름이 key(식)인 필드 값을 꺼내는 집계 식입니다. 날짜/주차/요일 키가 문서마다 달라 사용합니다."""
+    return {"$getField": {
+        "field": "v",
+        "input": {"$arrayElemAt": [
+            {"$filter": {
+                "input": {"$objectToArray": {"$ifNull": [obj, {}]}},
+                "as": "entry",
+                "cond": {"$eq": ["$$entry.k", key]},
+            }},
+            0,
+        ]},
+    }}
+
+
+def day_plan_pipeline(user_id: str, day: date) -> list:
+    """
+    현재 스케줄에서 day에 해당하는 하루 계획만 꺼내는 집계 파이프라인입니다.
+    시작 날짜로부터 경과 일수로 주차(offset // 7 + 1)와 요일(day{offset % 7 + 1})을 정하고,
+    {날짜: {주차: [{weekplan: {dayN: [...]}}]}}에서 그 요일 항목만 반환하므로 전체 스케줄을 내려받지 않습니다.
+    start_date가 없거나 날짜 형식이 아니면 offset, week, day는 null이고 items는 빈 목록(오늘 일정 없음)입니다.
+    """
+    return [
+        {"$match": {"userID": user_id, "schedule": {"$exists": True}}},
+        {"$sort": {"created_at": DESCENDING}},
+        {"$limit": 1},
+        {"$set": {"offset": {"$dateDiff": {
+            "startDate": {"$dateFromString": {
+                "dateString": "$start_date",
+                "format": "%Y-%m-%d",
+                # 잘못된 start_date 하나로 집계 전체가 실패하지 않게 null로 둡니다. null은 아래 식을 거치며 그대로 null이 됩니다.
+                "onError": None,
+                "onNull": None,
+            }},
+            "endDate": datetime(day.year, day.month, day.day),
+            "unit": "day",
+        }}}},
+        {"$set": {
+            "week": {"$toString": {"$add": [{"$toInt": {"$floor": {"$divide": ["$offset", 7]}}}, 1]}},
+            "day": {"$concat": ["day", {"$toString": {"$add": [{"$mod": ["$offset", 7]}, 1]}}]},
+        }},
+        {"$project": {
+            "_id": 1,
+            "version": 1,
+            "content_hash": 1,
+            "start_date": 1,
+            "offset": 1,
+            "week": 1,
+            "day": 1,
+            "items": {"$reduce": {
+                "input": {"$ifNull": [_field_value(_field_value("$schedule", "$start_date"), "$week"), []]},
+                "initialValue": [],
+                "in": {"$concatArrays": [
+                    "$$value",
+                    {"$ifNull": [_field_value("$$this.weekplan", "$day"), []]},
+                ]},
+            }},
+        }},
+    ]
+
+
+def get_schedule_store(db: AsyncDatabase = Depends(get_db)) -> ScheduleStore:
+    return ScheduleStore(db)
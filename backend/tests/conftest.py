@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# 백엔드 모듈은 backend/에서 실행하는 것을 전제로 평면 import(from jobs import ...)를 씁니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+class AsyncCollection:
+    """mongomock 컬렉션의 메서드를 pymongo AsyncCollection처럼 await할 수 있게 감쌉니다."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name) -> AsyncCollection:
+        return AsyncCollection(self.db[name])
+
+
+@pytest.fixture
+def mongo_db() -> AsyncDatabase:
+    mongomock = pytest.importorskip("mongomock")
+    return AsyncDatabase(mongomock.MongoClient().db)
@@ -0,0 +1,75 @@
+import asyncio
+
+import main
+from models import FocusFeedbackDTO
+
+
+class FakeFocusCollection:
+    def __init__(self, started: asyncio.Event, other_started: asyncio.Event):
+        self.calls = []
+        self.started = started
+        self.other_started = other_started
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls.append((list(documents), ordered))
+        self.started.set()
+        # 피드백 생성이 시작되기 전에는 끝나지 않으므로, 순서대로 실행하면 시간 초과로 실패합니다.
+        await asyncio.wait_for(self.other_started.wait(), timeout=1)
+
+
+class FakeDatabase:
+    def __init__(self, focus):
+        self.focus = focus
+
+    def __getitem__(self, name):
+        assert name == "focus"
+        return self.focus
+
+
+def test_slots_saved_in_one_insert_concurrently_with_feedback(monkeypatch):
+    data = FocusFeedbackDTO(
+        whenDay="2026-10-17",
+        timeSlots={
+            "10-20": {"measureTime": 10, "focusTime": 8},
+            "10-30": {"measureTime": 10, "focusTime": 4},
+            "10-40": {"measureTime": 10, "focusTime": 6},
+        },
+        studyData={"subject": "수학"},
+    )
+
+    async def scenario():
+        insert_started, feedback_started = asyncio.Event(), asyncio.Event()
+        focus = FakeFocusCollection(insert_started, feedback_started)
+
+        async def get_ai_feedback(study_data_payload, focus_data_payload):
+            feedback_started.set()
+            await asyncio.wait_for(insert_started.wait(), timeout=1)
+            assert focus_data_payload["totalFocusTime"] == 18
+            return "잘했어요"
+
+        monkeypatch.setattr(main.ffbm, "get_ai_feedback", get_ai_feedback)
+        response = await main._focus_feedback(data, False, {"userID": "user"}, FakeDatabase(focus))
+        return focus, response
+
+    focus, response = asyncio.run(scenario())
+    assert response["ai_feedback"] == "잘했어요"
+    assert len(focus.calls) == 1
+    documents, ordered = focus.calls[0]
+    assert ordered is False
+    assert [doc["timeSlot"] for doc in documents] == ["10-20", "10-30", "10-40"]
+    assert all(doc["userID"] == "user" and doc["whenDay"] == "2026-10-17" for doc in documents)
+    assert [doc["focusTime"] for doc in documents] == [8, 4, 6]
+
+
+def test_feedback_cache_key_covers_values_quoted_in_prompt():
+    study = {"subject": "수학"}
+    focus = {"whenDay": "2026-10-17", "timeSlots": {"15:25": {"measureTime": 41, "focusTime": 33}}}
+    key = main.ffbm._feedback_cache_key(study, focus)
+
+    assert main.ffbm._feedback_cache_key(study, dict(focus)) == key
+    # 프롬프트에 그대로 들어가는 날짜와 분 단위 수치가 다르면 다른 학생의 피드백을 재사용하지 않습니다.
+    assert main.ffbm._feedback_cache_key(study, {**focus, "whenDay": "2026-10-18"}) != key
+    other_minutes = {"whenDay": "2026-10-17", "timeSlots": {"15:25": {"measureTime": 44, "focusTime": 35}}}
+    assert main.ffbm._feedback_cache_key(study, other_minutes) != key
+    other_time = {"whenDay": "2026-10-17", "timeSlots": {"15:05": {"measureTime": 41, "focusTime": 33}}}
+    assert main.ffbm._feedback_cache_key(study, other_time) != key
@@ -0,0 +1,41 @@
+import asyncio
+
+from idempotency import IdempotencyStore, Unsaved
+
+
+def test_completed_response_is_replayed(mongo_db):
+    store = IdempotencyStore(mongo_db)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return {"ai_feedback": "잘했어요"}
+
+    async def scenario():
+        first = await store.run("key", "user", "focus-feedback", {"a": 1}, handler)
+        second = await store.run("key", "user", "focus-feedback", {"a": 1}, handler)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == {"ai_feedback": "잘했어요"}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+
+def test_unsaved_response_is_not_replayed(mongo_db):
+    store = IdempotencyStore(mongo_db)
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return Unsaved({"ai_feedback": "잠시 후 다시 시도해주세요."})
+
+    async def scenario():
+        first = await store.run("key", "user", "focus-feedback", {"a": 1}, handler)
+        second = await store.run("key", "user", "focus-feedback", {"a": 1}, handler)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == {"ai_feedback": "잠시 후 다시 시도해주세요."}
+    assert len(calls) == 2
+    assert mongo_db.db["idempotency_keys"].count_documents({}) == 0
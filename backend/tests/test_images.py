@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+import main
+from images import ImageUploader
+
+
+def test_non_json_upload_response_is_reported_per_image(monkeypatch):
+    def handler(request):
+        if b"bad.jpg" in request.content:
+            return httpx.Response(200, text="<html>502 Bad Gateway</html>")
+        return httpx.Response(200, json={"url": "ok"})
+
+    uploader = ImageUploader()
+    uploader._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(main, "image_uploader", uploader)
+    monkeypatch.setattr(main.image_cache, "get", lambda path: SimpleNamespace(content=b"image"))
+
+    async def scenario():
+        images = ["good.jpg", "bad.jpg"]
+        try:
+            return await asyncio.gather(
+                *(main._upload_find_dog_image(num, images, "/images", "http://upload") for num in range(2))
+            )
+        finally:
+            await uploader.close()
+
+    good, bad = asyncio.run(scenario())
+    assert good == ("success", {"url": "ok"})
+    assert bad[0] == "error"
+    assert bad[1]["number"] == 1 and bad[1]["filename"] == "bad.jpg"
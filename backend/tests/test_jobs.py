@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JobQueue, PermanentJobError
+
+
+@pytest.fixture
+def queue(mongo_db) -> JobQueue:
+    # 워커를 띄우지 않고 claim/run을 직접 호출합니다.
+    queue = JobQueue(workers=0, max_attempts=3, lease_seconds=60, retry_base_seconds=10)
+    queue.attach_collection(mongo_db["jobs"])
+    return queue
+
+
+def _stored(queue: JobQueue, job: dict) -> dict:
+    return queue.collection.collection.find_one({"_id": job["_id"]})
+
+
+def test_enqueue_claim_succeeded(queue):
+    async def handler(payload):
+        return {"echo": payload["value"]}
+
+    queue.register("echo", handler)
+
+    async def scenario():
+        job = await queue.enqueue("echo", "user", {"value": 1})
+        claimed = await queue.claim()
+        assert claimed["_id"] == job["_id"]
+        assert claimed["status"] == JOB_RUNNING
+        assert claimed["attempts"] == 1
+        await queue.run(claimed)
+        return job
+
+    stored = _stored(queue, asyncio.run(scenario()))
+    assert stored["status"] == JOB_SUCCEEDED
+    assert stored["result"] == {"echo": 1}
+    assert "payload" not in stored
+    assert "expires_at" in stored
+
+
+def test_retry_with_backoff_then_fail(queue):
+    async def handler(payload):
+        raise RuntimeError("boom")
+
+    queue.register("flaky", handler)
+
+    async def scenario():
+        job = await queue.enqueue("flaky", "user", {})
+        await queue.run(await queue.claim())
+        return job
+
+    job = asyncio.run(scenario())
+    stored = _stored(queue, job)
+    assert stored["status"] == JOB_QUEUED
+    assert stored["error"] == "boom"
+    # 첫 실패 뒤에는 retry_base_seconds만큼 기다립니다.
+    delay = (stored["run_at"] - stored["updated_at"]).total_seconds()
+    assert delay == pytest.approx(10, abs=0.01)
+
+    async def retry(attempts):
+        # 대기 시간이 지난 것으로 만들고 다시 실행합니다.
+        queue.collection.collection.update_one({"_id": job["_id"]}, {"$set": {"run_at": datetime.now()}})
+        claimed = await queue.claim()
+        assert claimed["attempts"] == attempts
+        await queue.run(claimed)
+
+    asyncio.run(retry(2))
+    stored = _stored(queue, job)
+    assert stored["status"] == JOB_QUEUED
+    assert (stored["run_at"] - stored["updated_at"]).total_seconds() == pytest.approx(20, abs=0.01)
+
+    asyncio.run(retry(3))
+    stored = _stored(queue, job)
+    assert stored["status"] == JOB_FAILED
+    assert stored["attempts"] == 3
+
+
+def test_permanent_error_fails_without_retry(queue):
+    async def handler(payload):
+        raise PermanentJobError("bad input")
+
+    queue.register("invalid", handler)
+
+    async def scenario():
+        job = await queue.enqueue("invalid", "user", {})
+        await queue.run(await queue.claim())
+        return job
+
+    stored = _stored(queue, asyncio.run(scenario()))
+    assert stored["status"] == JOB_FAILED
+    assert stored["error"] == "bad input"
+    assert stored["attempts"] == 1
+
+
+def test_expired_lease_is_reclaimed(queue):
+    async def handler(payload):
+        return {"ok": True}
+
+    queue.register("echo", handler)
+
+    async def scenario():
+        job = await queue.enqueue("echo", "user", {})
+        first = await queue.claim()
+        # 임대 중인 작업은 다른 워커가 가져가지 못합니다.
+        assert await queue.claim() is None
+
+        # 워커가 끝내지 못한 채 임대 시간이 지났습니다.
+        queue.collection.collection.update_one(
+            {"_id": job["_id"]}, {"$set": {"lease_until": datetime.now() - timedelta(seconds=1)}}
+        )
+        second = await queue.claim()
+        assert second["_id"] == job["_id"]
+        assert second["attempts"] == 2
+        await queue.run(second)
+
+        # 늦게 끝난 첫 워커의 결과는 attempts가 달라 저장되지 않습니다.
+        await queue._finish(first, JOB_FAILED, error="late")
+        return job
+
+    stored = _stored(queue, asyncio.run(scenario()))
+    assert stored["status"] == JOB_SUCCEEDED
+    assert stored["attempts"] == 2
+    assert stored.get("error") is None
@@ -0,0 +1,86 @@
+import asyncio
+
+import main
+from jobs import JOB_QUEUED, JobQueue
+from schedules import ScheduleStore
+
+USER = {"userID": "user", "grade": "middleschool-1"}
+DATA = {"when": 1, "subjects": [{"grade": "middleschool-1", "publish": "통합", "workbook": "수학"}], "goal": None, "engine": None}
+SCHEDULE = {"2026-10-17": {"1": [{"name": "user", "weekplan": {f"day{day}": [] for day in range(1, 8)}}]}}
+
+
+def test_schedule_create_job_reuses_the_request_document(mongo_db, monkeypatch):
+    calls = []
+
+    async def generate_schedule(payload, engine=None):
+        calls.append(payload)
+        return SCHEDULE, "llm"
+
+    monkeypatch.setattr(main, "get_db", lambda: mongo_db)
+    monkeypatch.setattr(main.sdm, "generate_schedule", generate_schedule)
+
+    async def scenario():
+        schedule_id = await ScheduleStore(mongo_db).create_request("user", 1, DATA["subjects"], None)
+        payload = {"user": USER, "data": DATA, "schedule_id": str(schedule_id)}
+        # 작업이 끝났지만 상태를 저장하지 못해 다른 워커가 같은 작업을 다시 실행한 경우입니다.
+        first = await main._schedule_create_job(payload)
+        second = await main._schedule_create_job(payload)
+        return schedule_id, first, second
+
+    schedule_id, first, second = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first["schedule_id"] == second["schedule_id"] == str(schedule_id)
+    assert second["ai_schedule"] == SCHEDULE
+    assert second["version"] == 1
+    assert mongo_db.db["schedule"].count_documents({}) == 1
+    assert mongo_db.db["schedule_history"].count_documents({}) == 1
+
+
+class TimeoutLLM:
+    timeout = 1
+
+    async def chat(self, **request):
+        raise asyncio.TimeoutError()
+
+
+def test_schedule_modify_job_is_retried_after_llm_timeout(mongo_db, monkeypatch):
+    monkeypatch.setattr(main, "get_db", lambda: mongo_db)
+    monkeypatch.setattr(main.sdm, "llm", TimeoutLLM())
+    queue = JobQueue(workers=0, max_attempts=3)
+    queue.attach_collection(mongo_db["jobs"])
+    queue.register("schedule-modify", main._job_handler(main._schedule_modify_job))
+
+    async def scenario():
+        await ScheduleStore(mongo_db).insert_schedule("user", SCHEDULE, DATA["subjects"], "generate")
+        job = await queue.enqueue("schedule-modify", "user", {"user": USER, "data": {"feedback": "전체 다시 짜줘"}})
+        await queue.run(await queue.claim())
+        return job
+
+    job = asyncio.run(scenario())
+    stored = mongo_db.db["jobs"].find_one({"_id": job["_id"]})
+    # 시간 초과는 입력 오류가 아니므로 실패로 끝내지 않고 다시 시도합니다.
+    assert stored["status"] == JOB_QUEUED
+    assert stored["attempts"] == 1
+    assert "시간이 초과" in stored["error"]
+
+
+def test_invalid_async_modify_is_rejected_before_enqueue(mongo_db, monkeypatch):
+    monkeypatch.setattr(main.job_queue, "collection", mongo_db["jobs"])
+    store = ScheduleStore(mongo_db)
+
+    async def scenario(data):
+        try:
+            return await main.modify_schedule(
+                data, True, None, USER, main.get_catalog(), store, main.IdempotencyStore(mongo_db)
+            )
+        except main.HTTPException as e:
+            return e.status_code
+
+    asyncio.run(store.insert_schedule("user", SCHEDULE, DATA["subjects"], "generate"))
+    assert asyncio.run(scenario({"feedback": ""})) == 400
+    assert asyncio.run(scenario({"feedback": "쉬고 싶어요", "version": 5})) == 409
+    assert mongo_db.db["jobs"].count_documents({}) == 0
+
+    accepted = asyncio.run(scenario({"feedback": "쉬고 싶어요", "version": 1}))
+    assert accepted.status_code == 202
+    assert mongo_db.db["jobs"].count_documents({}) == 1
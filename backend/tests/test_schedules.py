@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from exceptions import ScheduleVersionConflictException
+from schedules import SCHEDULE_META_PROJECTION, ScheduleStore, schedule_content_hash
+
+
+def _schedule(scope: str) -> dict:
+    item = {"subject": "수학", "scope": scope, "importance": 2, "isFinished": False}
+    return {"2026-10-12": {"1": [{"name": "user", "weekplan": {f"day{day}": [dict(item)] for day in range(1, 8)}}]}}
+
+
+def test_replace_current_rejects_a_stale_version(mongo_db):
+    store = ScheduleStore(mongo_db)
+
+    async def scenario():
+        await store.insert_schedule("user", _schedule("old"), [], "generate")
+        # 수정을 시작할 때 읽은 스케줄입니다.
+        stored = await store.get_current("user", SCHEDULE_META_PROJECTION)
+        # LLM이 수정하는 동안 항목 하나가 완료로 바뀌었습니다.
+        await store.update_item("user", stored["version"], 1, 0, 1, 0, {"isFinished": True})
+        with pytest.raises(ScheduleVersionConflictException):
+            await store.replace_current("user", _schedule("modified"), expected=stored)
+        return await store.get_current("user")
+
+    current = asyncio.run(scenario())
+    assert current["version"] == 2
+    assert current["schedule"]["2026-10-12"]["1"][0]["weekplan"]["day1"][0]["isFinished"] is True
+
+
+def test_replace_current_with_the_expected_version(mongo_db):
+    store = ScheduleStore(mongo_db)
+
+    async def scenario():
+        await store.insert_schedule("user", _schedule("old"), [], "generate")
+        stored = await store.get_current("user", SCHEDULE_META_PROJECTION)
+        return await store.replace_current("user", _schedule("modified"), expected=stored)
+
+    replaced = asyncio.run(scenario())
+    assert replaced["version"] == 2
+    assert replaced["schedule"] == _schedule("modified")
+
+
+def test_update_item_refreshes_content_hash(mongo_db):
+    store = ScheduleStore(mongo_db)
+
+    async def scenario():
+        await store.insert_schedule("user", _schedule("old"), [], "generate")
+        before = await store.get_current("user")
+        await store.update_item("user", before["version"], 1, 0, 1, 0, {"isFinished": True})
+        return before, await store.get_current("user")
+
+    before, after = asyncio.run(scenario())
+    assert after["version"] == 2
+    assert after["content_hash"] != before["content_hash"]
+    assert after["content_hash"] == schedule_content_hash(after["schedule"])
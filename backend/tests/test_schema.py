@@ -0,0 +1,38 @@
+import json
+
+from AI.json_stream import WeekStreamParser
+from AI.schema import SCHEDULE_RESPONSE_FORMAT, ScheduleShape, chat_arguments, request_shape, validate_weeks, with_shape
+
+
+def _plans(scope: str) -> list:
+    item = {"subject": "수학", "publish": "통합", "workbook": "수학", "scope": scope, "importance": 2, "isFinished": False}
+    return [{"name": "user", "weekplan": {f"day{day}": [item] for day in range(1, 8)}}]
+
+
+def test_shape_travels_outside_the_chat_arguments():
+    request = with_shape({"model": "m", "response_format": SCHEDULE_RESPONSE_FORMAT}, ScheduleShape("2026-10-17", ["2", "3"]))
+    shape = request_shape(request)
+    assert (shape.start_date, shape.weeks) == ("2026-10-17", ["2", "3"])
+    assert chat_arguments(request) == {"model": "m", "response_format": SCHEDULE_RESPONSE_FORMAT}
+
+
+def test_validate_weeks_reports_missing_and_invalid_weeks():
+    data = {
+        "start_date": "2026-10-17",
+        "weeks": [{"week": "1", "plans": _plans("a")}, {"week": "2", "plans": [{"name": "user"}]}],
+    }
+    valid, missing = validate_weeks(data, ScheduleShape("2026-10-17", ["1", "2", "3"]))
+    assert valid == {"1": _plans("a")}
+    assert missing == ["2", "3"]
+
+
+def test_stream_parser_yields_each_completed_week():
+    text = json.dumps(
+        {"start_date": "2026-10-17", "weeks": [{"week": "1", "plans": _plans('a "}]')}, {"week": "2", "plans": _plans("b")}]},
+        ensure_ascii=False,
+    )
+    parser = WeekStreamParser()
+    weeks = []
+    for i in range(0, len(text), 5):
+        weeks.extend(parser.feed(text[i:i + 5]))
+    assert weeks == [("2026-10-17", "1", _plans('a "}]')), ("2026-10-17", "2", _plans("b"))]
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from AI.scope import ModificationScope, ScheduleMergeError, merge_week, plan_modification_scope
+
+
+def _schedule(start_date: str, weeks: int) -> dict:
+    plan = {"name": "user", "weekplan": {f"day{day}": [] for day in range(1, 8)}}
+    return {start_date: {str(week): [plan] for week in range(1, weeks + 1)}}
+
+
+def test_numbered_week_weekend_is_not_next_week():
+    # 2026-10-27은 3주차입니다. '1주차 주말'의 '차 주'를 다음 주(4주차)로 읽으면 안 됩니다.
+    scope = plan_modification_scope(
+        _schedule("2026-10-13", 4), "1주차 주말에는 쉬고 싶어요", [], today=date(2026, 10, 27)
+    )
+    assert scope is not None
+    assert scope.weeks == ["1"]
+
+
+def test_relative_weeks():
+    schedule = _schedule("2026-10-13", 4)
+    today = date(2026, 10, 27)
+    assert plan_modification_scope(schedule, "다음 주는 쉬고 싶어요", [], today=today).weeks == ["4"]
+    assert plan_modification_scope(schedule, "차주에는 쉬고 싶어요", [], today=today).weeks == ["4"]
+    assert plan_modification_scope(schedule, "이번 주는 쉬고 싶어요", [], today=today).weeks == ["3"]
+    assert plan_modification_scope(schedule, "다다음 주는 쉬고 싶어요", [], today=date(2026, 10, 20)).weeks == ["4"]
+
+
+def test_merge_week_rejects_empty_existing_week():
+    scope = ModificationScope("2026-10-13", ["2"], ["수학"])
+    with pytest.raises(ScheduleMergeError):
+        merge_week([], _schedule("2026-10-13", 1)["2026-10-13"]["1"], scope)
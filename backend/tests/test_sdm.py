@@ -0,0 +1,150 @@
+import asyncio
+import json
+from datetime import datetime
+
+from AI.SDM import SCHEDULE_ENGINE_FALLBACK, SDM
+from AI.cache import LLMResponseCache
+from AI.schema import chat_arguments
+from AI.singleflight import SingleFlight
+
+PAYLOAD = {
+    "user_id": "user",
+    "grade": "middleschool-1",
+    "subjects": [{"grade": "middleschool-1", "publish": "통합", "workbook": "수학"}],
+    "goal": "방정식 완벽 이해",
+    "when": 2,
+}
+
+
+def _week(scope: str) -> list:
+    item = {"subject": "수학", "publish": "비상교육", "workbook": "수학", "scope": scope, "importance": 2, "isFinished": False}
+    return [{"name": "user", "weekplan": {f"day{day}": [item] for day in range(1, 8)}}]
+
+
+class _Message:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _Choice:
+    def __init__(self, content: str):
+        self.message = _Message(content)
+
+
+class _Completion:
+    def __init__(self, content: str):
+        self.choices = [_Choice(content)]
+
+
+class FakeLLM:
+    """chat은 replies를 차례로 돌려주고, stream_chat은 chunks를 보낸 뒤 fail이 있으면 그 예외를 던집니다."""
+
+    timeout = 1
+
+    def __init__(self, replies=(), chunks=(), fail: BaseException = None):
+        self.replies = list(replies)
+        self.chunks = list(chunks)
+        self.fail = fail
+        self.requests = []
+
+    async def chat(self, **request):
+        self.requests.append(request)
+        reply = self.replies.pop(0)
+        if isinstance(reply, BaseException):
+            raise reply
+        return _Completion(reply)
+
+    async def stream_chat(self, **request):
+        self.requests.append(request)
+        for chunk in self.chunks:
+            yield chunk
+        if self.fail is not None:
+            raise self.fail
+
+
+def _sdm(llm: FakeLLM) -> SDM:
+    return SDM(llm=llm, cache=LLMResponseCache(), inflight=SingleFlight())
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def test_llm_failure_reports_local_fallback():
+    sdm = _sdm(FakeLLM(replies=[asyncio.TimeoutError()]))
+    schedule, engine = asyncio.run(sdm.generate_schedule(PAYLOAD, "llm"))
+    assert engine == SCHEDULE_ENGINE_FALLBACK
+    assert list(next(iter(schedule.values()))) == ["1", "2"]
+
+
+def test_llm_success_reports_llm():
+    reply = json.dumps({"start_date": _today(), "weeks": [{"week": "1", "plans": _week("a")}, {"week": "2", "plans": _week("b")}]})
+    schedule, engine = asyncio.run(_sdm(FakeLLM(replies=[reply])).generate_schedule(PAYLOAD, "llm"))
+    assert engine == "llm"
+    assert schedule[_today()]["2"] == _week("b")
+
+
+def test_stream_failure_after_weeks_sends_reset_before_fallback():
+    # 1주차까지 보낸 뒤 스트림이 끊깁니다.
+    text = json.dumps({"start_date": _today(), "weeks": [{"week": "1", "plans": _week("llm")}]})[:-2] + ","
+    sdm = _sdm(FakeLLM(chunks=[text[i:i + 20] for i in range(0, len(text), 20)], fail=asyncio.TimeoutError()))
+
+    async def collect():
+        return [event async for event in sdm.stream_ai_schedule(PAYLOAD, "llm")]
+
+    events = asyncio.run(collect())
+    names = [event["event"] for event in events]
+    assert names == ["week", "reset", "week", "week", "done"]
+    assert events[0]["data"]["plan"] == _week("llm")
+    assert events[1]["data"]["engine"] == SCHEDULE_ENGINE_FALLBACK
+    assert events[2]["data"]["plan"] != _week("llm")
+    assert list(next(iter(events[-1]["data"].values()))) == ["1", "2"]
+
+
+def _item(subject: str, scope: str) -> dict:
+    return {"subject": subject, "publish": "통합", "workbook": subject, "scope": scope, "importance": 2, "isFinished": False}
+
+
+def test_partial_stream_merge_failure_after_weeks_is_an_error():
+    existing = {
+        _today(): {
+            str(week): [{"name": "user", "weekplan": {f"day{day}": [_item("수학", "old"), _item("국어", "old")] for day in range(1, 8)}}]
+            for week in range(1, 5)
+        }
+    }
+    # 수학만 고치라고 했는데 국어 항목까지 바꿔 보내 합친 결과의 검증에 실패합니다.
+    week = [{"name": "user", "weekplan": {f"day{day}": [_item("수학", "new"), _item("국어", "new")] for day in range(1, 8)}}]
+    llm = FakeLLM(chunks=[json.dumps({"start_date": _today(), "weeks": [{"week": "2", "plans": week}]})])
+    sdm = _sdm(llm)
+
+    async def collect():
+        return [
+            event
+            async for event in sdm.stream_modified_schedule(
+                {"user_id": "user"}, [{"workbook": "수학"}, {"workbook": "국어"}], existing, "다음 주 수학 줄여줘"
+            )
+        ]
+
+    events = asyncio.run(collect())
+    assert [event["event"] for event in events] == ["week", "error"]
+    # 이미 주차를 보냈으므로 전체 수정으로 전환하지 않습니다.
+    assert len(llm.requests) == 1
+
+
+def test_schedule_schema_is_the_same_for_every_request():
+    sdm = _sdm(FakeLLM())
+    create = sdm._build_schedule_request(PAYLOAD)
+    longer = sdm._build_schedule_request(dict(PAYLOAD, when=6))
+    assert create["response_format"] == longer["response_format"]
+    assert "schedule_shape" not in chat_arguments(create)
+
+
+def test_missing_week_is_asked_again_with_the_same_schema():
+    first = json.dumps({"start_date": _today(), "weeks": [{"week": "1", "plans": _week("a")}]})
+    second = json.dumps({"start_date": _today(), "weeks": [{"week": "2", "plans": _week("b")}]})
+    llm = FakeLLM(replies=[first, second])
+    schedule, engine = asyncio.run(_sdm(llm).generate_schedule(PAYLOAD, "llm"))
+    assert engine == "llm"
+    assert schedule == {_today(): {"1": _week("a"), "2": _week("b")}}
+    assert llm.requests[1]["response_format"] == llm.requests[0]["response_format"]
+    assert "schedule_shape" not in llm.requests[1]